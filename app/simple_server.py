@@ -1,21 +1,63 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import time
+# Start of the import phase for --measure-startup (see utils.startup)
+_IMPORT_STARTED = time.perf_counter()
+
+from http.server import BaseHTTPRequestHandler
 import os
+import argparse
+import hmac
 import json
 import uuid
-import time
 from urllib.parse import parse_qs, urlparse
+from datetime import datetime
 import logging
-import redis
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("simple_server.log"),
-        logging.StreamHandler()
-    ]
+
+from utils.alert_publisher import publisher_from_env
+from utils.dataset import InlineDataset, dataset_from_env
+from utils.event_store import event_store_from_env
+from utils.log_pipeline import logging_from_env
+from utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry, serve_metrics
+from utils.page_cache import PageTemplateCache
+from utils.pagination import MAX_API_LIMIT, STREAM_THRESHOLD_ROWS, json_array_chunks, parse_page
+from utils.prefork import serve_prefork
+from utils.redis_pool import get_redis_client, reset_redis_client
+from utils.response_cache import ResponseCache
+from utils.router import Router
+from utils.signed_tokens import signer_from_env
+from utils.sketches import sketches_from_env
+from utils.startup import startup_from_env
+from utils.token_store import store_from_env
+from utils.sessions import sessions_from_env
+from utils.static_files import STATIC_PREFIX, StaticFiles
+from utils.login_events import logins_from_env
+from utils.rate_limit import rate_limits_from_env
+from utils.tarpit import tarpit_from_env
+from utils.serving import (
+    SERVER_MODES, DEFAULT_WORKERS, DEFAULT_MAX_CONNECTIONS, DEFAULT_TIMEOUT, DEFAULT_MAX_REQUESTS,
+    DEFAULT_KEEPALIVE_TIMEOUT, MAX_BODY_SIZE, KeepAliveHandlerMixin, make_server
 )
+
+# Time spent in each startup phase, and the dataset load deferred until the
+# port is bound (see utils.startup and --measure-startup)
+STARTUP = startup_from_env(_IMPORT_STARTED)
+STARTUP.mark('imports')
+
+# JSON lines to LOG_PATH and text to the console, written off the request
+# thread unless LOG_MODE=sync (see utils.log_pipeline)
+LOG_QUEUE = logging_from_env()
 logger = logging.getLogger(__name__)
+STARTUP.mark('logging')
+
+# Prometheus metrics (see utils.metrics), served on --metrics-port and, to
+# callers with the admin key, at /metrics on the main port
+METRICS = MetricsRegistry()
+REQUEST_SECONDS = METRICS.histogram('healthcare_request_duration_seconds',
+                                    'Time to route and handle a request', ('route', 'method'))
+RESPONSES = METRICS.counter('healthcare_responses_total', 'Responses sent by status code', ('code',))
+RENDER_SECONDS = METRICS.histogram('healthcare_render_duration_seconds',
+                                   'Time to build a page with a render_* method', ('method',))
+PUBLISH_SECONDS = METRICS.histogram('healthcare_redis_publish_duration_seconds',
+                                    'Time to publish one pipelined batch of alerts to Redis')
 
 USERS = {
     "admin": "password123",
@@ -88,208 +130,659 @@ PRESCRIPTIONS = [
     {"id": "RX1008", "patient_id": "P13579", "patient_name": "Sarah Williams", "medication": "Prednisone", "dosage": "10mg", "frequency": "Once daily", "prescribed_date": "2023-03-10", "refills": 0}
 ]
 
-# Track honeytokens
-HONEYTOKENS = {}
+# Indexed lookups (by patient, doctor and date) over the records above
+DATASET = InlineDataset(PATIENTS, APPOINTMENTS, PRESCRIPTIONS)
+
+# Track honeytokens (bounded; see utils.token_store for capacity/TTL settings).
+# With --processes the store is replaced by one all workers share.
+HONEYTOKENS = store_from_env()
+
+# With HONEYTOKEN_MODE=signed, tokens are signed rather than stored, and only
+# those that are accessed reach HONEYTOKENS (see utils.signed_tokens)
+SIGNER = signer_from_env()
+STARTUP.mark('metrics and tokens')
+
+# Pre-rendered pages; anything that edits PATIENTS, APPOINTMENTS or
+# PRESCRIPTIONS must call notify_data_changed() afterwards
+PAGE_CACHE = PageTemplateCache()
+
+# Pre-serialized (and pre-compressed) API responses, same invalidation rule
+API_CACHE = ResponseCache()
+
+def notify_data_changed():
+    """Drop everything derived from the decoy data so it is rebuilt on next use"""
+    PAGE_CACHE.invalidate()
+    API_CACHE.invalidate()
+    logger.info("Decoy data changed, page and API caches invalidated")
+
+def load_dataset(dataset):
+    """Replace the decoy records with ``dataset`` (see utils.dataset)"""
+    global DATASET, PATIENTS, APPOINTMENTS, PRESCRIPTIONS
+    DATASET = dataset
+    PATIENTS, APPOINTMENTS, PRESCRIPTIONS = dataset.patients, dataset.appointments, dataset.prescriptions
+    notify_data_changed()
+    logger.info(f"Loaded decoy dataset: {len(PATIENTS)} patients, {len(APPOINTMENTS)} appointments, "
+                f"{len(PRESCRIPTIONS)} prescriptions")
+
+def load_generated_dataset():
+    """Swap in the generated dataset, if one is configured"""
+    generated = dataset_from_env()
+    if generated is not None:
+        load_dataset(generated)
+
+# DATASET_PATIENTS=N swaps the hand-written records for a generated,
+# memory-mapped population of N patients (cached in DATASET_DIR). Generating
+# it can take a while, so it happens after the port is bound and the records
+# above are served until then.
+STARTUP.defer('dataset', load_generated_dataset)
+STARTUP.mark('data and caches')
+
+# With EVENT_STORE_PATH set, every token, access and login attempt is kept
+# in SQLite (see utils.event_store), which is also the alert outbox
+EVENTS = event_store_from_env()
+
+def store_event(event):
+    """Keep an event that is not published (history only) in the event store, if there is one"""
+    if EVENTS is not None:
+        EVENTS.record(event)
 
-try:
-    redis_client = redis.Redis(host='redis', port=6379, db=0)
-    redis_client.ping()  # Test connection
-    logger.info("Connected to Redis successfully")
-except Exception as e:
-    logger.error(f"Failed to connect to Redis: {e}")
-    redis_client = None
+# Alerts go through a background publisher so a slow or missing Redis never
+# holds up a request; undelivered events are kept on disk and replayed.
+# The shared Redis client connects lazily, so startup never waits on Redis.
+ALERTS = publisher_from_env(get_redis_client, latency_histogram=PUBLISH_SECONDS, event_store=EVENTS)
+STARTUP.mark('event store and alerts')
+
+def publish_profile(profile):
+    """Log and publish one aggregated attacker profile"""
+    logger.info(f"Attacker profile: {profile['ip']} made {profile['requests']} requests, "
+                f"{profile['login_attempts']} login attempts, triggered {len(profile['tokens'])} honeytokens",
+                extra={"event": profile})
+    if not ALERTS.publish(profile):
+        logger.error(f"Alert queue full, dropped attacker profile: {profile['ip']}")
+
+# Per-IP sessions, reported as one profile per attacker every
+# SESSION_REPORT_INTERVAL seconds (see utils.sessions). The publisher is
+# started first so that at exit the tracker's final report still reaches it.
+SESSIONS = sessions_from_env(publish_profile)
+
+def publish_login_summary(summary):
+    """Log and publish the coalesced login attempts of one IP"""
+    logger.info(f"Login attempts: {summary['ip_address']} made {summary['attempts']} more attempts "
+                f"with {summary['distinct_passwords']} distinct passwords", extra={"event": summary})
+    if not ALERTS.publish(summary):
+        logger.error(f"Alert queue full, dropped login summary: {summary['ip_address']}")
+
+# Repeated failed logins from one IP are reported as one summary per
+# LOGIN_COALESCE_WINDOW seconds instead of one event each (see utils.login_events)
+LOGINS = logins_from_env(publish_login_summary)
+
+# Fixed-size sketches of distinct IPs, repeat token hits and credentials
+# tried; they decide which honeytoken accesses are still published one by
+# one and flag heavy-hitter credentials (see utils.sketches)
+SKETCHES = sketches_from_env()
+ALERTS.start()
+LOGINS.start()
+SESSIONS.start()
+STARTUP.mark('sessions and sketches')
+
+# Per-IP and per-route token buckets (see utils.rate_limit). Over-limit
+# clients get a 429, or with RATE_LIMIT_MODE=tarpit are handed to the
+# tarpit, which drips this response out a byte at a time.
+RATE_LIMITS = rate_limits_from_env('handle_login')
+TARPIT = tarpit_from_env()
+TARPIT_RESPONSE = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Server: Apache/2.4.41 (Ubuntu)\r\n"
+    b"Content-Type: text/html; charset=UTF-8\r\n"
+    b"Cache-Control: no-store\r\n"
+    b"Content-Length: 48213\r\n"
+    b"\r\n"
+    b"<!DOCTYPE html><html><head><title>Healthcare Patient Portal</title></head><body>"
+)
+
+METRICS.gauge('healthcare_honeytokens', 'Honeytokens held by the token store',
+              lambda: {(state,): count for state, count in HONEYTOKENS.stats().items()
+                       if state in ('fresh', 'accessed', 'spilled')}, ('state',))
+METRICS.gauge('healthcare_alert_queue_depth', 'Alerts waiting for the Redis publisher',
+              lambda: ALERTS.stats()['queue_depth'])
+METRICS.gauge('healthcare_alerts_total', 'Alerts by outcome',
+              lambda: {(outcome,): ALERTS.stats()[outcome] for outcome in ('published', 'spilled', 'dropped')},
+              ('outcome',), metric_type='counter')
+METRICS.gauge('healthcare_redis_publish_failures_total', 'Alert batches that failed to reach Redis',
+              lambda: ALERTS.failed_batches, metric_type='counter')
+METRICS.gauge('healthcare_redis_connect_failures_total', 'Failed attempts of the alert publisher to reach Redis',
+              lambda: ALERTS.failed_connects, metric_type='counter')
+METRICS.gauge('healthcare_log_queue_depth', 'Log records waiting for the log writer thread',
+              lambda: LOG_QUEUE.queue.qsize() if LOG_QUEUE is not None else 0)
+METRICS.gauge('healthcare_log_records_dropped_total', 'Log records dropped because the log queue was full',
+              lambda: LOG_QUEUE.dropped if LOG_QUEUE is not None else 0, metric_type='counter')
+METRICS.gauge('healthcare_sessions', 'Attacker sessions being tracked', lambda: len(SESSIONS))
+METRICS.gauge('healthcare_login_coalescer_ips', 'IPs with coalesced login attempts',
+              lambda: LOGINS.stats()['tracked_ips'])
+METRICS.gauge('healthcare_honeytoken_alerts_suppressed_total', 'Repeat honeytoken accesses not published',
+              lambda: SKETCHES.suppressed, metric_type='counter')
+METRICS.gauge('healthcare_distinct_ips', 'Estimated distinct client IPs by route',
+              lambda: {(route,): count for route, count in SKETCHES.distinct_ips()[1].items()}, ('route',))
+if EVENTS is not None:
+    METRICS.gauge('healthcare_event_store_pending', 'Stored alerts not yet delivered to Redis',
+                  lambda: EVENTS.stats()['pending'])
+    METRICS.gauge('healthcare_event_store_events_total', 'Events written to the event store, or dropped',
+                  lambda: {('written',): EVENTS.written, ('dropped',): EVENTS.dropped}, ('outcome',),
+                  metric_type='counter')
+METRICS.gauge('healthcare_rate_limited_total', 'Requests refused by the rate limiter',
+              lambda: RATE_LIMITS.limited, metric_type='counter')
+METRICS.gauge('healthcare_tarpit_connections', 'Connections held by the tarpit', lambda: len(TARPIT))
+METRICS.gauge('healthcare_cache_entries', 'Entries in the page and API response caches',
+              lambda: {('page',): len(PAGE_CACHE), ('api',): len(API_CACHE)}, ('cache',))
+METRICS.gauge('healthcare_cache_bytes', 'Bytes held by the page and API response caches',
+              lambda: {('page',): PAGE_CACHE.bytes, ('api',): API_CACHE.bytes}, ('cache',))
+METRICS.gauge('healthcare_startup_ready', 'Whether deferred startup tasks (e.g. the dataset) have finished',
+              lambda: int(STARTUP.ready.is_set()))
+STARTUP.mark('rate limits and gauges')
     
 def generate_honeytoken(context):
-    """Generate a unique honeytoken and log it"""
+    """Generate a unique honeytoken and log it (signed tokens need neither storing nor logging)"""
+    if SIGNER is not None:
+        return SIGNER.mint(context)
     token_id = str(uuid.uuid4())
-    HONEYTOKENS[token_id] = {
-        "context": context,
-        "created_at": time.time(),
-        "accessed": False,
-        "access_count": 0,
-        "access_ips": []
-    }
-    logger.info(f"Created honeytoken: {token_id} for context: {context}")
+    HONEYTOKENS.create(token_id, context)
+    event = {"event_type": "honeytoken_created", "token_id": token_id, "context": context}
+    logger.info(f"Created honeytoken: {token_id} for context: {context}", extra={"event": event})
+    store_event(event)
     return token_id
 
 def check_honeytoken_access(token_id, ip_address):
     """Record access to a honeytoken"""
-    if token_id not in HONEYTOKENS:
+    # Tokens stored before switching to signed mode are still looked up
+    minted = SIGNER.verify(token_id) if SIGNER is not None else None
+    token_data = HONEYTOKENS.record_access(token_id, ip_address, minted=minted)
+    if token_data is None:
         logger.warning(f"Access to non-existent honeytoken: {token_id} from IP: {ip_address}")
         return
     
-    token_data = HONEYTOKENS[token_id]
-    token_data["accessed"] = True
-    token_data["access_count"] += 1
-    token_data["last_accessed"] = time.time()
-    if ip_address not in token_data["access_ips"]:
-        token_data["access_ips"].append(ip_address)
-    
-    logger.warning(f"HONEYTOKEN ACCESSED: {token_id} from IP: {ip_address}, context: {token_data['context']}")
+    SESSIONS.record_token(ip_address, token_id, token_data.context)
+    # Repeat hits are still counted by the token store and the session
+    # profile; only first sight and growing sweeps are reported one by one
+    publish, distinct_ips = SKETCHES.record_token_access(token_id, ip_address)
+    alert_data = {
+        "event_type": "honeytoken_access",
+        "token_id": token_id,
+        "ip_address": ip_address,
+        "context": token_data.context,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "access_count": token_data.access_count,
+        "distinct_ips": distinct_ips
+    }
+    if not publish:
+        store_event(alert_data)
+        return
+    logger.warning(f"HONEYTOKEN ACCESSED: {token_id} from IP: {ip_address}, context: {token_data.context}",
+                   extra={"event": {"event_type": "honeytoken_access", "token_id": token_id,
+                                    "ip_address": ip_address, "context": token_data.context,
+                                    "access_count": token_data.access_count, "distinct_ips": distinct_ips}})
 
     # Publish to Redis for real-time monitoring
-    if redis_client:
-        try:
-            alert_data = {
-                "event_type": "honeytoken_access",
-                "token_id": token_id,
-                "ip_address": ip_address,
-                "context": token_data['context'],
-                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-                "access_count": token_data["access_count"]
-            }
-            redis_client.publish("security_alerts", json.dumps(alert_data))
-            logger.info(f"Published honeytoken access to Redis: {token_id}")
-        except Exception as e:
-            logger.error(f"Failed to publish to Redis: {e}")
-
-class HealthcareHandler(BaseHTTPRequestHandler):
+    if not ALERTS.publish(alert_data):
+        logger.error(f"Alert queue full, dropped honeytoken access alert: {token_id}")
+
+def publish_heavy_hitter(username, password, attempts):
+    """Log and publish a credential whose estimated attempts crossed a threshold"""
+    logger.warning(f"Credential heavy hitter: username={username} tried about {attempts} times", extra={"event": {
+        "event_type": "credential_heavy_hitter", "username": username, "password": password,
+        "attempts": attempts}})
+    heavy_hitter = {
+        "event_type": "credential_heavy_hitter",
+        "username": username,
+        "password": password,
+        "attempts": attempts,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    if not ALERTS.publish(heavy_hitter):
+        logger.error(f"Alert queue full, dropped credential heavy hitter alert: {username}")
+
+# Internal token lookup API; disabled (plain 404) unless ADMIN_API_KEY is set
+ADMIN_API_KEY = os.environ.get("ADMIN_API_KEY", "")
+TOKEN_QUERY_MAX_LIMIT = 1000
+
+def parse_timestamp(value):
+    """Epoch seconds or an ISO 8601 date/time from a query parameter"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+# Everything under app/static, read and compressed once at startup; pages
+# link it through STATIC.url() so browsers can cache it for a year
+STATIC = StaticFiles()
+PORTAL_CSS = STATIC.url('css/portal.css')
+STARTUP.mark('static files')
+
+# Route table shared by do_GET and do_POST; handlers register themselves
+# with @ROUTES.route and read self.query / self.honeytoken
+ROUTES = Router()
+
+class HealthcareHandler(KeepAliveHandlerMixin, BaseHTTPRequestHandler):
     def do_GET(self):
         parsed_url = urlparse(self.path)
         path = parsed_url.path
-        query = parse_qs(parsed_url.query) if parsed_url.query else {}
+        self.query = parse_qs(parsed_url.query) if parsed_url.query else {}
+        # A GET body is never read, so the connection cannot be reused after it
+        if self.headers.get('Content-Length', '0') != '0' or 'Transfer-Encoding' in self.headers:
+            self.last_request = True
         
-        # Generate a honeytoken for this request
-        honeytoken = generate_honeytoken(f"page_visit:{path}")
-        
-        if path == '/':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(self.render_homepage(honeytoken).encode())
-        elif path == '/login':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            
-            error_message = ""
-            if query and 'error' in query:
-                error_message = '<div class="error">Invalid username or password. Please try again.</div>'
-            
-            self.wfile.write(self.render_login_page(honeytoken, error_message).encode())
-        elif path == '/dashboard':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(self.render_dashboard(honeytoken).encode())
-        elif path == '/patients':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
+        # Pages get a honeytoken for this request (assets never display one)
+        self.dispatch('GET', path, mint_token=not path.startswith(STATIC_PREFIX))
+    
+    def do_POST(self):
+        parsed_url = urlparse(self.path)
+        self.query = parse_qs(parsed_url.query) if parsed_url.query else {}
+        self.honeytoken = None
+        # Read the body before routing so the next request on the connection starts clean
+        self.body = self.read_body()
+        if self.body is not None:
+            self.dispatch('POST', parsed_url.path)
+    
+    def dispatch(self, method, path, mint_token=False):
+        started = time.perf_counter()
+        client_ip = self.client_address[0]
+        handler, params = ROUTES.match(method, path)
+        route = handler.__name__ if handler else None
+        # Checked before anything is minted or recorded, so an over-limit
+        # flood costs a bucket lookup and nothing else
+        if not RATE_LIMITS.allow(client_ip, route):
+            self.honeytoken = None
+            self.send_rate_limited()
+            REQUEST_SECONDS.observe(time.perf_counter() - started, 'rate_limited', method)
+            return
+        SESSIONS.record_request(client_ip, method, path)
+        SKETCHES.record_request(client_ip, route or 'not_found')
+        self.honeytoken = generate_honeytoken(f"page_visit:{path}") if mint_token else None
+        if handler is None:
+            self.send_not_found()
+            route = 'not_found'
+        else:
+            handler(self, **params)
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route, method)
+    
+    def send_response(self, code, message=None):
+        RESPONSES.inc(code)
+        super().send_response(code, message)
+    
+    def read_body(self):
+        """The request body, or None after refusing a chunked, malformed or oversized one"""
+        if 'Transfer-Encoding' in self.headers:
+            self.send_error(411)
+            return None
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send_error(400, "Bad Content-Length")
+            return None
+        if length > MAX_BODY_SIZE:
+            self.send_error(413)
+            return None
+        return self.rfile.read(length)
+    
+    def send_body(self, status, body, content_type='text/html'):
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_page(self, key, build, status=200):
+        """Send a cached page with this request's honeytoken spliced in (built afresh if ``key`` is None)"""
+        if key is None:
+            self.send_body(status, PAGE_CACHE.render_uncached(self.honeytoken, build))
+            return
+        self.send_body(status, PAGE_CACHE.render(key, self.honeytoken, build))
+    
+    def send_cached(self, entry, headers=(), cache_control='no-cache'):
+        """Send a CachedResponse, honouring conditional and Accept-Encoding headers"""
+        if entry.is_not_modified(self.headers.get('If-None-Match'), self.headers.get('If-Modified-Since')):
+            _, _, etag = entry.select(self.headers.get('Accept-Encoding'))
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', entry.last_modified_header)
+            self.send_header('Cache-Control', cache_control)
             self.end_headers()
-            self.wfile.write(self.render_patients_page(honeytoken).encode())
-        elif path.startswith('/patient/'):
-            patient_id = path.split('/')[2]
-            if patient_id in PATIENTS:
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                self.wfile.write(self.render_patient_details(patient_id, honeytoken).encode())
+            return
+        
+        body, encoding, etag = entry.select(self.headers.get('Accept-Encoding'))
+        self.send_response(200)
+        self.send_header('Content-type', entry.content_type)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', entry.last_modified_header)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_stream(self, chunks, content_type='text/html', headers=()):
+        """Send a 200 whose body is produced chunk by chunk from a generator"""
+        # Chunked encoding needs an HTTP/1.1 client; older ones get a close-delimited body
+        chunked = self.request_version == 'HTTP/1.1'
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        for name, value in headers:
+            self.send_header(name, value)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if chunked:
+                self.wfile.write(b"%X\r\n%s\r\n" % (len(chunk), chunk))
             else:
-                self.send_response(404)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                self.wfile.write(self.render_404_page().encode())
-        elif path == '/appointments':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(self.render_appointments_page(honeytoken).encode())
-        elif path == '/prescriptions':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(self.render_prescriptions_page(honeytoken).encode())
-        elif path == '/admin':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(self.render_admin_page(honeytoken).encode())
-        elif path == '/backup':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(self.render_backup_page(honeytoken).encode())
-        elif path == '/honeytoken' and query and 'token' in query:
-            token = query['token'][0]
-            client_ip = self.client_address[0]
-            check_honeytoken_access(token, client_ip)
-            
-            # Redirect to homepage to make it less obvious
-            self.send_response(302)
-            self.send_header('Location', '/')
-            self.end_headers()
-        elif path == '/api/patients':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(list(PATIENTS.values())).encode())
-        elif path.startswith('/api/patients/'):
-            patient_id = path.split('/')[3]
-            if patient_id in PATIENTS:
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps(PATIENTS[patient_id]).encode())
+                self.wfile.write(chunk)
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+    
+    def list_page_key(self, path, page):
+        """Cache key of a list view page; None for page sizes not worth caching"""
+        return (path, page.key()) if page.is_canonical() else None
+    
+    def list_page(self, collection):
+        """Page of a list view from ?page=/?limit=/?cursor= (the first page if they are malformed)"""
+        total = len(getattr(DATASET, collection))
+        try:
+            return parse_page(self.query, total)
+        except ValueError:
+            return parse_page({}, total)
+    
+    def send_list(self, path, collection):
+        """Send a JSON list API response: the whole collection, or one page of it"""
+        total = len(getattr(DATASET, collection))
+        try:
+            page = parse_page(self.query, total, default_limit=None, max_limit=MAX_API_LIMIT)
+        except ValueError as e:
+            self.send_body(400, json.dumps({"error": str(e)}).encode(), 'application/json')
+            return
+        
+        headers = [('X-Total-Count', str(total))]
+        if page.next_cursor:
+            headers.append(('Link', f'<{path}?cursor={page.next_cursor}&limit={page.limit}>; rel="next"'))
+        
+        # Small responses are cached pre-encoded; large ones are streamed so
+        # memory per request stays flat whatever the dataset size. Only the
+        # default page sizes are cached, not every range a client makes up.
+        if page.stop - page.start <= STREAM_THRESHOLD_ROWS:
+            build = lambda: json.dumps(list(DATASET.rows(collection, page.start, page.stop))).encode()
+            if page.is_canonical():
+                self.send_cached(API_CACHE.get((path, page.key()), build), headers)
             else:
-                self.send_response(404)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "Patient not found"}).encode())
+                self.send_cached(API_CACHE.build_uncached(build), headers)
         else:
-            self.send_response(404)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(self.render_404_page().encode())
+            self.send_stream(json_array_chunks(DATASET.rows(collection, page.start, page.stop)),
+                             'application/json', headers)
     
-    def do_POST(self):
-        if self.path == '/login':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length).decode('utf-8')
-            
-            # Parse form data
-            form_data = {}
-            for item in post_data.split('&'):
-                key, value = item.split('=')
-                form_data[key] = value
-            
-            username = form_data.get('username', '')
-            password = form_data.get('password', '')
-            
-            # Log login attempts
-            logger.info(f"Login attempt: username={username}, password={password}")
+    def send_redirect(self, location):
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def send_rate_limited(self):
+        """Refuse an over-limit request, handing the connection to the tarpit if configured"""
+        self.close_connection = True
+        tarpit = getattr(self.server, 'tarpit', None)
+        if RATE_LIMITS.mode == 'tarpit' and tarpit is not None and tarpit(self, TARPIT, TARPIT_RESPONSE):
+            return
+        body = b"Too Many Requests\n"
+        self.send_response(429)
+        self.send_header('Content-type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Retry-After', '1')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_not_found(self):
+        self.send_body(404, PAGE_CACHE.render('404', '', lambda token: self.render_404_page()))
+    
+    @ROUTES.route('GET', '/')
+    def serve_homepage(self):
+        self.send_page('/', self.render_homepage)
+    
+    @ROUTES.route('GET', '/login')
+    def serve_login(self):
+        error_message = ""
+        if 'error' in self.query:
+            error_message = '<div class="error">Invalid username or password. Please try again.</div>'
+        
+        self.send_page(('/login', bool(error_message)), lambda token: self.render_login_page(token, error_message))
+    
+    @ROUTES.route('GET', '/dashboard')
+    def serve_dashboard(self):
+        self.send_page('/dashboard', self.render_dashboard)
+    
+    @ROUTES.route('GET', '/patients')
+    def serve_patients(self):
+        page = self.list_page('patients')
+        self.send_page(self.list_page_key('/patients', page), lambda token: self.render_patients_page(token, page))
+    
+    @ROUTES.route('GET', '/patient/<patient_id>')
+    def serve_patient(self, patient_id):
+        if patient_id not in PATIENTS:
+            self.send_not_found()
+            return
+        self.send_page(('/patient', patient_id), lambda token: self.render_patient_details(patient_id, token))
+    
+    @ROUTES.route('GET', '/appointments')
+    def serve_appointments(self):
+        page = self.list_page('appointments')
+        self.send_page(self.list_page_key('/appointments', page), lambda token: self.render_appointments_page(token, page))
+    
+    @ROUTES.route('GET', '/prescriptions')
+    def serve_prescriptions(self):
+        page = self.list_page('prescriptions')
+        self.send_page(self.list_page_key('/prescriptions', page), lambda token: self.render_prescriptions_page(token, page))
+    
+    @ROUTES.route('GET', '/admin')
+    def serve_admin(self):
+        self.send_page('/admin', self.render_admin_page)
+    
+    def is_admin(self):
+        """Whether the request carries ``Authorization: Bearer <ADMIN_API_KEY>``"""
+        supplied = self.headers.get('Authorization', '')
+        return bool(ADMIN_API_KEY) and hmac.compare_digest(supplied.encode(), f"Bearer {ADMIN_API_KEY}".encode())
+    
+    @ROUTES.route('GET', '/admin/api/honeytokens')
+    def serve_admin_honeytokens(self):
+        # Look like any other missing page unless the caller has the key
+        if not self.is_admin():
+            self.send_not_found()
+            return
+        
+        filters = {}
+        try:
+            for name in ('context', 'ip'):
+                if name in self.query:
+                    filters[name] = self.query[name][0]
+            for name in ('created_after', 'created_before', 'accessed_after', 'accessed_before'):
+                if name in self.query:
+                    filters[name] = parse_timestamp(self.query[name][0])
+            limit = int(self.query.get('limit', ['100'])[0])
+            if not 1 <= limit <= TOKEN_QUERY_MAX_LIMIT:
+                raise ValueError(f"limit must be between 1 and {TOKEN_QUERY_MAX_LIMIT}")
+        except ValueError as e:
+            self.send_body(400, json.dumps({"error": str(e)}).encode(), 'application/json')
+            return
+        
+        matches, truncated = HONEYTOKENS.query(limit=limit, **filters)
+        tokens = [dict(record.to_dict(), token_id=token_id) for token_id, record in matches]
+        self.send_body(200, json.dumps({"count": len(tokens), "truncated": truncated, "tokens": tokens}).encode(),
+                       'application/json')
+    
+    @ROUTES.route('GET', '/admin/api/events')
+    def serve_admin_events(self):
+        if not self.is_admin() or EVENTS is None:
+            self.send_not_found()
+            return
+        
+        filters = {}
+        try:
+            for name, param in (('event_type', 'type'), ('ip', 'ip'), ('token_id', 'token')):
+                if param in self.query:
+                    filters[name] = self.query[param][0]
+            for name in ('after', 'before'):
+                if name in self.query:
+                    filters[name] = parse_timestamp(self.query[name][0])
+            limit = int(self.query.get('limit', ['100'])[0])
+            if not 1 <= limit <= TOKEN_QUERY_MAX_LIMIT:
+                raise ValueError(f"limit must be between 1 and {TOKEN_QUERY_MAX_LIMIT}")
+        except ValueError as e:
+            self.send_body(400, json.dumps({"error": str(e)}).encode(), 'application/json')
+            return
+        
+        events, truncated = EVENTS.query(limit=limit, **filters)
+        self.send_body(200, json.dumps({"count": len(events), "truncated": truncated, "events": events}).encode(),
+                       'application/json')
+    
+    @ROUTES.route('GET', '/admin/api/sketches')
+    def serve_admin_sketches(self):
+        if not self.is_admin():
+            self.send_not_found()
+            return
+        
+        total, routes = SKETCHES.distinct_ips()
+        heavy_hitters = [{"username": username, "password": password, "attempts": attempts}
+                         for username, password, attempts in SKETCHES.heavy_hitters()]
+        self.send_body(200, json.dumps({"distinct_ips": total, "distinct_ips_by_route": routes,
+                                        "heavy_hitters": heavy_hitters, "stats": SKETCHES.stats()}).encode(),
+                       'application/json')
+    
+    @ROUTES.route('GET', '/admin/api/startup')
+    def serve_admin_startup(self):
+        if not self.is_admin():
+            self.send_not_found()
+            return
+        self.send_body(200, json.dumps(STARTUP.stats()).encode(), 'application/json')
+    
+    @ROUTES.route('GET', '/metrics')
+    def serve_metrics_page(self):
+        if not self.is_admin():
+            self.send_not_found()
+            return
+        self.send_body(200, METRICS.render(), METRICS_CONTENT_TYPE)
+    
+    @ROUTES.route('GET', '/backup')
+    def serve_backup(self):
+        self.send_page('/backup', self.render_backup_page)
+    
+    @ROUTES.route('GET', '/honeytoken')
+    def serve_honeytoken(self):
+        if 'token' not in self.query:
+            self.send_not_found()
+            return
+        
+        token = self.query['token'][0]
+        client_ip = self.client_address[0]
+        check_honeytoken_access(token, client_ip)
+        
+        # Redirect to homepage to make it less obvious
+        self.send_redirect('/')
+    
+    @ROUTES.route('GET', '/static/<folder>/<filename>')
+    def serve_static(self, folder, filename):
+        asset = STATIC.get(f"{folder}/{filename}")
+        if asset is None:
+            self.send_not_found()
+            return
+        version = self.query.get('v', [None])[0]
+        self.send_cached(asset.entry, cache_control=STATIC.cache_control(asset, version))
+    
+    @ROUTES.route('GET', '/api/patients')
+    def serve_api_patients(self):
+        self.send_list('/api/patients', 'patients')
+    
+    @ROUTES.route('GET', '/api/appointments')
+    def serve_api_appointments(self):
+        self.send_list('/api/appointments', 'appointments')
+    
+    @ROUTES.route('GET', '/api/prescriptions')
+    def serve_api_prescriptions(self):
+        self.send_list('/api/prescriptions', 'prescriptions')
+    
+    @ROUTES.route('GET', '/api/patients/<patient_id>')
+    def serve_api_patient(self, patient_id):
+        if patient_id in PATIENTS:
+            self.send_cached(API_CACHE.get(('/api/patients', patient_id),
+                                           lambda: json.dumps(PATIENTS[patient_id]).encode()))
+        else:
+            self.send_body(404, json.dumps({"error": "Patient not found"}).encode(), 'application/json')
+    
+    @ROUTES.route('GET', '/api/patients/<patient_id>/appointments')
+    def serve_api_patient_appointments(self, patient_id):
+        if patient_id in PATIENTS:
+            self.send_cached(API_CACHE.get(('/api/appointments', patient_id),
+                                           lambda: json.dumps(DATASET.appointments_for_patient(patient_id)).encode()))
+        else:
+            self.send_body(404, json.dumps({"error": "Patient not found"}).encode(), 'application/json')
+    
+    @ROUTES.route('GET', '/api/patients/<patient_id>/prescriptions')
+    def serve_api_patient_prescriptions(self, patient_id):
+        if patient_id in PATIENTS:
+            self.send_cached(API_CACHE.get(('/api/prescriptions', patient_id),
+                                           lambda: json.dumps(DATASET.prescriptions_for_patient(patient_id)).encode()))
+        else:
+            self.send_body(404, json.dumps({"error": "Patient not found"}).encode(), 'application/json')
+    
+    @ROUTES.route('POST', '/login')
+    def handle_login(self):
+        # Scanners send empty and malformed bodies too; missing fields are empty
+        form_data = parse_qs(self.body.decode('utf-8', errors='replace'), keep_blank_values=True)
+        username = form_data.get('username', [''])[0]
+        password = form_data.get('password', [''])[0]
+        
+        # Log login attempts
+        client_ip = self.client_address[0]
+        success = username in USERS and USERS[username] == password
+        SESSIONS.record_login(client_ip, username, password, success)
+        login_data = {
+            "event_type": "login_attempt",
+            "username": username,
+            "password": password,
+            "ip_address": client_ip,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "success": success
+        }
+        # Only the first attempt from an IP and successes are reported one by
+        # one; the rest arrive as periodic summaries
+        if LOGINS.record(client_ip, username, password, success):
+            logger.info(f"Login attempt: username={username}, password={password}", extra={"event": {
+                "event_type": "login_attempt", "username": username, "password": password,
+                "ip_address": client_ip, "success": success}})
             
             # Publish login attempt to Redis
-            if redis_client:
-                try:
-                    client_ip = self.client_address[0]
-                    login_data = {
-                        "event_type": "login_attempt",
-                        "username": username,
-                        "password": password,
-                        "ip_address": client_ip,
-                        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-                        "success": username in USERS and USERS[username] == password
-                    }
-                    redis_client.publish("security_alerts", json.dumps(login_data))
-                except Exception as e:
-                    logger.error(f"Failed to publish login attempt to Redis: {e}")
-
-            # Check credentials
-            if username in USERS and USERS[username] == password:
-                # Successful login
-                self.send_response(302)
-                self.send_header('Location', '/dashboard')
-                self.end_headers()
-            else:
-                # Failed login
-                self.send_response(302)
-                self.send_header('Location', '/login?error=1')
-                self.end_headers()
+            if not ALERTS.publish(login_data):
+                logger.error("Alert queue full, dropped login attempt alert")
         else:
-            self.send_response(404)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(self.render_404_page().encode())
+            store_event(login_data)
+        
+        # The same credential tried from many IPs escapes the per-IP coalescing
+        attempts = SKETCHES.record_credential(username, password)
+        if attempts is not None:
+            publish_heavy_hitter(username, password, attempts)
+
+        # Check credentials
+        if success:
+            # Successful login
+            self.send_redirect('/dashboard')
+        else:
+            # Failed login
+            self.send_redirect('/login?error=1')
     
     def render_homepage(self, honeytoken):
         return f"""
@@ -297,12 +790,7 @@ class HealthcareHandler(BaseHTTPRequestHandler):
         <html>
         <head>
             <title>Healthcare System</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; }}
-                h1 {{ color: #0056b3; }}
-                .login-box {{ max-width: 400px; margin: 20px auto; padding: 20px; background-color: #f0f0f0; border-radius: 5px; }}
-                .btn {{ background-color: #0056b3; color: white; padding: 10px 15px; text-decoration: none; border-radius: 5px; display: inline-block; }}
-            </style>
+            <link rel="stylesheet" href="{PORTAL_CSS}">
         </head>
         <body>
             <h1>Healthcare System Deception Framework</h1>
@@ -331,16 +819,7 @@ class HealthcareHandler(BaseHTTPRequestHandler):
         <html>
         <head>
             <title>Login - Healthcare System</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; }}
-                h1 {{ color: #0056b3; }}
-                .login-form {{ max-width: 400px; margin: 0 auto; padding: 20px; background-color: #f0f0f0; border-radius: 5px; }}
-                .form-group {{ margin-bottom: 15px; }}
-                label {{ display: block; margin-bottom: 5px; }}
-                input {{ width: 100%; padding: 8px; border: 1px solid #ddd; border-radius: 4px; }}
-                .btn {{ background-color: #0056b3; color: white; padding: 10px 15px; border: none; border-radius: 5px; cursor: pointer; }}
-                .error {{ color: red; margin-bottom: 15px; }}
-            </style>
+            <link rel="stylesheet" href="{PORTAL_CSS}">
         </head>
         <body>
             <h1>Healthcare System Portal</h1>
@@ -375,18 +854,7 @@ class HealthcareHandler(BaseHTTPRequestHandler):
         <html>
         <head>
             <title>Dashboard - Healthcare System</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; }}
-                h1 {{ color: #0056b3; }}
-                nav {{ background-color: #0056b3; padding: 10px; margin-bottom: 20px; }}
-                nav a {{ color: white; margin-right: 15px; text-decoration: none; }}
-                .dashboard {{ padding: 20px; background-color: #f0f0f0; border-radius: 5px; }}
-                .stats {{ display: flex; justify-content: space-between; margin-bottom: 20px; }}
-                .stat-card {{ flex: 1; margin: 10px; padding: 15px; background-color: white; border-radius: 5px; text-align: center; }}
-                .stat-value {{ font-size: 24px; font-weight: bold; color: #0056b3; }}
-                .patient-list {{ background-color: white; padding: 15px; border-radius: 5px; }}
-                .patient-item {{ padding: 10px; border-bottom: 1px solid #eee; }}
-            </style>
+            <link rel="stylesheet" href="{PORTAL_CSS}">
         </head>
         <body>
             <h1>Healthcare System Portal</h1>
@@ -440,9 +908,10 @@ class HealthcareHandler(BaseHTTPRequestHandler):
         </html>
         """
     
-    def render_patients_page(self, honeytoken):
+    def render_patients_page(self, honeytoken, page):
         patients_html = ""
-        for patient_id, patient in PATIENTS.items():
+        for patient in DATASET.rows('patients', page.start, page.stop):
+            patient_id = patient['id']
             patients_html += f"""
             <tr>
                 <td>{patient_id}</td>
@@ -461,16 +930,7 @@ class HealthcareHandler(BaseHTTPRequestHandler):
         <html>
         <head>
             <title>Patients - Healthcare System</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; }}
-                h1 {{ color: #0056b3; }}
-                nav {{ background-color: #0056b3; padding: 10px; margin-bottom: 20px; }}
-                nav a {{ color: white; margin-right: 15px; text-decoration: none; }}
-                table {{ width: 100%; border-collapse: collapse; margin-top: 20px; }}
-                th, td {{ padding: 10px; text-align: left; border-bottom: 1px solid #ddd; }}
-                th {{ background-color: #f2f2f2; }}
-                .btn-small {{ background-color: #0056b3; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px; font-size: 12px; }}
-            </style>
+            <link rel="stylesheet" href="{PORTAL_CSS}">
         </head>
         <body>
             <h1>Healthcare System Portal</h1>
@@ -501,6 +961,8 @@ class HealthcareHandler(BaseHTTPRequestHandler):
                 </tbody>
             </table>
             
+            {self.render_pager('/patients', page)}
+            
             <!-- Hidden honeytoken -->
             <!-- Honeytoken: {honeytoken} -->
         </body>
@@ -518,17 +980,7 @@ class HealthcareHandler(BaseHTTPRequestHandler):
         <html>
         <head>
             <title>Patient Details - Healthcare System</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; }}
-                h1 {{ color: #0056b3; }}
-                nav {{ background-color: #0056b3; padding: 10px; margin-bottom: 20px; }}
-                nav a {{ color: white; margin-right: 15px; text-decoration: none; }}
-                .patient-info {{ margin-bottom: 20px; padding: 15px; background-color: #f0f0f0; border-radius: 5px; }}
-                .info-grid {{ display: grid; grid-template-columns: repeat(2, 1fr); gap: 10px; }}
-                .info-item {{ margin-bottom: 10px; }}
-                label {{ font-weight: bold; display: block; }}
-                .btn {{ background-color: #0056b3; color: white; padding: 10px 15px; text-decoration: none; border-radius: 5px; display: inline-block; }}
-            </style>
+            <link rel="stylesheet" href="{PORTAL_CSS}">
         </head>
         <body>
             <h1>Healthcare System Portal</h1>
@@ -617,9 +1069,9 @@ class HealthcareHandler(BaseHTTPRequestHandler):
         </html>
         """
     
-    def render_appointments_page(self, honeytoken):
+    def render_appointments_page(self, honeytoken, page):
         appointments_html = ""
-        for appointment in APPOINTMENTS:
+        for appointment in DATASET.rows('appointments', page.start, page.stop):
             appointments_html += f"""
             <tr>
                 <td>{appointment['id']}</td>
@@ -636,16 +1088,7 @@ class HealthcareHandler(BaseHTTPRequestHandler):
         <html>
         <head>
             <title>Appointments - Healthcare System</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; }}
-                h1 {{ color: #0056b3; }}
-                nav {{ background-color: #0056b3; padding: 10px; margin-bottom: 20px; }}
-                nav a {{ color: white; margin-right: 15px; text-decoration: none; }}
-                table {{ width: 100%; border-collapse: collapse; margin-top: 20px; }}
-                th, td {{ padding: 10px; text-align: left; border-bottom: 1px solid #ddd; }}
-                th {{ background-color: #f2f2f2; }}
-                .btn {{ background-color: #0056b3; color: white; padding: 10px 15px; text-decoration: none; border-radius: 5px; display: inline-block; }}
-            </style>
+            <link rel="stylesheet" href="{PORTAL_CSS}">
         </head>
         <body>
             <h1>Healthcare System Portal</h1>
@@ -676,15 +1119,17 @@ class HealthcareHandler(BaseHTTPRequestHandler):
                 </tbody>
             </table>
             
+            {self.render_pager('/appointments', page)}
+            
             <!-- Hidden honeytoken -->
             <!-- Honeytoken: {honeytoken} -->
         </body>
         </html>
         """
     
-    def render_prescriptions_page(self, honeytoken):
+    def render_prescriptions_page(self, honeytoken, page):
         prescriptions_html = ""
-        for prescription in PRESCRIPTIONS:
+        for prescription in DATASET.rows('prescriptions', page.start, page.stop):
             prescriptions_html += f"""
             <tr>
                 <td>{prescription['id']}</td>
@@ -702,16 +1147,7 @@ class HealthcareHandler(BaseHTTPRequestHandler):
         <html>
         <head>
             <title>Prescriptions - Healthcare System</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; }}
-                h1 {{ color: #0056b3; }}
-                nav {{ background-color: #0056b3; padding: 10px; margin-bottom: 20px; }}
-                nav a {{ color: white; margin-right: 15px; text-decoration: none; }}
-                table {{ width: 100%; border-collapse: collapse; margin-top: 20px; }}
-                th, td {{ padding: 10px; text-align: left; border-bottom: 1px solid #ddd; }}
-                th {{ background-color: #f2f2f2; }}
-                .btn {{ background-color: #0056b3; color: white; padding: 10px 15px; text-decoration: none; border-radius: 5px; display: inline-block; }}
-            </style>
+            <link rel="stylesheet" href="{PORTAL_CSS}">
         </head>
         <body>
             <h1>Healthcare System Portal</h1>
@@ -743,34 +1179,30 @@ class HealthcareHandler(BaseHTTPRequestHandler):
                 </tbody>
             </table>
             
+            {self.render_pager('/prescriptions', page)}
+            
             <!-- Hidden honeytoken -->
             <!-- Honeytoken: {honeytoken} -->
         </body>
         </html>
         """
     
+    def render_pager(self, path, page):
+        links = ""
+        if page.number > 1:
+            links += f'<a href="{path}?page={page.number - 1}&limit={page.limit}">&laquo; Previous</a>'
+        if page.stop < page.total:
+            links += f'<a href="{path}?page={page.number + 1}&limit={page.limit}">Next &raquo;</a>'
+        shown = f"{page.start + 1}&ndash;{page.stop}" if page.stop > page.start else "0"
+        return f'<div class="pager">Showing {shown} of {page.total} &middot; Page {page.number} of {page.pages}{links}</div>'
+    
     def render_admin_page(self, honeytoken):
         return f"""
         <!DOCTYPE html>
         <html>
         <head>
             <title>Admin Panel - Healthcare System</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; }}
-                h1 {{ color: #0056b3; }}
-                nav {{ background-color: #0056b3; padding: 10px; margin-bottom: 20px; }}
-                nav a {{ color: white; margin-right: 15px; text-decoration: none; }}
-                .admin-section {{ margin-bottom: 30px; padding: 15px; background-color: #f0f0f0; border-radius: 5px; }}
-                .admin-actions {{ display: flex; flex-wrap: wrap; gap: 10px; margin-top: 15px; }}
-                .btn {{ background-color: #0056b3; color: white; padding: 10px 15px; text-decoration: none; border-radius: 5px; display: inline-block; }}
-                table {{ width: 100%; border-collapse: collapse; margin-top: 20px; }}
-                th, td {{ padding: 10px; text-align: left; border-bottom: 1px solid #ddd; }}
-                th {{ background-color: #f2f2f2; }}
-                .btn-small {{ background-color: #0056b3; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px; font-size: 12px; }}
-                .info-grid {{ display: grid; grid-template-columns: repeat(2, 1fr); gap: 10px; }}
-                .info-item {{ margin-bottom: 10px; }}
-                label {{ font-weight: bold; }}
-            </style>
+            <link rel="stylesheet" href="{PORTAL_CSS}">
         </head>
         <body>
             <h1>Healthcare System Portal</h1>
@@ -881,22 +1313,7 @@ class HealthcareHandler(BaseHTTPRequestHandler):
         <html>
         <head>
             <title>System Backup - Healthcare System</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; }}
-                h1 {{ color: #0056b3; }}
-                nav {{ background-color: #0056b3; padding: 10px; margin-bottom: 20px; }}
-                nav a {{ color: white; margin-right: 15px; text-decoration: none; }}
-                .admin-section {{ margin-bottom: 30px; padding: 15px; background-color: #f0f0f0; border-radius: 5px; }}
-                .form-group {{ margin-bottom: 15px; }}
-                label {{ display: block; margin-bottom: 5px; }}
-                input {{ width: 100%; padding: 8px; border: 1px solid #ddd; border-radius: 4px; }}
-                .checkbox-group {{ margin-bottom: 10px; }}
-                .btn {{ background-color: #0056b3; color: white; padding: 10px 15px; border: none; border-radius: 5px; cursor: pointer; }}
-                table {{ width: 100%; border-collapse: collapse; margin-top: 20px; }}
-                th, td {{ padding: 10px; text-align: left; border-bottom: 1px solid #ddd; }}
-                th {{ background-color: #f2f2f2; }}
-                .btn-small {{ background-color: #0056b3; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px; font-size: 12px; }}
-            </style>
+            <link rel="stylesheet" href="{PORTAL_CSS}">
         </head>
         <body>
             <h1>Healthcare System Portal</h1>
@@ -995,15 +1412,12 @@ class HealthcareHandler(BaseHTTPRequestHandler):
         """
     
     def render_404_page(self):
-        return """
+        return f"""
         <!DOCTYPE html>
         <html>
         <head>
             <title>404 - Not Found</title>
-            <style>
-                body { font-family: Arial, sans-serif; margin: 0; padding: 20px; }
-                h1 { color: #0056b3; }
-            </style>
+            <link rel="stylesheet" href="{PORTAL_CSS}">
         </head>
         <body>
             <h1>404 - Page Not Found</h1>
@@ -1013,8 +1427,122 @@ class HealthcareHandler(BaseHTTPRequestHandler):
         </html>
         """
 
-if __name__ == '__main__':
-    server_address = ('', 5002)
-    httpd = HTTPServer(server_address, HealthcareHandler)
-    print(f"Server running at http://localhost:5002")
+# Page builds only run on a page cache miss, so timing them is close to free
+for _name in [name for name in vars(HealthcareHandler) if name.startswith('render_')]:
+    setattr(HealthcareHandler, _name, RENDER_SECONDS.timed(getattr(HealthcareHandler, _name), _name))
+del _name
+STARTUP.mark('routes and handler')
+
+def init_worker(index):
+    """
+    Rebuild per-process state in pre-forked worker ``index``. Threads do not
+    survive fork, so the log writer and the alert, login and session workers
+    are replaced, and Redis connections are reopened. Honeytokens stay in the
+    shared store created before the fork.
+    """
+    global LOG_QUEUE, EVENTS, ALERTS, SESSIONS, LOGINS, SKETCHES
+    reset_redis_client()
+    # A rotating file cannot be shared: a worker renaming it would leave the
+    # others writing to the old file. Each worker logs to LOG_PATH.worker<index>
+    # (not .<index>, which is what the supervisor's own file rotates to).
+    LOG_QUEUE = logging_from_env(f".worker{index}")
+    # Each worker has its own event store and overflow file, so no alert is
+    # published by two workers
+    EVENTS = event_store_from_env(f".{index}")
+    ALERTS = publisher_from_env(get_redis_client, latency_histogram=PUBLISH_SECONDS, event_store=EVENTS)
+    ALERTS.overflow_path = f"{ALERTS.overflow_path}.{index}"
+    SESSIONS = sessions_from_env(publish_profile)
+    LOGINS = logins_from_env(publish_login_summary)
+    SKETCHES = sketches_from_env()
+    ALERTS.start()
+    LOGINS.start()
+    SESSIONS.start()
+    logger.info(f"Worker {index} started (pid {os.getpid()})")
+
+def build_server(args, server_address, worker=None):
+    """Bind the configured server, then start the deferred startup tasks; ``worker`` is a pre-forked worker's index"""
+    if worker is not None:
+        init_worker(worker)
+    httpd = make_server(args.mode, server_address, HealthcareHandler, workers=args.workers,
+                        max_connections=args.max_connections, timeout=args.timeout,
+                        max_requests=args.max_requests, keepalive_timeout=args.keepalive_timeout,
+                        reuse_port=worker is not None)
+    STARTUP.mark('bind')
+    STARTUP.run_deferred()
+    METRICS.gauge('healthcare_open_connections', 'Client connections currently open',
+                  lambda: httpd.active_connections)
+    return httpd
+
+def serve(args, server_address, worker=None):
+    """Build the configured server and serve until interrupted; ``worker`` is a pre-forked worker's index"""
+    httpd = build_server(args, server_address, worker)
+    if args.metrics_port:
+        # Metrics are per process; worker N serves them on metrics_port + N
+        serve_metrics(METRICS, args.metrics_port + (worker or 0))
     httpd.serve_forever()
+
+def measure_startup(args):
+    """Bind an ephemeral port, time the first GET / and the deferred tasks, and print the breakdown"""
+    import http.client
+    import threading
+
+    httpd = build_server(args, ('127.0.0.1', 0))
+    threading.Thread(target=httpd.serve_forever, name="measure-startup", daemon=True).start()
+    started = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', httpd.server_address[1], timeout=30)
+    conn.request('GET', '/')
+    status = conn.getresponse().status
+    first_request = time.perf_counter() - started
+    first_request_at = STARTUP.elapsed()
+    conn.close()
+    STARTUP.wait()
+    httpd.shutdown()
+    httpd.server_close()
+
+    print(STARTUP.report())
+    print(f"{'first request':<24} {first_request * 1000:>9.1f}  (HTTP {status}, "
+          f"{first_request_at * 1000:.1f} ms after start)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Healthcare System Deception Framework")
+    parser.add_argument('--mode', choices=SERVER_MODES, default=os.environ.get('SERVER_MODE', 'threaded'),
+                        help="serving engine (default: threaded)")
+    parser.add_argument('--port', type=int, default=int(os.environ.get('SERVER_PORT', 5002)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SERVER_WORKERS', DEFAULT_WORKERS)),
+                        help="worker threads handling requests")
+    parser.add_argument('--max-connections', type=int,
+                        default=int(os.environ.get('SERVER_MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS)),
+                        help="open connections accepted before new ones get a 503")
+    parser.add_argument('--timeout', type=float, default=float(os.environ.get('SERVER_TIMEOUT', DEFAULT_TIMEOUT)),
+                        help="per-connection socket timeout in seconds")
+    parser.add_argument('--max-requests', type=int,
+                        default=int(os.environ.get('SERVER_MAX_REQUESTS', DEFAULT_MAX_REQUESTS)),
+                        help="requests served on one connection before it is closed (1 disables keep-alive)")
+    parser.add_argument('--keepalive-timeout', type=float,
+                        default=float(os.environ.get('SERVER_KEEPALIVE_TIMEOUT', DEFAULT_KEEPALIVE_TIMEOUT)),
+                        help="seconds an idle keep-alive connection waits for its next request")
+    parser.add_argument('--processes', type=int, default=int(os.environ.get('SERVER_PROCESSES', 1)),
+                        help="pre-forked worker processes sharing the port (default: 1, no forking)")
+    parser.add_argument('--metrics-port', type=int, default=int(os.environ.get('METRICS_PORT', 0)),
+                        help="internal port serving /metrics (default: off)")
+    parser.add_argument('--measure-startup', action='store_true',
+                        help="print how long each startup phase and the first request take, then exit")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+    server_address = ('', args.port)
+    if args.measure_startup:
+        measure_startup(args)
+    elif args.processes > 1:
+        # Created before forking so a token minted by one worker is known to all
+        HONEYTOKENS = store_from_env(args.processes)
+        # Threads do not survive fork, so the deferred tasks run here, once,
+        # rather than in every worker
+        STARTUP.run_deferred(background=False)
+        print(f"Server running at http://localhost:{args.port} ({args.processes} processes, "
+              f"{args.mode} mode, {args.workers} workers each)")
+        serve_prefork(server_address, args.processes, lambda index, address: serve(args, address, index))
+    else:
+        print(f"Server running at http://localhost:{args.port} ({args.mode} mode, {args.workers} workers)")
+        serve(args, server_address)
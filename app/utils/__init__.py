@@ -5,7 +5,13 @@ This package contains various utility modules used throughout the application,
 including honeytoken management and security monitoring tools.
 """
 
-# Import key utilities to make them available at the package level
-from .honeytoken_manager import generate_honeytoken, check_honeytoken_access
+__all__ = ['generate_honeytoken', 'check_honeytoken_access']
 
-__all__ = ['generate_honeytoken', 'check_honeytoken_access']
\ No newline at end of file
+
+def __getattr__(name):
+    # Imported on first use so that importing any utils module does not pull
+    # in honeytoken_manager (and with it the redis client library)
+    if name in __all__:
+        from . import honeytoken_manager
+        return getattr(honeytoken_manager, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
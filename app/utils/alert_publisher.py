@@ -0,0 +1,316 @@
+"""
+Background, batched publisher for security alerts.
+
+Request handlers hand events to ``AlertPublisher.publish``, which only puts
+them on a bounded queue. A worker thread serializes them and publishes them
+to Redis in pipelined batches. While Redis is unreachable the worker backs
+off between reconnect attempts and appends batches to an overflow file on
+disk, which is replayed in batches ahead of new events once Redis is back
+and removed when drained.
+
+Given a ``utils.event_store.EventStore``, the publisher uses it as an outbox
+instead of the queue and the overflow file. Events are committed to SQLite
+first, then published in id order and marked delivered. Delivery is at least
+once: a crash between publishing and marking resends that batch.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNEL = "security_alerts"
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 0.25
+DEFAULT_MAX_BACKOFF = 30.0
+DEFAULT_MAX_OVERFLOW_BYTES = 256 * 1024 * 1024
+
+_STOP = object()
+
+
+class AlertPublisher:
+    """Queue-fed Redis publisher with batching, backoff and disk overflow"""
+
+    def __init__(self, client_factory, channel=DEFAULT_CHANNEL, queue_size=DEFAULT_QUEUE_SIZE,
+                 batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 overflow_path=None, max_overflow_bytes=DEFAULT_MAX_OVERFLOW_BYTES,
+                 max_backoff=DEFAULT_MAX_BACKOFF, latency_histogram=None, event_store=None):
+        self.client_factory = client_factory
+        self.channel = channel
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_path = overflow_path
+        self.max_overflow_bytes = max_overflow_bytes
+        self.max_backoff = max_backoff
+        # Optional utils.metrics.Histogram observing each batch's publish time
+        self.latency_histogram = latency_histogram
+        self.event_store = event_store
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._drop_lock = threading.Lock()
+        self._client = None
+        self._backoff = 0.0
+        self._next_attempt = 0.0
+        # Bytes of the overflow file already replayed
+        self._replay_offset = 0
+
+        self.published = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.failed_batches = 0
+        self.failed_connects = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self._latency_total = 0.0
+        self._batches = 0
+
+    def publish(self, event):
+        """Queue ``event`` for publishing; never blocks the caller"""
+        if self._thread is None:
+            self.start()
+        if self.event_store is not None:
+            if self.event_store.record(event, pending=True):
+                return True
+            self._count_dropped(1)
+            return False
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+            return False
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            run = self._run if self.event_store is None else self._run_outbox
+            self._thread = threading.Thread(target=run, name="alert-publisher", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout=5.0):
+        """Flush queued events and stop the worker"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "published": self.published,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "failed_batches": self.failed_batches,
+            "failed_connects": self.failed_connects,
+            "connected": self._client is not None,
+            "last_publish_latency": self.last_latency,
+            "max_publish_latency": self.max_latency,
+            "avg_publish_latency": self._latency_total / self._batches if self._batches else 0.0,
+        }
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                batch.append(item)
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+            payloads = [json.dumps(event) for event in batch]
+            if stopping:
+                # Drain whatever is left so nothing queued is lost on shutdown
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        payloads.append(json.dumps(item))
+            self._flush(payloads)
+
+    def _run_outbox(self):
+        stopping = False
+        while not stopping:
+            try:
+                stopping = self._queue.get(timeout=self.flush_interval) is _STOP
+            except queue.Empty:
+                pass
+            self._deliver_stored()
+
+    def _deliver_stored(self):
+        """Publish the event store's undelivered rows until none are left or Redis fails"""
+        client = self._connected_client()
+        if client is None:
+            return
+        try:
+            # Left over from before the store was configured
+            self._replay_overflow(client)
+        except Exception as e:
+            self._disconnect(e)
+            return
+        while True:
+            rows = self.event_store.pending(self.batch_size)
+            if not rows:
+                return
+            try:
+                self._send(client, [payload for _, payload in rows])
+            except Exception as e:
+                self._disconnect(e)
+                return
+            self.event_store.mark_delivered([event_id for event_id, _ in rows])
+
+    def _flush(self, payloads):
+        client = self._connected_client()
+        if client is None:
+            self._spill(payloads)
+            return
+
+        start = 0
+        try:
+            self._replay_overflow(client)
+            for start in range(0, len(payloads), self.batch_size):
+                self._send(client, payloads[start:start + self.batch_size])
+        except Exception as e:
+            self._disconnect(e)
+            self._spill(payloads[start:])
+
+    def _connected_client(self):
+        if self._client is not None:
+            return self._client
+        if time.monotonic() < self._next_attempt:
+            return None
+        try:
+            client = self.client_factory()
+            client.ping()
+        except Exception as e:
+            self._disconnect(e, connecting=True)
+            return None
+
+        logger.info("Alert publisher connected to Redis")
+        self._client = client
+        self._backoff = 0.0
+        return client
+
+    def _disconnect(self, error, connecting=False):
+        if self._client is not None or self._backoff == 0.0:
+            logger.error(f"Failed to publish to Redis: {error}")
+        self._client = None
+        if connecting:
+            self.failed_connects += 1
+        else:
+            self.failed_batches += 1
+        self._backoff = min(self.max_backoff, self._backoff * 2 if self._backoff else 0.5)
+        self._next_attempt = time.monotonic() + self._backoff
+
+    def _send(self, client, payloads):
+        if not payloads:
+            return
+        started = time.perf_counter()
+        pipe = client.pipeline(transaction=False)
+        for payload in payloads:
+            pipe.publish(self.channel, payload)
+        pipe.execute()
+        latency = time.perf_counter() - started
+
+        self.published += len(payloads)
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self._latency_total += latency
+        self._batches += 1
+        if self.latency_histogram is not None:
+            self.latency_histogram.observe(latency)
+
+    def _spill(self, payloads):
+        if not payloads:
+            return
+        if not self.overflow_path:
+            self._count_dropped(len(payloads))
+            return
+        try:
+            if os.path.exists(self.overflow_path) and \
+                    os.path.getsize(self.overflow_path) - self._replay_offset >= self.max_overflow_bytes:
+                self._count_dropped(len(payloads))
+                return
+            with open(self.overflow_path, "a", encoding="utf-8") as overflow:
+                overflow.write("\n".join(payloads) + "\n")
+            self.spilled += len(payloads)
+        except OSError as e:
+            logger.error(f"Failed to write alert overflow file {self.overflow_path}: {e}")
+            self._count_dropped(len(payloads))
+
+    def _replay_overflow(self, client):
+        """Send the overflow file a batch at a time from the first unsent line, then remove it"""
+        if not self.overflow_path or not os.path.exists(self.overflow_path):
+            return
+
+        sent = 0
+        with open(self.overflow_path, "rb") as overflow:
+            overflow.seek(self._replay_offset)
+            while True:
+                chunk = []
+                while len(chunk) < self.batch_size:
+                    line = overflow.readline()
+                    if not line:
+                        break
+                    if line.strip():
+                        chunk.append(line.rstrip(b"\n").decode("utf-8"))
+                if not chunk:
+                    break
+                self._send(client, chunk)
+                sent += len(chunk)
+                # Only past lines that made it out, so a failure resumes here
+                self._replay_offset = overflow.tell()
+        os.remove(self.overflow_path)
+        self._replay_offset = 0
+        if sent:
+            logger.info(f"Replayed {sent} spilled alerts to Redis")
+
+    def _count_dropped(self, count):
+        with self._drop_lock:
+            self.dropped += count
+
+
+def publisher_from_env(client_factory, latency_histogram=None, event_store=None):
+    """Build a publisher configured by ALERT_* environment variables"""
+    return AlertPublisher(
+        client_factory,
+        channel=os.environ.get("ALERT_CHANNEL", DEFAULT_CHANNEL),
+        queue_size=int(os.environ.get("ALERT_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)),
+        batch_size=int(os.environ.get("ALERT_BATCH_SIZE", DEFAULT_BATCH_SIZE)),
+        flush_interval=float(os.environ.get("ALERT_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)),
+        overflow_path=os.environ.get("ALERT_OVERFLOW_PATH", "alerts_overflow.jsonl"),
+        max_backoff=float(os.environ.get("ALERT_MAX_BACKOFF", DEFAULT_MAX_BACKOFF)),
+        latency_histogram=latency_histogram,
+        event_store=event_store,
+    )
@@ -0,0 +1,483 @@
+"""
+Decoy patient, appointment and prescription data.
+
+``InlineDataset`` wraps the small hand-written records in simple_server.py.
+``ColumnarDataset`` holds a seeded, generated population of any size in
+compact typed columns (small integers indexing shared vocabularies), which
+are saved as raw files and memory-mapped on load so they live in the page
+cache rather than the Python heap. Patient IDs and SSNs are derived from
+the row number, so they take no storage at all.
+
+Both expose the same interface: ``patients`` (a read-only mapping of
+patient ID to record dict), ``appointments`` and ``prescriptions``
+(read-only sequences of record dicts), ``rows()`` for paging through any
+of them, and indexed lookups by patient, doctor and date that never scan
+the full lists.
+"""
+import argparse
+import json
+import mmap
+import os
+import random
+import time
+from array import array
+from collections import defaultdict
+from collections.abc import Mapping, Sequence
+from datetime import date
+from itertools import accumulate, islice
+
+FORMAT_VERSION = 1
+
+FIRST_NAMES = [
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth",
+    "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+    "Christopher", "Nancy", "Daniel", "Lisa", "Matthew", "Betty", "Anthony", "Margaret", "Mark", "Sandra",
+    "Donald", "Ashley", "Steven", "Kimberly", "Paul", "Emily", "Andrew", "Donna", "Joshua", "Michelle",
+    "Kenneth", "Carol", "Kevin", "Amanda", "Brian", "Dorothy", "George", "Melissa", "Timothy", "Deborah",
+    "Ronald", "Stephanie", "Edward", "Rebecca", "Jason", "Sharon", "Jeffrey", "Laura", "Ryan", "Cynthia",
+    "Jacob", "Kathleen", "Gary", "Amy", "Nicholas", "Angela", "Eric", "Shirley", "Jonathan", "Anna",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson",
+    "Walker", "Young", "Allen", "King", "Wright", "Scott", "Torres", "Nguyen", "Hill", "Flores",
+    "Green", "Adams", "Nelson", "Baker", "Hall", "Rivera", "Campbell", "Mitchell", "Carter", "Roberts",
+    "Chen", "Wong", "Patel", "Kim", "Singh", "Murphy", "Cook", "Rogers", "Morgan", "Peterson",
+]
+DOCTORS = [
+    "Dr. Sarah Johnson", "Dr. Michael Chen", "Dr. Lisa Wong", "Dr. Robert Brown", "Dr. Angela Patel",
+    "Dr. David Kim", "Dr. Maria Garcia", "Dr. James Wilson", "Dr. Priya Singh", "Dr. Thomas Murphy",
+    "Dr. Karen Lee", "Dr. Steven Clark", "Dr. Laura Martinez", "Dr. Kevin Nguyen", "Dr. Rachel Adams",
+    "Dr. Daniel Rivera", "Dr. Emily Carter", "Dr. Brian Scott", "Dr. Olivia Hall", "Dr. Mark Roberts",
+    "Dr. Nancy Lewis", "Dr. Paul Walker", "Dr. Susan Young", "Dr. Andrew King", "Dr. Helen Wright",
+    "Dr. Jason Torres", "Dr. Rebecca Hill", "Dr. Eric Green", "Dr. Amy Baker", "Dr. Gary Nelson",
+]
+# diagnosis -> medications prescribed for it
+DIAGNOSES = [
+    ("Hypertension", ["Lisinopril", "Hydrochlorothiazide"]),
+    ("Type 2 Diabetes", ["Metformin", "Glipizide"]),
+    ("Asthma", ["Albuterol", "Fluticasone"]),
+    ("Arthritis", ["Ibuprofen", "Prednisone"]),
+    ("Hyperlipidemia", ["Atorvastatin"]),
+    ("Hypothyroidism", ["Levothyroxine"]),
+    ("GERD", ["Omeprazole"]),
+    ("Major Depressive Disorder", ["Sertraline"]),
+    ("Migraine", ["Sumatriptan", "Propranolol"]),
+    ("COPD", ["Tiotropium", "Albuterol"]),
+    ("Atrial Fibrillation", ["Apixaban", "Metoprolol"]),
+    ("Generalized Anxiety Disorder", ["Buspirone"]),
+]
+# medication -> (dosage, frequency)
+MEDICATIONS = {
+    "Lisinopril": ("10mg", "Once daily"),
+    "Hydrochlorothiazide": ("25mg", "Once daily"),
+    "Metformin": ("500mg", "Twice daily"),
+    "Glipizide": ("5mg", "Once daily"),
+    "Albuterol": ("90mcg", "As needed"),
+    "Fluticasone": ("110mcg", "Twice daily"),
+    "Ibuprofen": ("600mg", "Every 6 hours as needed"),
+    "Prednisone": ("10mg", "Once daily"),
+    "Atorvastatin": ("20mg", "Once daily at bedtime"),
+    "Levothyroxine": ("50mcg", "Once daily before breakfast"),
+    "Omeprazole": ("20mg", "Once daily"),
+    "Sertraline": ("50mg", "Once daily"),
+    "Sumatriptan": ("50mg", "At migraine onset"),
+    "Propranolol": ("40mg", "Twice daily"),
+    "Tiotropium": ("18mcg", "Once daily"),
+    "Apixaban": ("5mg", "Twice daily"),
+    "Metoprolol": ("25mg", "Twice daily"),
+    "Buspirone": ("15mg", "Twice daily"),
+}
+MEDICATION_NAMES = list(MEDICATIONS)
+REASONS = ["Follow-up", "Medication review", "Annual checkup", "Pain management", "Blood pressure check",
+           "Lab results review", "New symptoms", "Referral consultation", "Vaccination", "Pre-operative assessment"]
+TIME_SLOTS = [f"{hour:02d}:{minute:02d}" for hour in range(8, 17) for minute in (0, 15, 30, 45)]
+
+# Dates are stored as days since DAY_ZERO
+DAY_ZERO = date(1900, 1, 1).toordinal()
+DOB_RANGE = (date(1930, 1, 1).toordinal() - DAY_ZERO, date(2005, 12, 31).toordinal() - DAY_ZERO)
+VISIT_RANGE = (date(2022, 1, 1).toordinal() - DAY_ZERO, date(2023, 3, 31).toordinal() - DAY_ZERO)
+APPOINTMENT_RANGE = (date(2023, 3, 1).toordinal() - DAY_ZERO, date(2024, 2, 29).toordinal() - DAY_ZERO)
+
+PATIENT_ID_BASE = 10000000
+APPOINTMENT_ID_BASE = 10000000
+PRESCRIPTION_ID_BASE = 10000000
+SSN_MULTIPLIER = 387420489  # odd and not a multiple of 5, so row -> SSN is a bijection mod 10**9
+SSN_OFFSET = 100000000
+
+# column name -> array typecode
+COLUMNS = {
+    "first_name": "H", "last_name": "H", "dob": "H", "diagnosis": "B", "doctor": "B", "last_visit": "H",
+    "appointment_offsets": "I", "prescription_offsets": "I",
+    "appointment_patient": "I", "appointment_day": "H", "appointment_slot": "B", "appointment_reason": "B",
+    "prescription_patient": "I", "prescription_medication": "B", "prescription_day": "H",
+    "prescription_refills": "B",
+    "patients_by_doctor_offsets": "I", "patients_by_doctor": "I",
+    "appointments_by_doctor_offsets": "I", "appointments_by_doctor": "I",
+    "appointments_by_day_offsets": "I", "appointments_by_day": "I",
+}
+
+
+def _day(days):
+    return date.fromordinal(DAY_ZERO + days).isoformat()
+
+
+def _days(iso_date):
+    return date.fromisoformat(iso_date).toordinal() - DAY_ZERO
+
+
+class PatientTable(Mapping):
+    """Read-only patient_id -> record mapping over a ColumnarDataset"""
+
+    def __init__(self, dataset):
+        self._dataset = dataset
+
+    def __getitem__(self, patient_id):
+        row = self._dataset.patient_row(patient_id)
+        if row is None:
+            raise KeyError(patient_id)
+        return self._dataset.patient(row)
+
+    def __contains__(self, patient_id):
+        return self._dataset.patient_row(patient_id) is not None
+
+    def __iter__(self):
+        return (f"P{PATIENT_ID_BASE + row}" for row in range(len(self)))
+
+    def __len__(self):
+        return self._dataset.patient_count
+
+
+class RecordSequence(Sequence):
+    """Read-only sequence that materializes record dicts on access"""
+
+    def __init__(self, length, build):
+        self._length = length
+        self._build = build
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._build(i) for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return self._build(index)
+
+    def __len__(self):
+        return self._length
+
+
+class ColumnarDataset:
+    """Generated decoy population stored as typed columns"""
+
+    def __init__(self, columns, meta):
+        self._columns = columns
+        self.meta = meta
+        for name in COLUMNS:
+            setattr(self, "_" + name, columns[name])
+        self.patient_count = len(self._first_name)
+        self._doctor_index = {name: i for i, name in enumerate(DOCTORS)}
+
+        self.patients = PatientTable(self)
+        self.appointments = RecordSequence(len(self._appointment_patient), self.appointment)
+        self.prescriptions = RecordSequence(len(self._prescription_patient), self.prescription)
+
+    # -- record materialization ---------------------------------------------
+
+    def patient_row(self, patient_id):
+        if not isinstance(patient_id, str) or patient_id[:1] != "P" or not patient_id[1:].isdigit():
+            return None
+        row = int(patient_id[1:]) - PATIENT_ID_BASE
+        return row if 0 <= row < self.patient_count else None
+
+    def patient_name(self, row):
+        return f"{FIRST_NAMES[self._first_name[row]]} {LAST_NAMES[self._last_name[row]]}"
+
+    def patient(self, row):
+        ssn = (row * SSN_MULTIPLIER + SSN_OFFSET) % 1000000000
+        diagnosis, medications = DIAGNOSES[self._diagnosis[row]]
+        return {
+            "id": f"P{PATIENT_ID_BASE + row}",
+            "name": self.patient_name(row),
+            "dob": _day(self._dob[row]),
+            "ssn": f"{ssn // 1000000:03d}-{ssn // 10000 % 100:02d}-{ssn % 10000:04d}",
+            "diagnosis": diagnosis,
+            "medications": list(medications),
+            "doctor": DOCTORS[self._doctor[row]],
+            "last_visit": _day(self._last_visit[row]),
+        }
+
+    def appointment(self, index):
+        row = self._appointment_patient[index]
+        return {
+            "id": f"A{APPOINTMENT_ID_BASE + index}",
+            "patient_id": f"P{PATIENT_ID_BASE + row}",
+            "patient_name": self.patient_name(row),
+            "date": _day(self._appointment_day[index]),
+            "time": TIME_SLOTS[self._appointment_slot[index]],
+            "doctor": DOCTORS[self._doctor[row]],
+            "reason": REASONS[self._appointment_reason[index]],
+        }
+
+    def prescription(self, index):
+        row = self._prescription_patient[index]
+        medication = MEDICATION_NAMES[self._prescription_medication[index]]
+        dosage, frequency = MEDICATIONS[medication]
+        return {
+            "id": f"RX{PRESCRIPTION_ID_BASE + index}",
+            "patient_id": f"P{PATIENT_ID_BASE + row}",
+            "patient_name": self.patient_name(row),
+            "medication": medication,
+            "dosage": dosage,
+            "frequency": frequency,
+            "prescribed_date": _day(self._prescription_day[index]),
+            "refills": self._prescription_refills[index],
+        }
+
+    def rows(self, collection, start=0, stop=None):
+        """Generate the records of ``collection`` in ``[start, stop)`` without materializing the rest"""
+        build, length = {
+            "patients": (self.patient, self.patient_count),
+            "appointments": (self.appointment, len(self.appointments)),
+            "prescriptions": (self.prescription, len(self.prescriptions)),
+        }[collection]
+        stop = length if stop is None else min(stop, length)
+        return map(build, range(start, stop))
+
+    # -- indexed lookups ------------------------------------------------------
+
+    def appointments_for_patient(self, patient_id):
+        row = self.patient_row(patient_id)
+        if row is None:
+            return []
+        offsets = self._appointment_offsets
+        return [self.appointment(i) for i in range(offsets[row], offsets[row + 1])]
+
+    def prescriptions_for_patient(self, patient_id):
+        row = self.patient_row(patient_id)
+        if row is None:
+            return []
+        offsets = self._prescription_offsets
+        return [self.prescription(i) for i in range(offsets[row], offsets[row + 1])]
+
+    def patients_for_doctor(self, doctor, limit=None):
+        rows = self._bucket(self._patients_by_doctor_offsets, self._patients_by_doctor,
+                            self._doctor_index.get(doctor), limit)
+        return [self.patient(row) for row in rows]
+
+    def appointments_for_doctor(self, doctor, limit=None):
+        indexes = self._bucket(self._appointments_by_doctor_offsets, self._appointments_by_doctor,
+                               self._doctor_index.get(doctor), limit)
+        return [self.appointment(i) for i in indexes]
+
+    def appointments_on(self, iso_date, limit=None):
+        try:
+            bucket = _days(iso_date) - APPOINTMENT_RANGE[0]
+        except (TypeError, ValueError):
+            return []
+        indexes = self._bucket(self._appointments_by_day_offsets, self._appointments_by_day, bucket, limit)
+        return [self.appointment(i) for i in indexes]
+
+    @staticmethod
+    def _bucket(offsets, order, bucket, limit):
+        if bucket is None or not 0 <= bucket < len(offsets) - 1:
+            return []
+        start, end = offsets[bucket], offsets[bucket + 1]
+        if limit is not None:
+            end = min(end, start + limit)
+        return order[start:end]
+
+    # -- persistence ----------------------------------------------------------
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name, typecode in COLUMNS.items():
+            column = self._columns[name]
+            if not isinstance(column, array):
+                column = array(typecode, column)
+            with open(os.path.join(directory, f"{name}.bin"), "wb") as column_file:
+                column.tofile(column_file)
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as meta_file:
+            json.dump(self.meta, meta_file)
+
+    @classmethod
+    def load(cls, directory):
+        """Memory-map a dataset saved with ``save``"""
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported dataset format in {directory}: {meta.get('format')}")
+
+        columns = {}
+        for name, typecode in COLUMNS.items():
+            path = os.path.join(directory, f"{name}.bin")
+            if os.path.getsize(path) == 0:
+                columns[name] = array(typecode)
+                continue
+            with open(path, "rb") as column_file:
+                mapped = mmap.mmap(column_file.fileno(), 0, access=mmap.ACCESS_READ)
+            columns[name] = memoryview(mapped).cast(typecode)
+        return cls(columns, meta)
+
+
+class InlineDataset:
+    """The same interface over plain dicts and lists (the built-in records)"""
+
+    def __init__(self, patients, appointments, prescriptions):
+        self.patients = patients
+        self.appointments = appointments
+        self.prescriptions = prescriptions
+        self.patient_count = len(patients)
+
+        self._appointments_by_patient = defaultdict(list)
+        self._appointments_by_doctor = defaultdict(list)
+        self._appointments_by_date = defaultdict(list)
+        for appointment in appointments:
+            self._appointments_by_patient[appointment["patient_id"]].append(appointment)
+            self._appointments_by_doctor[appointment["doctor"]].append(appointment)
+            self._appointments_by_date[appointment["date"]].append(appointment)
+
+        self._prescriptions_by_patient = defaultdict(list)
+        for prescription in prescriptions:
+            self._prescriptions_by_patient[prescription["patient_id"]].append(prescription)
+
+        self._patients_by_doctor = defaultdict(list)
+        for patient in patients.values():
+            self._patients_by_doctor[patient["doctor"]].append(patient)
+
+    def rows(self, collection, start=0, stop=None):
+        records = self.patients.values() if collection == "patients" else getattr(self, collection)
+        return islice(records, start, stop)
+
+    def appointments_for_patient(self, patient_id):
+        return list(self._appointments_by_patient.get(patient_id, ()))
+
+    def prescriptions_for_patient(self, patient_id):
+        return list(self._prescriptions_by_patient.get(patient_id, ()))
+
+    def patients_for_doctor(self, doctor, limit=None):
+        return self._patients_by_doctor.get(doctor, [])[:limit]
+
+    def appointments_for_doctor(self, doctor, limit=None):
+        return self._appointments_by_doctor.get(doctor, [])[:limit]
+
+    def appointments_on(self, iso_date, limit=None):
+        return self._appointments_by_date.get(iso_date, [])[:limit]
+
+
+def _group(keys, buckets):
+    """Counting sort: (offsets, order) so order[offsets[k]:offsets[k + 1]] are the positions with key k"""
+    counts = [0] * (buckets + 1)
+    for key in keys:
+        counts[key + 1] += 1
+    offsets = array("I", accumulate(counts))
+    cursor = list(offsets[:-1])
+    order = array("I", bytes(4 * len(keys)))
+    for position, key in enumerate(keys):
+        order[cursor[key]] = position
+        cursor[key] += 1
+    return offsets, order
+
+
+def generate(patient_count, seed=1337):
+    """Generate a consistent population of ``patient_count`` patients"""
+    rng = random.Random(seed)
+    randrange = rng.randrange
+    random_float = rng.random
+
+    first_name, last_name = array("H"), array("H")
+    dob, diagnosis, doctor, last_visit = array("H"), array("B"), array("B"), array("H")
+    appointment_offsets, prescription_offsets = array("I", [0]), array("I", [0])
+    appointment_patient, appointment_day = array("I"), array("H")
+    appointment_slot, appointment_reason = array("B"), array("B")
+    prescription_patient, prescription_medication = array("I"), array("B")
+    prescription_day, prescription_refills = array("H"), array("B")
+
+    medication_index = {name: i for i, name in enumerate(MEDICATION_NAMES)}
+    diagnosis_medications = [[medication_index[m] for m in meds] for _, meds in DIAGNOSES]
+    visit_start, visit_span = VISIT_RANGE[0], VISIT_RANGE[1] - VISIT_RANGE[0]
+    appointment_start, appointment_span = APPOINTMENT_RANGE[0], APPOINTMENT_RANGE[1] - APPOINTMENT_RANGE[0]
+
+    for row in range(patient_count):
+        first_name.append(randrange(len(FIRST_NAMES)))
+        last_name.append(randrange(len(LAST_NAMES)))
+        dob.append(randrange(DOB_RANGE[0], DOB_RANGE[1]))
+        condition = randrange(len(DIAGNOSES))
+        diagnosis.append(condition)
+        doctor.append(randrange(len(DOCTORS)))
+        visit = visit_start + randrange(visit_span)
+        last_visit.append(visit)
+
+        # Most patients have one or two upcoming appointments with their own doctor
+        roll = random_float()
+        appointments = 0 if roll < 0.15 else 1 if roll < 0.6 else 2 if roll < 0.9 else 3
+        for _ in range(appointments):
+            appointment_patient.append(row)
+            appointment_day.append(appointment_start + randrange(appointment_span))
+            appointment_slot.append(randrange(len(TIME_SLOTS)))
+            appointment_reason.append(randrange(len(REASONS)))
+        appointment_offsets.append(len(appointment_patient))
+
+        # One prescription per medication for the diagnosis, written on or before the last visit
+        for medication in diagnosis_medications[condition]:
+            prescription_patient.append(row)
+            prescription_medication.append(medication)
+            prescription_day.append(visit - randrange(90))
+            prescription_refills.append(randrange(6))
+        prescription_offsets.append(len(prescription_patient))
+
+    patients_by_doctor_offsets, patients_by_doctor = _group(doctor, len(DOCTORS))
+    appointment_doctor = array("B", (doctor[row] for row in appointment_patient))
+    appointments_by_doctor_offsets, appointments_by_doctor = _group(appointment_doctor, len(DOCTORS))
+    appointments_by_day_offsets, appointments_by_day = _group(
+        array("H", (day - appointment_start for day in appointment_day)), appointment_span)
+
+    columns = {name: value for name, value in locals().items() if name in COLUMNS}
+    meta = {"format": FORMAT_VERSION, "patients": patient_count, "seed": seed,
+            "appointments": len(appointment_patient), "prescriptions": len(prescription_patient)}
+    return ColumnarDataset(columns, meta)
+
+
+def load_or_generate(patient_count, seed=1337, directory=None):
+    """Load a saved dataset matching ``patient_count``/``seed`` from ``directory``, generating it if needed"""
+    if directory:
+        try:
+            dataset = ColumnarDataset.load(directory)
+            if dataset.meta["patients"] == patient_count and dataset.meta["seed"] == seed:
+                return dataset
+        except (OSError, ValueError, KeyError):
+            pass
+
+    dataset = generate(patient_count, seed)
+    if directory:
+        dataset.save(directory)
+        # Reopen memory-mapped so the generated arrays can be freed
+        dataset = ColumnarDataset.load(directory)
+    return dataset
+
+
+def dataset_from_env():
+    """
+    Generated dataset configured by DATASET_PATIENTS / DATASET_SEED /
+    DATASET_DIR, or None to keep the built-in records
+    """
+    patient_count = int(os.environ.get("DATASET_PATIENTS", 0))
+    if patient_count <= 0:
+        return None
+    return load_or_generate(patient_count, int(os.environ.get("DATASET_SEED", 1337)),
+                            os.environ.get("DATASET_DIR") or None)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a decoy patient dataset")
+    parser.add_argument("--patients", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=1337)
+    parser.add_argument("--out", required=True, help="directory for the column files")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    dataset = generate(args.patients, args.seed)
+    dataset.save(args.out)
+    print(f"Generated {dataset.meta} in {time.perf_counter() - started:.1f}s into {args.out}")
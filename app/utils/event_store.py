@@ -0,0 +1,361 @@
+"""
+Durable event store in SQLite (WAL mode).
+
+Every token created, token access and login attempt is written to one
+``events`` table. Rows are indexed by time, type, IP and token. Request
+threads only enqueue events. A writer thread inserts them in batches, with
+one commit per batch, so the cost of an fsync is shared by a whole batch.
+
+Events that must reach Redis are stored as ``pending``. When the alert
+publisher is given a store (see ``utils.alert_publisher``), it acts as an
+outbox: the publisher sends pending rows in id order and marks them
+delivered. If Redis is down, they simply wait on disk, across restarts.
+History rows (``pending=False``) are only kept for queries and for
+``replay``, which resends a time range to Redis or Logstash.
+
+Delivered and history rows older than ``retention`` seconds are deleted
+every ``compact_interval`` seconds, and the freed pages are returned with
+an incremental vacuum.
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 0.1
+DEFAULT_QUEUE_SIZE = 50000
+DEFAULT_RETENTION = 30 * 24 * 3600
+DEFAULT_COMPACT_INTERVAL = 3600.0
+DEFAULT_QUERY_LIMIT = 100
+COMPACT_CHUNK = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    event_type TEXT NOT NULL,
+    token_id TEXT,
+    ip TEXT,
+    pending INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_type ON events (event_type, ts);
+CREATE INDEX IF NOT EXISTS events_ip ON events (ip, ts) WHERE ip IS NOT NULL;
+CREATE INDEX IF NOT EXISTS events_token ON events (token_id, ts) WHERE token_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS events_pending ON events (id) WHERE pending = 1;
+"""
+
+_STOP = object()
+
+
+class EventStore:
+    """Batched, durable event log with indexed queries and an outbox for alerts"""
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 queue_size=DEFAULT_QUEUE_SIZE, synchronous="NORMAL", retention=DEFAULT_RETENTION,
+                 compact_interval=DEFAULT_COMPACT_INTERVAL):
+        if synchronous not in ("OFF", "NORMAL", "FULL"):
+            raise ValueError(f"Unknown synchronous mode: {synchronous}")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self.retention = retention
+        self.compact_interval = compact_interval
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._local = threading.local()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._drop_lock = threading.Lock()
+        self._next_compact = time.monotonic() + compact_interval
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.compacted = 0
+        self.last_commit_seconds = 0.0
+        self.max_commit_seconds = 0.0
+        self._commit_total = 0.0
+
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def record(self, event, pending=False):
+        """Queue ``event`` to be stored (and published if ``pending``); never blocks the caller"""
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait((time.time(), event, pending))
+            return True
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+            return False
+
+    def query(self, event_type=None, ip=None, token_id=None, after=None, before=None,
+              limit=DEFAULT_QUERY_LIMIT):
+        """Events matching every given filter, newest first, as ``(events, truncated)``"""
+        clauses, params = [], []
+        for column, value in (("event_type", event_type), ("ip", ip), ("token_id", token_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if after is not None:
+            clauses.append("ts >= ?")
+            params.append(after)
+        if before is not None:
+            clauses.append("ts <= ?")
+            params.append(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connection().execute(
+            f"SELECT id, ts, payload FROM events {where} ORDER BY ts DESC, id DESC LIMIT ?",
+            params + [limit + 1]).fetchall()
+        events = [dict(json.loads(payload), event_id=event_id, recorded_at=ts) for event_id, ts, payload in rows]
+        return events[:limit], len(events) > limit
+
+    def pending(self, limit):
+        """Up to ``limit`` undelivered ``(id, payload)`` rows, oldest first"""
+        return self._connection().execute(
+            "SELECT id, payload FROM events WHERE pending = 1 ORDER BY id LIMIT ?", (limit,)).fetchall()
+
+    def mark_delivered(self, ids):
+        with self._connection() as conn:
+            conn.executemany("UPDATE events SET pending = 0 WHERE id = ?", [(event_id,) for event_id in ids])
+
+    def rows(self, event_type=None, after=None, before=None, batch_size=DEFAULT_BATCH_SIZE):
+        """Yield lists of ``(id, payload)`` in id order, for replaying a time range"""
+        last_id = 0
+        while True:
+            clauses, params = ["id > ?"], [last_id]
+            if event_type is not None:
+                clauses.append("event_type = ?")
+                params.append(event_type)
+            if after is not None:
+                clauses.append("ts >= ?")
+                params.append(after)
+            if before is not None:
+                clauses.append("ts <= ?")
+                params.append(before)
+            batch = self._connection().execute(
+                f"SELECT id, payload FROM events WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?",
+                params + [batch_size]).fetchall()
+            if not batch:
+                return
+            last_id = batch[-1][0]
+            yield batch
+
+    def compact(self, now=None):
+        """Delete delivered rows older than ``retention``; returns how many were removed"""
+        cutoff = (time.time() if now is None else now) - self.retention
+        conn = self._connection()
+        removed = 0
+        while True:
+            # In chunks, so a large backlog never holds the write lock for long
+            with conn:
+                deleted = conn.execute(
+                    "DELETE FROM events WHERE id IN "
+                    "(SELECT id FROM events WHERE ts < ? AND pending = 0 LIMIT ?)",
+                    (cutoff, COMPACT_CHUNK)).rowcount
+            removed += deleted
+            if deleted < COMPACT_CHUNK:
+                break
+        # executescript steps the pragma to completion; execute frees a single page
+        conn.executescript("PRAGMA incremental_vacuum;")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.compacted += removed
+        if removed:
+            logger.info(f"Compacted event store: removed {removed} events older than {self.retention}s")
+        return removed
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="event-store", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout=5.0):
+        """Write everything queued and stop the writer"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far is committed"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def stats(self):
+        pending = self._connection().execute("SELECT count(*) FROM events WHERE pending = 1").fetchone()[0]
+        return {
+            "queue_depth": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "pending": pending,
+            "compacted": self.compacted,
+            "last_commit_seconds": self.last_commit_seconds,
+            "max_commit_seconds": self.max_commit_seconds,
+            "avg_commit_seconds": self._commit_total / self.batches if self.batches else 0.0,
+        }
+
+    def _connection(self):
+        """This thread's connection; SQLite connections are not shared between threads"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            # auto_vacuum only takes effect on a new database, before the first table
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+            self._local.conn = conn
+        return conn
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                batch.append(item)
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+            try:
+                self._write(batch)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write {len(batch)} events to {self.path}: {e}")
+                with self._drop_lock:
+                    self.dropped += len(batch)
+            finally:
+                for _ in range(len(batch) + (item is _STOP)):
+                    self._queue.task_done()
+            if time.monotonic() >= self._next_compact:
+                self._next_compact = time.monotonic() + self.compact_interval
+                try:
+                    self.compact()
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to compact event store {self.path}: {e}")
+
+    def _write(self, batch):
+        if not batch:
+            return
+        rows = [(ts, event.get("event_type", "unknown"), event.get("token_id"),
+                 event.get("ip_address") or event.get("ip"), int(pending), json.dumps(event, default=str))
+                for ts, event, pending in batch]
+        started = time.perf_counter()
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO events (ts, event_type, token_id, ip, pending, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                rows)
+        elapsed = time.perf_counter() - started
+        self.written += len(rows)
+        self.batches += 1
+        self.last_commit_seconds = elapsed
+        self.max_commit_seconds = max(self.max_commit_seconds, elapsed)
+        self._commit_total += elapsed
+
+
+def redis_sink(client, channel):
+    """A replay sink publishing each payload to ``channel``, one pipeline per batch"""
+    def send(payloads):
+        pipe = client.pipeline(transaction=False)
+        for payload in payloads:
+            pipe.publish(channel, payload)
+        pipe.execute()
+    return send
+
+
+def logstash_sink(host, port):
+    """A replay sink writing JSON lines to a Logstash ``tcp`` input"""
+    conn = socket.create_connection((host, port), timeout=30)
+
+    def send(payloads):
+        conn.sendall("".join(f"{payload}\n" for payload in payloads).encode("utf-8"))
+    send.close = conn.close
+    return send
+
+
+def replay(store, sink, **filters):
+    """Send stored events (optionally filtered by type and time) to ``sink``; returns the count"""
+    sent = 0
+    for batch in store.rows(**filters):
+        sink([payload for _, payload in batch])
+        sent += len(batch)
+    return sent
+
+
+def event_store_from_env(path_suffix=""):
+    """An EventStore at EVENT_STORE_PATH (plus ``path_suffix``) configured by EVENT_STORE_*, or None if unset"""
+    path = os.environ.get("EVENT_STORE_PATH")
+    if not path:
+        return None
+    return EventStore(
+        path + path_suffix,
+        batch_size=int(os.environ.get("EVENT_STORE_BATCH_SIZE", DEFAULT_BATCH_SIZE)),
+        flush_interval=float(os.environ.get("EVENT_STORE_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)),
+        synchronous=os.environ.get("EVENT_STORE_SYNC", "NORMAL").upper(),
+        retention=float(os.environ.get("EVENT_STORE_RETENTION", DEFAULT_RETENTION)),
+        compact_interval=float(os.environ.get("EVENT_STORE_COMPACT_INTERVAL", DEFAULT_COMPACT_INTERVAL)),
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Event store maintenance")
+    parser.add_argument("path", help="event store database")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    replay_command = subcommands.add_parser("replay", help="resend stored events to Redis or Logstash")
+    replay_command.add_argument("--to", choices=["redis", "logstash"], required=True)
+    replay_command.add_argument("--type", help="only events of this event_type")
+    replay_command.add_argument("--after", type=float, help="epoch seconds")
+    replay_command.add_argument("--before", type=float, help="epoch seconds")
+    replay_command.add_argument("--channel", default=os.environ.get("ALERT_CHANNEL", "security_alerts"))
+    replay_command.add_argument("--logstash-host", default=os.environ.get("LOGSTASH_HOST", "localhost"))
+    replay_command.add_argument("--logstash-port", type=int, default=int(os.environ.get("LOGSTASH_PORT", 5000)))
+    compact_command = subcommands.add_parser("compact", help="delete delivered events past the retention period")
+    compact_command.add_argument("--retention", type=float, default=DEFAULT_RETENTION, help="seconds")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "replay":
+        store = EventStore(args.path)
+        if args.to == "redis":
+            from .redis_pool import get_redis_client
+            sink = redis_sink(get_redis_client(), args.channel)
+        else:
+            sink = logstash_sink(args.logstash_host, args.logstash_port)
+        sent = replay(store, sink, event_type=args.type, after=args.after, before=args.before)
+        if hasattr(sink, "close"):
+            sink.close()
+        print(f"Replayed {sent} events to {args.to}")
+    elif args.command == "compact":
+        print(f"Removed {EventStore(args.path, retention=args.retention).compact()} events")
@@ -1,60 +1,767 @@
+import ast
+import argparse
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
 import uuid
-import redis
 import logging
 from datetime import datetime
 
+from .redis_pool import get_redis_client, redis_available
+from .token_store import DEFAULT_QUERY_LIMIT, DEFAULT_TTL, AccessSnapshot, HoneytokenStore, TokenRecord
+
 logger = logging.getLogger(__name__)
 
-redis_client = redis.Redis(host='redis', port=6379, db=0)
+# Each token is a hash at honeytoken:<id> (context, created_at, created_ts,
+# accessed, access_count, last_accessed) plus a set of accessing IPs at
+# honeytoken:<id>:ips. Older deployments stored str(dict) strings at the
+# same key; those are converted by migrate_legacy_tokens() or on first access.
+TOKEN_KEY = "honeytoken:{}"
+IPS_KEY = "honeytoken:{}:ips"
+
+# Secondary indexes, all sorted sets of token ids scored by epoch seconds:
+# creation time overall and per context, last access overall and per IP.
+# Tokens written before the indexes existed are added by reindex_tokens().
+# A token written with a TTL joins the creation and context indexes only on
+# first access, so one that expires unread leaves nothing behind; entries
+# left by older versions are removed by prune_indexes().
+CREATED_INDEX_KEY = "honeytoken:index:created"
+CONTEXT_INDEX_KEY = "honeytoken:index:context:{}"
+ACCESSED_INDEX_KEY = "honeytoken:index:accessed"
+IP_INDEX_KEY = "honeytoken:index:ip:{}"
+QUERY_BATCH_SIZE = 500
+# Commands per pipeline round trip for the batch APIs
+WRITE_BATCH_SIZE = 1000
+# Tokens RedisTokenStore queues for its writer before counting them unsynced
+DEFAULT_WRITE_QUEUE_SIZE = 100000
+# Seconds RedisTokenStore uses only its local store after a Redis error
+DEFAULT_RETRY_INTERVAL = 5.0
+
+# Records one access atomically: nothing is written for unknown tokens, and
+# concurrent accesses can never interleave between the existence check and
+# the updates (including the accessed and per-IP indexes). An accessed token
+# is evidence, so any TTL on it is removed, and the first access adds it to
+# the creation index and, when the caller knows the context and passes its
+# index as KEYS[6], to the context index. A verified stateless token (see
+# utils.signed_tokens) arrives with its context and creation time and is
+# created on first access. Returns {access_count, context, new_ip}, plus the
+# creation time when the caller still has to add the context index, {} if
+# the token does not exist, or {-1} if it is still a legacy string.
+RECORD_ACCESS_SCRIPT = """
+local kind = redis.call('TYPE', KEYS[1])['ok']
+if kind == 'none' then
+    if not ARGV[5] then
+        return {}
+    end
+    redis.call('HSET', KEYS[1], 'context', ARGV[5], 'created_at', ARGV[6], 'created_ts', ARGV[7],
+               'accessed', 0, 'access_count', 0)
+elseif kind ~= 'hash' then
+    return {-1}
+end
+local count = redis.call('HINCRBY', KEYS[1], 'access_count', 1)
+redis.call('HSET', KEYS[1], 'accessed', 1, 'last_accessed', ARGV[2])
+redis.call('PERSIST', KEYS[1])
+local new_ip = redis.call('SADD', KEYS[2], ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[3], ARGV[4])
+redis.call('ZADD', KEYS[4], ARGV[3], ARGV[4])
+local context = redis.call('HGET', KEYS[1], 'context')
+if count == 1 then
+    local created = redis.call('HGET', KEYS[1], 'created_ts')
+    if created then
+        redis.call('ZADD', KEYS[5], created, ARGV[4])
+        if not KEYS[6] then
+            return {count, context, new_ip, created}
+        end
+        redis.call('ZADD', KEYS[6], created, ARGV[4])
+    end
+end
+return {count, context, new_ip}
+"""
+
+# Writes one token for RedisTokenStore's writer unless an access created it
+# first. Like store_honeytoken, a token with a TTL (ARGV[5]) is indexed only
+# once accessed. Returns 1 if written.
+CREATE_TOKEN_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'context', ARGV[2], 'created_at', ARGV[3], 'created_ts', ARGV[4],
+           'accessed', 0, 'access_count', 0)
+if ARGV[5] ~= '' then
+    redis.call('EXPIRE', KEYS[1], ARGV[5])
+else
+    redis.call('ZADD', KEYS[2], ARGV[4], ARGV[1])
+    redis.call('ZADD', KEYS[3], ARGV[4], ARGV[1])
+end
+return 1
+"""
+
+_record_access_script = None
+_create_token_script = None
+_STOP = object()
+
 
 def generate_honeytoken(context):
     """
     Generate a unique honeytoken and store it in Redis
     """
     token_id = str(uuid.uuid4())
-    token_data = {
-        "context": context,
-        "created_at": datetime.now().isoformat(),
-        "accessed": False,
-        "access_count": 0,
-        "access_ips": []
-    }
-    
-    redis_client.set(f"honeytoken:{token_id}", str(token_data))
-    
+    store_honeytoken(token_id, context)
+
     logger.info(f"Created honeytoken: {token_id} for context: {context}")
-    
+
     return token_id
 
+def store_honeytoken(token_id, context, created=None, ttl=None):
+    """
+    Write a new token and its index entries; ``ttl`` seconds expire it unless accessed
+    """
+    created = datetime.now() if created is None else datetime.fromtimestamp(created)
+    token_key = TOKEN_KEY.format(token_id)
+    pipe = get_redis_client().pipeline(transaction=True)
+    pipe.hset(token_key, mapping={
+        "context": context,
+        "created_at": created.isoformat(),
+        "created_ts": created.timestamp(),
+        "accessed": 0,
+        "access_count": 0,
+    })
+    if ttl:
+        # Indexed on first access instead, so an expired token leaves no entries
+        pipe.expire(token_key, int(ttl))
+    else:
+        pipe.zadd(CREATED_INDEX_KEY, {token_id: created.timestamp()})
+        pipe.zadd(CONTEXT_INDEX_KEY.format(context), {token_id: created.timestamp()})
+    pipe.execute()
+
+def generate_honeytokens(contexts, ttl=None, batch_size=WRITE_BATCH_SIZE):
+    """
+    Generate one token per context, ``batch_size`` tokens per round trip;
+    returns their ids in order
+    """
+    created = datetime.now().timestamp()
+    tokens = [(str(uuid.uuid4()), context, created) for context in contexts]
+    store_honeytokens(tokens, ttl, batch_size)
+    return [token_id for token_id, _, _ in tokens]
+
+def store_honeytokens(tokens, ttl=None, batch_size=WRITE_BATCH_SIZE):
+    """
+    Write ``(token_id, context, created)`` tuples like store_honeytoken, but
+    pipelined: one HSET and EXPIRE per token, or without a TTL one HSET per
+    token and one ZADD per index per batch. Batches are not atomic; returns
+    the number written.
+    """
+    redis_client = get_redis_client()
+    written = 0
+    tokens = iter(tokens)
+    while True:
+        batch = [token for _, token in zip(range(batch_size), tokens)]
+        if not batch:
+            break
+        pipe = redis_client.pipeline(transaction=False)
+        created_index = {}
+        context_indexes = {}
+        for token_id, context, created in batch:
+            created = datetime.now() if created is None else datetime.fromtimestamp(created)
+            token_key = TOKEN_KEY.format(token_id)
+            pipe.hset(token_key, mapping={
+                "context": context,
+                "created_at": created.isoformat(),
+                "created_ts": created.timestamp(),
+                "accessed": 0,
+                "access_count": 0,
+            })
+            if ttl:
+                pipe.expire(token_key, int(ttl))
+            else:
+                created_index[token_id] = created.timestamp()
+                context_indexes.setdefault(context, {})[token_id] = created.timestamp()
+        if created_index:
+            pipe.zadd(CREATED_INDEX_KEY, created_index)
+        for context, members in context_indexes.items():
+            pipe.zadd(CONTEXT_INDEX_KEY.format(context), members)
+        pipe.execute()
+        written += len(batch)
+    logger.info(f"Created {written} honeytokens")
+    return written
+
 def check_honeytoken_access(token_id, ip_address):
     """
     Record access to a honeytoken
     """
-    token_key = f"honeytoken:{token_id}"
-    token_data_str = redis_client.get(token_key)
-    
-    if not token_data_str:
+    result = _record_access(token_id, ip_address)
+    if len(result) < 2:
         logger.warning(f"Access to non-existent honeytoken: {token_id} from IP: {ip_address}")
         return
-    
-    token_data_str = token_data_str.decode('utf-8')
-    token_data = eval(token_data_str)
-    
-    token_data["accessed"] = True
-    token_data["access_count"] += 1
-    token_data["last_accessed"] = datetime.now().isoformat()
-    if ip_address not in token_data["access_ips"]:
-        token_data["access_ips"].append(ip_address)
-    
-    redis_client.set(token_key, str(token_data))
-    
-    logger.warning(f"HONEYTOKEN ACCESSED: {token_id} from IP: {ip_address}, context: {token_data['context']}")
-    
+
+    access_count, context = result[0], result[1].decode('utf-8')
+    logger.warning(f"HONEYTOKEN ACCESSED: {token_id} from IP: {ip_address}, context: {context}")
+
     alert_data = {
         "event_type": "honeytoken_access",
         "token_id": token_id,
         "ip_address": ip_address,
-        "context": token_data["context"],
-        "timestamp": datetime.now().isoformat()
+        "context": context,
+        "timestamp": datetime.now().isoformat(),
+        "access_count": access_count
     }
-    redis_client.publish("security_alerts", str(alert_data))
+    get_redis_client().publish("security_alerts", json.dumps(alert_data))
+
+def record_accesses(events, publish=True, batch_size=WRITE_BATCH_SIZE):
+    """
+    Record ``(token_id, ip_address)`` accesses like check_honeytoken_access,
+    ``batch_size`` per round trip (one pipeline of EVALSHA, then one of
+    PUBLISH); returns an AccessSnapshot, or None for an unknown token, per event
+    """
+    redis_client = get_redis_client()
+    script = _access_script()
+    snapshots = []
+    events = iter(events)
+    while True:
+        batch = [event for _, event in zip(range(batch_size), events)]
+        if not batch:
+            break
+        now = datetime.now()
+        pipe = redis_client.pipeline(transaction=False)
+        for token_id, ip_address in batch:
+            keys, args = _access_call(token_id, ip_address, now)
+            script(keys=keys, args=args, client=pipe)
+        results = pipe.execute()
+
+        pipe = redis_client.pipeline(transaction=False)
+        for (token_id, ip_address), result in zip(batch, results):
+            if result == [-1] and migrate_token(token_id):
+                result = _record_access(token_id, ip_address, now.timestamp())
+            else:
+                _index_first_access(pipe, token_id, result)
+            if len(result) < 2:
+                logger.warning(f"Access to non-existent honeytoken: {token_id} from IP: {ip_address}")
+                snapshots.append(None)
+                continue
+            access_count, context = result[0], result[1].decode('utf-8')
+            snapshots.append(AccessSnapshot(context, access_count, now.timestamp(), bool(result[2])))
+            logger.warning(f"HONEYTOKEN ACCESSED: {token_id} from IP: {ip_address}, context: {context}")
+            if publish:
+                pipe.publish("security_alerts", json.dumps({
+                    "event_type": "honeytoken_access",
+                    "token_id": token_id,
+                    "ip_address": ip_address,
+                    "context": context,
+                    "timestamp": now.isoformat(),
+                    "access_count": access_count
+                }))
+        pipe.execute()
+    return snapshots
+
+def get_honeytoken(token_id):
+    """
+    Return a token's fields as a dict, or None if it does not exist
+    """
+    pipe = get_redis_client().pipeline(transaction=False)
+    pipe.hgetall(TOKEN_KEY.format(token_id))
+    pipe.smembers(IPS_KEY.format(token_id))
+    fields, ips = pipe.execute()
+    return _decode_token(fields, ips)
+
+def find_honeytokens(context=None, ip=None, created_after=None, created_before=None,
+                     accessed_after=None, accessed_before=None, limit=100):
+    """
+    Tokens matching every given filter, newest first, as ``(tokens, truncated)``
+
+    Candidates come from one sorted-set index (per IP, per context, last
+    access or creation, in that order of preference), range-limited by score
+    where that index is scored by the filtered time; the remaining filters
+    are checked against each candidate. Times are epoch seconds.
+    """
+    if ip is not None:
+        index, low, high = IP_INDEX_KEY.format(ip), accessed_after, accessed_before
+    elif context is not None:
+        index, low, high = CONTEXT_INDEX_KEY.format(context), created_after, created_before
+    elif accessed_after is not None or accessed_before is not None:
+        index, low, high = ACCESSED_INDEX_KEY, accessed_after, accessed_before
+    else:
+        index, low, high = CREATED_INDEX_KEY, created_after, created_before
+    low = "-inf" if low is None else low
+    high = "+inf" if high is None else high
+
+    def wanted(token):
+        created, accessed = _token_times(token)
+        if context is not None and token.get("context") != context:
+            return False
+        if ip is not None and ip not in token["access_ips"]:
+            return False
+        if created_after is not None and (created is None or created < created_after):
+            return False
+        if created_before is not None and (created is None or created > created_before):
+            return False
+        if accessed_after is not None and (accessed is None or accessed < accessed_after):
+            return False
+        if accessed_before is not None and (accessed is None or accessed > accessed_before):
+            return False
+        return True
+
+    redis_client = get_redis_client()
+    tokens = []
+    offset = 0
+    while True:
+        batch = redis_client.zrevrangebyscore(index, high, low, start=offset, num=QUERY_BATCH_SIZE)
+        if not batch:
+            return tokens, False
+        offset += len(batch)
+
+        token_ids = [token_id.decode('utf-8') for token_id in batch]
+        pipe = redis_client.pipeline(transaction=False)
+        for token_id in token_ids:
+            pipe.hgetall(TOKEN_KEY.format(token_id))
+            pipe.smembers(IPS_KEY.format(token_id))
+        results = pipe.execute()
+
+        for position, token_id in enumerate(token_ids):
+            token = _decode_token(results[2 * position], results[2 * position + 1])
+            if token is None or not wanted(token):
+                continue
+            if len(tokens) == limit:
+                return tokens, True
+            token["token_id"] = token_id
+            tokens.append(token)
+
+class RedisTokenStore:
+    """
+    The token store interface of ``utils.token_store`` over the Redis layout
+    above, so every process and host using the same Redis sees the same
+    tokens. Never-accessed tokens expire after ``ttl`` seconds; accessed
+    ones are kept.
+
+    No request waits on Redis to mint a token: ``create`` adds it to
+    ``local`` (a HoneytokenStore, or before forking a SharedTokenStore) and
+    queues it for a writer thread, which pipelines batches into Redis with
+    CREATE_TOKEN_SCRIPT. Accesses are recorded in Redis, except while it is
+    down (then in ``local``, so a Redis outage never stops the decoy), and a
+    token still waiting for the writer is created by its first access.
+    """
+
+    def __init__(self, ttl=None, local=None, batch_size=WRITE_BATCH_SIZE,
+                 queue_size=DEFAULT_WRITE_QUEUE_SIZE, retry_interval=DEFAULT_RETRY_INTERVAL):
+        import redis
+
+        self.ttl = ttl
+        self.local = local if local is not None else HoneytokenStore(ttl=ttl or DEFAULT_TTL)
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.retry_interval = retry_interval
+        self._errors = (redis.RedisError, OSError)
+        self._queue = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._retry_at = 0.0
+
+        # Tokens only in the local store (queue full or Redis down), and
+        # accesses recorded there instead of in Redis
+        self.unsynced = 0
+        self.local_accesses = 0
+
+    def create(self, token_id, context, now=None):
+        record = self.local.create(token_id, context, now)
+        if self._pid != os.getpid():
+            self.start()
+        try:
+            self._queue.put_nowait((token_id, record.context, record.created_at))
+        except queue.Full:
+            self.unsynced += 1
+        return record
+
+    def record_access(self, token_id, ip_address, now=None, minted=None):
+        """
+        Count an access to ``token_id``; returns an AccessSnapshot, or None if
+        unknown. ``minted`` is the ``(context, created_at)`` of a verified
+        stateless token, which is added if unknown.
+        """
+        now = datetime.now().timestamp() if now is None else now
+        if self._redis_up():
+            try:
+                result = _record_access(token_id, ip_address, now, minted)
+                if len(result) < 2 and minted is None:
+                    # Minted moments ago and still queued for the writer
+                    record = self.local.get(token_id)
+                    if record is not None:
+                        result = _record_access(token_id, ip_address, now, (record.context, record.created_at))
+                if len(result) < 2:
+                    return None
+                return AccessSnapshot(result[1].decode('utf-8'), result[0], now, bool(result[2]))
+            except self._errors as e:
+                self._redis_failed(e)
+        self.local_accesses += 1
+        return self.local.record_access(token_id, ip_address, now, minted)
+
+    def get(self, token_id):
+        token = self._try(lambda: get_honeytoken(token_id), lambda: None)
+        return self.local.get(token_id) if token is None else _token_record(token)
+
+    def query(self, limit=DEFAULT_QUERY_LIMIT, **filters):
+        """
+        Redis matches merged with the local store's, which holds the tokens
+        not yet accessed (Redis indexes those only once accessed)
+        """
+        local, local_truncated = self.local.query(limit=limit, **filters)
+
+        def from_redis():
+            tokens, truncated = find_honeytokens(limit=limit, **filters)
+            return [(token["token_id"], _token_record(token)) for token in tokens], truncated
+
+        matches, truncated = self._try(from_redis, lambda: ([], False))
+        seen = {token_id for token_id, _ in matches}
+        matches += [(token_id, record) for token_id, record in local if token_id not in seen]
+        matches.sort(key=lambda match: match[1].created_at or 0, reverse=True)
+        return matches[:limit], truncated or local_truncated or len(matches) > limit
+
+    def __contains__(self, token_id):
+        return token_id in self.local or self._try(
+            lambda: get_redis_client().exists(TOKEN_KEY.format(token_id)) > 0, lambda: False)
+
+    def __len__(self):
+        stats = self.stats()
+        return stats["fresh"] + stats["accessed"]
+
+    def stats(self):
+        """
+        ``fresh`` counts this store's local tokens (some may have been
+        accessed in Redis since), ``accessed`` the Redis index while it answers
+        """
+        local = self.local.stats()
+        accessed = self._try(lambda: get_redis_client().zcard(ACCESSED_INDEX_KEY), lambda: local["accessed"])
+        return {"fresh": local["fresh"], "accessed": accessed, "spilled": 0, "unsynced": self.unsynced,
+                "local_accesses": self.local_accesses}
+
+    def start(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # Threads do not survive fork, so each process starts its own writer
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            thread = threading.Thread(target=self._run, name="redis-token-writer", daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.stop, self._queue, thread)
+
+    def stop(self, pending, thread, timeout=5.0):
+        """Write what is queued and stop the writer"""
+        try:
+            pending.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+
+    def _run(self):
+        pending = self._queue
+        stopping = False
+        while not stopping:
+            # Whatever queued up during the last write goes out in one batch
+            batch = [pending.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = [token for token in batch if token is not _STOP]
+            self._write(batch)
+
+    def _write(self, tokens):
+        if not tokens:
+            return
+        if time.monotonic() < self._retry_at:
+            self.unsynced += len(tokens)
+            return
+        try:
+            store_new_honeytokens(tokens, self.ttl)
+        except self._errors as e:
+            self.unsynced += len(tokens)
+            self._redis_failed(e)
+
+    def _redis_up(self):
+        if time.monotonic() < self._retry_at:
+            return False
+        # Also starts the background health check on first use. Until its
+        # first ping (just after start or fork) Redis is assumed up and a real
+        # failure is caught by the caller.
+        get_redis_client()
+        return redis_available() is not False
+
+    def _redis_failed(self, error):
+        if time.monotonic() >= self._retry_at:
+            logger.error(f"Redis token store unavailable, using the local store for "
+                         f"{self.retry_interval:.0f}s: {error}")
+        self._retry_at = time.monotonic() + self.retry_interval
+
+    def _try(self, redis_call, local_call):
+        if self._redis_up():
+            try:
+                return redis_call()
+            except self._errors as e:
+                self._redis_failed(e)
+        return local_call()
+
+def _token_record(token):
+    created, accessed = _token_times(token)
+    return TokenRecord(token.get("context", ""), created, token["access_count"], accessed,
+                       set(token["access_ips"]) or None)
+
+def _decode_token(fields, ips):
+    if not fields:
+        return None
+    token_data = {key.decode('utf-8'): value.decode('utf-8') for key, value in fields.items()}
+    token_data["accessed"] = token_data.get("accessed") == "1"
+    token_data["access_count"] = int(token_data.get("access_count", 0))
+    token_data["access_ips"] = sorted(ip.decode('utf-8') for ip in ips)
+    return token_data
+
+def _token_times(token):
+    """``(created, last_accessed)`` epoch seconds of a decoded token (None if unknown)"""
+    created = token.get("created_ts")
+    created = float(created) if created is not None else _epoch(token.get("created_at"))
+    return created, _epoch(token.get("last_accessed"))
+
+def _epoch(isoformat):
+    try:
+        return datetime.fromisoformat(isoformat).timestamp() if isoformat else None
+    except (TypeError, ValueError):
+        return None
+
+def _index_token(pipe, token_id, token):
+    """Queue the index entries for a decoded token on ``pipe``"""
+    created, accessed = _token_times(token)
+    if created is not None:
+        pipe.zadd(CREATED_INDEX_KEY, {token_id: created})
+        pipe.zadd(CONTEXT_INDEX_KEY.format(token.get("context", "")), {token_id: created})
+    if accessed is not None:
+        pipe.zadd(ACCESSED_INDEX_KEY, {token_id: accessed})
+        # Per-IP access times were never recorded; the last access is the best estimate
+        for ip_address in token["access_ips"]:
+            pipe.zadd(IP_INDEX_KEY.format(ip_address), {token_id: accessed}, nx=True)
+
+def _access_script():
+    global _record_access_script
+    if _record_access_script is None:
+        _record_access_script = get_redis_client().register_script(RECORD_ACCESS_SCRIPT)
+    return _record_access_script
+
+def _access_call(token_id, ip_address, now, minted=None):
+    """The ``(keys, args)`` of RECORD_ACCESS_SCRIPT for one access at datetime ``now``"""
+    keys = [TOKEN_KEY.format(token_id), IPS_KEY.format(token_id), ACCESSED_INDEX_KEY,
+            IP_INDEX_KEY.format(ip_address), CREATED_INDEX_KEY]
+    args = [ip_address, now.isoformat(), now.timestamp(), token_id]
+    if minted is not None:
+        context, created = minted
+        keys.append(CONTEXT_INDEX_KEY.format(context))
+        args += [context, datetime.fromtimestamp(created).isoformat(), created]
+    return keys, args
+
+def _index_first_access(client, token_id, result):
+    """
+    Add a token accessed for the first time to its context index, which
+    RECORD_ACCESS_SCRIPT leaves to the caller when it was not told the context
+    """
+    if len(result) > 3:
+        client.zadd(CONTEXT_INDEX_KEY.format(result[1].decode('utf-8')), {token_id: float(result[3])})
+
+def store_new_honeytokens(tokens, ttl=None):
+    """
+    Write ``(token_id, context, created)`` tuples in one pipeline, skipping
+    any token that already exists; returns the number written
+    """
+    global _create_token_script
+    if _create_token_script is None:
+        _create_token_script = get_redis_client().register_script(CREATE_TOKEN_SCRIPT)
+    pipe = get_redis_client().pipeline(transaction=False)
+    for token_id, context, created in tokens:
+        _create_token_script(
+            keys=[TOKEN_KEY.format(token_id), CREATED_INDEX_KEY, CONTEXT_INDEX_KEY.format(context)],
+            args=[token_id, context, datetime.fromtimestamp(created).isoformat(), created,
+                  int(ttl) if ttl else ""],
+            client=pipe)
+    return sum(pipe.execute())
+
+def _record_access(token_id, ip_address, now=None, minted=None):
+    """
+    Run RECORD_ACCESS_SCRIPT for one access (EVALSHA, one round trip),
+    converting a legacy string token first if needed
+    """
+    script = _access_script()
+    now = datetime.now() if now is None else datetime.fromtimestamp(now)
+    keys, args = _access_call(token_id, ip_address, now, minted)
+
+    def run():
+        # Pass the client explicitly: it is replaced after a fork
+        return script(keys=keys, args=args, client=get_redis_client())
+
+    result = run()
+    if result == [-1] and migrate_token(token_id):
+        result = run()
+    _index_first_access(get_redis_client(), token_id, result)
+    return result
+
+def _parse_legacy(raw):
+    """Parse a legacy str(dict) value without evaluating it"""
+    value = ast.literal_eval(raw.decode('utf-8'))
+    if not isinstance(value, dict):
+        raise ValueError("legacy honeytoken value is not a dict")
+    return value
+
+def migrate_token(token_id):
+    """
+    Convert one legacy string-encoded token to the hash layout
+    """
+    import redis
+
+    token_key = TOKEN_KEY.format(token_id)
+    with get_redis_client().pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                # WATCH so a concurrent access or migration cannot be overwritten
+                pipe.watch(token_key)
+                if pipe.type(token_key) != b"string":
+                    return pipe.exists(token_key) > 0
+                raw = pipe.get(token_key)
+
+                try:
+                    legacy = _parse_legacy(raw)
+                except (ValueError, SyntaxError) as e:
+                    logger.error(f"Skipping unparseable legacy honeytoken {token_id}: {e}")
+                    return False
+
+                fields = {
+                    "context": legacy.get("context", ""),
+                    "created_at": legacy.get("created_at", ""),
+                    "accessed": int(bool(legacy.get("accessed"))),
+                    "access_count": int(legacy.get("access_count", 0)),
+                }
+                if legacy.get("last_accessed"):
+                    fields["last_accessed"] = legacy["last_accessed"]
+
+                pipe.multi()
+                pipe.delete(token_key)
+                pipe.hset(token_key, mapping=fields)
+                if legacy.get("access_ips"):
+                    pipe.sadd(IPS_KEY.format(token_id), *legacy["access_ips"])
+                _index_token(pipe, token_id, dict(fields, access_ips=legacy.get("access_ips") or []))
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                # Changed meanwhile, converted by another worker or rewritten
+                # by an old one: look again
+                continue
+
+def migrate_legacy_tokens(batch_size=1000):
+    """
+    Convert every legacy string-encoded honeytoken in Redis; returns the count
+    """
+    redis_client = get_redis_client()
+    migrated = 0
+    for key in redis_client.scan_iter(match=TOKEN_KEY.format("*"), count=batch_size, _type="string"):
+        token_id = key.decode('utf-8').split(":", 1)[1]
+        if migrate_token(token_id):
+            migrated += 1
+    logger.info(f"Migrated {migrated} legacy honeytokens")
+    return migrated
+
+
+def reindex_tokens(batch_size=1000):
+    """
+    Add every hash-format honeytoken to the secondary indexes; returns the count
+    """
+    redis_client = get_redis_client()
+    indexed = 0
+    keys = redis_client.scan_iter(match=TOKEN_KEY.format("*"), count=batch_size, _type="hash")
+    while True:
+        batch = [key.decode('utf-8') for _, key in zip(range(batch_size), keys)]
+        if not batch:
+            break
+        token_ids = [key.split(":", 1)[1] for key in batch]
+        pipe = redis_client.pipeline(transaction=False)
+        for token_id in token_ids:
+            pipe.hgetall(TOKEN_KEY.format(token_id))
+            pipe.smembers(IPS_KEY.format(token_id))
+        results = pipe.execute()
+
+        pipe = redis_client.pipeline(transaction=False)
+        for position, token_id in enumerate(token_ids):
+            token = _decode_token(results[2 * position], results[2 * position + 1])
+            if token is not None:
+                _index_token(pipe, token_id, token)
+                indexed += 1
+        pipe.execute()
+    logger.info(f"Indexed {indexed} honeytokens")
+    return indexed
+
+def prune_indexes(batch_size=1000):
+    """
+    Remove index entries of tokens that no longer exist (expired before this
+    version stopped indexing unread TTL tokens); returns the count
+    """
+    redis_client = get_redis_client()
+    indexes = [CREATED_INDEX_KEY]
+    indexes.extend(redis_client.scan_iter(match=CONTEXT_INDEX_KEY.format("*"), count=batch_size, _type="zset"))
+    pruned = 0
+    for index in indexes:
+        members = redis_client.zscan_iter(index, count=batch_size)
+        while True:
+            batch = [member for _, (member, _) in zip(range(batch_size), members)]
+            if not batch:
+                break
+            pipe = redis_client.pipeline(transaction=False)
+            for member in batch:
+                pipe.exists(TOKEN_KEY.format(member.decode('utf-8')))
+            gone = [member for member, exists in zip(batch, pipe.execute()) if not exists]
+            if gone:
+                # ZSCAN tolerates members removed while it iterates
+                pruned += redis_client.zrem(index, *gone)
+    logger.info(f"Pruned {pruned} index entries")
+    return pruned
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Honeytoken maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    migrate = subcommands.add_parser("migrate", help="convert legacy str(dict) tokens to hashes")
+    migrate.add_argument("--batch-size", type=int, default=1000)
+    reindex = subcommands.add_parser("reindex", help="build the context/IP/time indexes for existing tokens")
+    reindex.add_argument("--batch-size", type=int, default=1000)
+    prune = subcommands.add_parser("prune", help="drop index entries of expired tokens")
+    prune.add_argument("--batch-size", type=int, default=1000)
+    seed = subcommands.add_parser("seed", help="create a token for every context in a file (one per line)")
+    seed.add_argument("path", help="file of contexts, or - for stdin")
+    seed.add_argument("--ttl", type=int, default=None, help="expire tokens not accessed within this many seconds")
+    seed.add_argument("--batch-size", type=int, default=WRITE_BATCH_SIZE)
+    seed.add_argument("--output", help="write the new token ids here, one per line, in input order")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "migrate":
+        print(f"Migrated {migrate_legacy_tokens(args.batch_size)} honeytokens")
+    elif args.command == "reindex":
+        print(f"Indexed {reindex_tokens(args.batch_size)} honeytokens")
+    elif args.command == "prune":
+        print(f"Pruned {prune_indexes(args.batch_size)} index entries")
+    elif args.command == "seed":
+        source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+        output = open(args.output, "w", encoding="utf-8") if args.output else None
+        seeded = 0
+        with source:
+            contexts = (line.rstrip("\n") for line in source if line.strip())
+            # Chunks keep memory flat however large the file is
+            while True:
+                chunk = [context for _, context in zip(range(args.batch_size * 100), contexts)]
+                if not chunk:
+                    break
+                token_ids = generate_honeytokens(chunk, args.ttl, args.batch_size)
+                if output is not None:
+                    output.writelines(f"{token_id}\n" for token_id in token_ids)
+                seeded += len(token_ids)
+        if output is not None:
+            output.close()
+        print(f"Seeded {seeded} honeytokens")
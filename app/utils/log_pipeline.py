@@ -0,0 +1,112 @@
+"""
+Logging setup for the decoy server.
+
+The log file is written as JSON lines (one object per record, with any
+``extra={"event": {...}}`` fields merged in) so Logstash can read it with a
+json codec. In ``queue`` mode, the default, request threads only enqueue
+records; a dedicated listener thread formats them and does the file and
+console I/O. ``sync`` mode keeps the old inline handlers.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects"""
+
+    def format(self, record):
+        data = {
+            "@timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        event = getattr(record, "event", None)
+        if event:
+            data.update(event)
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that counts and drops records when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._drop_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+
+
+def configure_logging(path="simple_server.log", level="INFO", mode="queue",
+                      queue_size=DEFAULT_QUEUE_SIZE, max_bytes=DEFAULT_MAX_BYTES,
+                      backup_count=DEFAULT_BACKUP_COUNT):
+    """Install JSON file and text console logging on the root logger"""
+    global _listener
+
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    if mode == "sync":
+        root.addHandler(file_handler)
+        root.addHandler(console_handler)
+        return None
+
+    if mode != "queue":
+        raise ValueError(f"Unknown log mode: {mode}")
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    root.addHandler(queue_handler)
+
+    if _listener is not None:
+        _listener.stop()
+        atexit.unregister(_listener.stop)
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler,
+                                               respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return queue_handler
+
+
+def logging_from_env(path_suffix=""):
+    """
+    Configure logging from LOG_* environment variables; ``path_suffix`` is
+    appended to LOG_PATH, e.g. so each pre-forked worker rotates its own file
+    """
+    return configure_logging(
+        path=os.environ.get("LOG_PATH", "simple_server.log") + path_suffix,
+        level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+        mode=os.environ.get("LOG_MODE", "queue"),
+        queue_size=int(os.environ.get("LOG_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)),
+        max_bytes=int(os.environ.get("LOG_MAX_BYTES", DEFAULT_MAX_BYTES)),
+        backup_count=int(os.environ.get("LOG_BACKUP_COUNT", DEFAULT_BACKUP_COUNT)),
+    )
@@ -0,0 +1,165 @@
+"""
+Coalescing of login attempt events.
+
+A brute-force run produces thousands of near-identical login events. The
+first attempt from an IP, and every successful one, is still reported on
+its own; the rest are counted and reported as one ``login_attempts_summary``
+per IP every ``window`` seconds. An IP that goes quiet for a full window is
+forgotten, so its next attempt is reported immediately again.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 10.0
+DEFAULT_CAPACITY = 10000
+MAX_USERNAMES = 20
+MAX_PENDING = 10000
+
+
+class _Attempts:
+    __slots__ = ("first", "last", "attempts", "successes", "usernames", "passwords")
+
+    def __init__(self, now):
+        self.first = now
+        self.last = now
+        self.attempts = 0
+        self.successes = 0
+        self.usernames = {}
+        self.passwords = set()
+
+    def to_summary(self, ip, window):
+        return {
+            "event_type": "login_attempts_summary",
+            "ip_address": ip,
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "usernames": dict(self.usernames),
+            "distinct_passwords": len(self.passwords),
+            "first_attempt": datetime.fromtimestamp(self.first, timezone.utc).isoformat(timespec="seconds"),
+            "last_attempt": datetime.fromtimestamp(self.last, timezone.utc).isoformat(timespec="seconds"),
+            "window": window,
+        }
+
+
+class LoginCoalescer:
+    """Per-IP login attempt counters flushed as summary events"""
+
+    def __init__(self, emit, window=DEFAULT_WINDOW, capacity=DEFAULT_CAPACITY):
+        self.emit = emit
+        self.window = window
+        self.capacity = capacity
+
+        self._active = OrderedDict()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        self.immediate = 0
+        self.coalesced = 0
+        self.summaries = 0
+
+    def record(self, ip, username, password, success, now=None):
+        """
+        Count one attempt; returns True if the caller should report this
+        attempt itself (first from this IP, or a success)
+        """
+        if self._thread is None:
+            self.start()
+        now = time.time() if now is None else now
+        with self._lock:
+            attempts = self._active.get(ip)
+            if attempts is None:
+                if len(self._active) >= self.capacity:
+                    self._retire(*self._active.popitem(last=False))
+                self._active[ip] = _Attempts(now)
+                self.immediate += 1
+                return True
+
+            self._active.move_to_end(ip)
+            attempts.last = now
+            if success:
+                attempts.successes += 1
+                self.immediate += 1
+                return True
+
+            attempts.attempts += 1
+            if username in attempts.usernames:
+                attempts.usernames[username] += 1
+            elif len(attempts.usernames) < MAX_USERNAMES:
+                attempts.usernames[username] = 1
+            # Only the count of distinct passwords is reported; keep hashes, not the strings
+            attempts.passwords.add(hash(password))
+            self.coalesced += 1
+            return False
+
+    def _retire(self, ip, attempts):
+        if attempts.attempts and len(self._pending) < MAX_PENDING:
+            self._pending.append(attempts.to_summary(ip, self.window))
+
+    def collect(self, now=None):
+        """Summaries of attempts since the last flush; forgets IPs idle for a whole window"""
+        now = time.time() if now is None else now
+        with self._lock:
+            summaries, self._pending = self._pending, []
+            for ip in list(self._active):
+                attempts = self._active[ip]
+                if attempts.attempts:
+                    summaries.append(attempts.to_summary(ip, self.window))
+                    fresh = self._active[ip] = _Attempts(now)
+                    fresh.last = attempts.last
+                elif now - attempts.last >= self.window:
+                    del self._active[ip]
+        return summaries
+
+    def flush(self):
+        summaries = self.collect()
+        for summary in summaries:
+            try:
+                self.emit(summary)
+            except Exception:
+                logger.exception(f"Failed to emit login summary for {summary['ip_address']}")
+        self.summaries += len(summaries)
+        return len(summaries)
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="login-coalescer", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout=5.0):
+        """Stop the flusher after a last flush"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._stopping.set()
+        thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.wait(self.window):
+            self.flush()
+        self.flush()
+
+    def stats(self):
+        return {"tracked_ips": len(self._active), "immediate": self.immediate,
+                "coalesced": self.coalesced, "summaries": self.summaries}
+
+
+def logins_from_env(emit):
+    """Build a coalescer configured by LOGIN_COALESCE_* environment variables"""
+    return LoginCoalescer(
+        emit,
+        window=float(os.environ.get("LOGIN_COALESCE_WINDOW", DEFAULT_WINDOW)),
+        capacity=int(os.environ.get("LOGIN_COALESCE_CAPACITY", DEFAULT_CAPACITY)),
+    )
@@ -0,0 +1,224 @@
+"""
+In-process metrics exposed in the Prometheus text format.
+
+Counters and histograms are sharded per thread: each thread updates its own
+dict of plain lists, so recording a value takes no lock and never contends
+with other request threads. The shards are only summed when ``/metrics`` is
+scraped. Gauges are callbacks read at scrape time, so queue depths and
+store sizes cost nothing between scrapes.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; from a cached page splice up to a slow streamed export
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Sharded:
+    """Base for metrics whose samples live in one dict per recording thread"""
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _slot(self, labels):
+        """This thread's sample list for ``labels``, creating the thread's shard on first use"""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        slot = shard.get(labels)
+        if slot is None:
+            slot = shard[labels] = self._new_slot()
+        return slot
+
+
+class Counter(_Sharded):
+    """Monotonic count per label set"""
+
+    def inc(self, *labels, amount=1):
+        try:
+            slot = self._local.shard[labels]
+        except (AttributeError, KeyError):
+            slot = self._slot(labels)
+        slot[0] += amount
+
+    def _new_slot(self):
+        return [0]
+
+    def values(self):
+        totals = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for labels, slot in list(shard.items()):
+                totals[labels] = totals.get(labels, 0) + slot[0]
+        return totals
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram(_Sharded):
+    """Bucketed distribution per label set, in seconds unless stated otherwise"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        try:
+            counts = self._local.shard[labels]
+        except (AttributeError, KeyError):
+            counts = self._slot(labels)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def _new_slot(self):
+        # A count per bucket, one for +Inf, then the running sum
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def timed(self, function, *labels):
+        """Wrap ``function`` so every call's duration is observed under ``labels``"""
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.observe(time.perf_counter() - started, *labels)
+        return wrapper
+
+    def values(self):
+        totals = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for labels, counts in list(shard.items()):
+                total = totals.get(labels)
+                if total is None:
+                    totals[labels] = list(counts)
+                else:
+                    for i, count in enumerate(counts):
+                        total[i] += count
+        return totals
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        bucket_names = self.labelnames + ("le",)
+        for labels, counts in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_names, labels + (bound,))} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {counts[-1]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """
+    Value read from ``collect()`` at scrape time: a number, or a dict of
+    label tuple -> number. ``metric_type="counter"`` exposes a count some
+    other object already keeps.
+    """
+
+    def __init__(self, name, documentation, collect, labelnames=(), metric_type="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+        self.labelnames = tuple(labelnames)
+        self.metric_type = metric_type
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        try:
+            value = self.collect()
+        except Exception:
+            logger.exception(f"Failed to collect gauge {self.name}")
+            return lines
+        if not isinstance(value, dict):
+            value = {(): value}
+        for labels, sample in sorted(value.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {float(sample)}")
+        return lines
+
+
+class MetricsRegistry:
+    """The set of metrics one ``/metrics`` response renders"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, collect, labelnames=(), metric_type="gauge"):
+        return self._register(Gauge(name, documentation, collect, labelnames, metric_type))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """The exposition text for every registered metric"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode()
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def serve_metrics(registry, port, host=""):
+    """Serve ``registry`` at /metrics on its own port from a daemon thread; returns the server"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Serving metrics at http://{host or '0.0.0.0'}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,92 @@
+"""
+Pre-rendered page templates with per-request honeytoken splicing.
+
+Each page is rendered once with a placeholder token, encoded, and split into
+a byte prefix and suffix around the placeholder. Serving a request is then a
+single join of prefix, token and suffix instead of rebuilding the page.
+"""
+import threading
+from collections import OrderedDict
+
+TOKEN_PLACEHOLDER = "\x00honeytoken\x00"
+
+DEFAULT_MAX_PAGES = 5000
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class PageTemplate:
+    """Encoded page split around the honeytoken placeholder"""
+
+    __slots__ = ("prefix", "suffix", "has_token", "size")
+
+    def __init__(self, html):
+        encoded = html.encode()
+        placeholder = TOKEN_PLACEHOLDER.encode()
+        count = encoded.count(placeholder)
+        if count > 1:
+            raise ValueError("Page template contains more than one honeytoken placeholder")
+
+        self.has_token = count == 1
+        if self.has_token:
+            self.prefix, _, self.suffix = encoded.partition(placeholder)
+        else:
+            self.prefix, self.suffix = encoded, b""
+        self.size = len(self.prefix) + len(self.suffix)
+
+    def render(self, honeytoken):
+        if not self.has_token:
+            return self.prefix
+        return b"".join((self.prefix, honeytoken.encode(), self.suffix))
+
+
+class PageTemplateCache:
+    """
+    Cache of page templates keyed by route.
+
+    Pages are built from the decoy data, so whoever changes that data must
+    call ``invalidate``; the next request for each page rebuilds it once.
+    At most ``max_pages`` templates holding ``max_bytes`` in all are kept
+    (oldest dropped first), so per-record pages over a large dataset cannot
+    grow it without bound. Pages for query parameters that are not worth
+    keeping are built with ``render_uncached``.
+    """
+
+    def __init__(self, max_pages=DEFAULT_MAX_PAGES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.builds = 0
+
+    def render(self, key, honeytoken, build):
+        """Return page bytes for ``key`` with ``honeytoken`` spliced in"""
+        templates = self._templates
+        template = templates.get(key)
+        if template is None:
+            template = PageTemplate(build(TOKEN_PLACEHOLDER))
+            with self._lock:
+                self.builds += 1
+                # A page built from data that was invalidated meanwhile is
+                # served once, not cached
+                if templates is self._templates and template.size <= self.max_bytes:
+                    previous = templates.pop(key, None)
+                    if previous is not None:
+                        self.bytes -= previous.size
+                    templates[key] = template
+                    self.bytes += template.size
+                    while len(templates) > self.max_pages or self.bytes > self.max_bytes:
+                        self.bytes -= templates.popitem(last=False)[1].size
+        return template.render(honeytoken)
+
+    def render_uncached(self, honeytoken, build):
+        """Page bytes built for this request alone"""
+        return build(honeytoken).encode()
+
+    def invalidate(self):
+        with self._lock:
+            self._templates = OrderedDict()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._templates)
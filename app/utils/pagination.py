@@ -0,0 +1,113 @@
+"""
+Pagination and streaming helpers for list pages and APIs.
+
+Clients page with ``?page=N&limit=M`` or follow the opaque ``?cursor=``
+handed out in each response's ``Link: rel="next"`` header. Responses larger
+than a page are produced by generators of byte chunks, so memory per request
+stays flat however many rows the dataset holds.
+"""
+import base64
+import binascii
+import json
+
+DEFAULT_LIMIT = 50
+MAX_PAGE_LIMIT = 500
+MAX_API_LIMIT = 10000
+STREAM_THRESHOLD_ROWS = 1000
+JSON_BATCH_ROWS = 256
+
+
+class Page:
+    """Row range ``[start, stop)`` of a collection of ``total`` rows"""
+
+    __slots__ = ("start", "stop", "limit", "total")
+
+    def __init__(self, start, limit, total):
+        self.start = start
+        self.limit = limit
+        self.total = total
+        self.stop = total if limit is None else min(total, start + limit)
+
+    @property
+    def number(self):
+        return 1 if not self.limit else self.start // self.limit + 1
+
+    @property
+    def pages(self):
+        return 1 if not self.limit else max(1, -(-self.total // self.limit))
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.stop) if self.stop < self.total else None
+
+    def key(self):
+        return (self.start, self.limit)
+
+    def is_canonical(self, default_limit=DEFAULT_LIMIT):
+        """
+        Whether this is the whole collection or one of the pages of
+        ``default_limit`` rows that links lead to; worth caching, unlike the
+        many other ranges a client can ask for
+        """
+        return self.limit is None or (self.limit == default_limit and self.start % self.limit == 0)
+
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(f"o{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("invalid cursor")
+    if raw[:1] != "o" or not raw[1:].isdigit():
+        raise ValueError("invalid cursor")
+    return int(raw[1:])
+
+
+def parse_page(query, total, default_limit=DEFAULT_LIMIT, max_limit=MAX_PAGE_LIMIT):
+    """
+    Build a Page from parsed query parameters (``parse_qs`` output).
+
+    With ``default_limit=None`` a request without ``limit``, ``page`` or
+    ``cursor`` covers the whole collection. Raises ValueError on malformed
+    or out-of-range parameters.
+    """
+    limit = default_limit
+    if "limit" in query:
+        limit = _positive_int(query["limit"][0], "limit")
+        if limit > max_limit:
+            raise ValueError(f"limit must be at most {max_limit}")
+    elif "page" in query or "cursor" in query:
+        limit = limit or DEFAULT_LIMIT
+
+    if "cursor" in query:
+        start = decode_cursor(query["cursor"][0])
+    elif "page" in query:
+        start = (_positive_int(query["page"][0], "page") - 1) * limit
+    else:
+        start = 0
+    return Page(start, limit, total)
+
+
+def _positive_int(value, name):
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError(f"{name} must be a positive integer")
+    return int(value)
+
+
+def json_array_chunks(rows, batch_rows=JSON_BATCH_ROWS):
+    """Encode an iterable of rows as a JSON array, ``batch_rows`` rows per chunk"""
+    yield b"["
+    separator = ""
+    batch = []
+    for row in rows:
+        batch.append(json.dumps(row))
+        if len(batch) == batch_rows:
+            yield (separator + ",".join(batch)).encode()
+            separator = ","
+            batch = []
+    if batch:
+        yield (separator + ",".join(batch)).encode()
+    yield b"]"
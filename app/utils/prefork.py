@@ -0,0 +1,123 @@
+"""
+Pre-forked multi-process serving.
+
+One Python process only runs on one core at a time. ``serve_prefork`` forks
+a number of workers that each bind their own listening socket to the same
+port with SO_REUSEPORT, so the kernel spreads incoming connections across
+them, and supervises them: a worker that dies is replaced, and SIGTERM or
+SIGINT stops them all.
+
+Anything the workers must agree on (the honeytokens) has to live in a
+shared backend created before the fork; everything else is per worker.
+Threads do not survive fork, so workers must start their own.
+"""
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESTART_DELAY = 1.0
+
+
+class _Shutdown(Exception):
+    pass
+
+
+def _raise_shutdown(signum, frame):
+    raise _Shutdown()
+
+
+def _exit_worker(signum, frame):
+    # Unwinds serve_forever so the worker's atexit handlers flush its queues
+    sys.exit(0)
+
+
+def reserve_port(server_address):
+    """
+    Bind (without listening) a SO_REUSEPORT socket to ``server_address``
+
+    Fails fast if the port is taken by something that is not one of our
+    workers, and resolves port 0 to the port every worker will bind.
+    """
+    probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    try:
+        probe.bind(server_address)
+    except OSError:
+        probe.close()
+        raise
+    return probe
+
+
+def serve_prefork(server_address, processes, serve, restart_delay=DEFAULT_RESTART_DELAY):
+    """
+    Run ``serve(index, server_address)`` in ``processes`` forked workers
+
+    ``serve`` must bind ``server_address`` with SO_REUSEPORT and serve until
+    interrupted. Returns in the supervisor once the workers have stopped
+    after SIGTERM or SIGINT; workers never return from this call.
+    """
+    probe = reserve_port(server_address)
+    server_address = (server_address[0], probe.getsockname()[1])
+    workers = {}
+    previous = {signum: signal.signal(signum, _raise_shutdown) for signum in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        for index in range(processes):
+            _spawn(index, server_address, serve, workers, probe)
+        logger.info(f"Started {processes} workers on port {server_address[1]}")
+
+        while workers:
+            pid, status = os.wait()
+            index = workers.pop(pid, None)
+            if index is None:
+                continue
+            logger.error(f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, "
+                         f"restarting in {restart_delay:g}s")
+            time.sleep(restart_delay)
+            _spawn(index, server_address, serve, workers, probe)
+    except _Shutdown:
+        logger.info(f"Stopping {len(workers)} workers")
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in workers:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        probe.close()
+
+
+def _spawn(index, server_address, serve, workers, probe):
+    # Hold signals across the fork so neither side is interrupted half set up
+    signals = (signal.SIGTERM, signal.SIGINT)
+    signal.pthread_sigmask(signal.SIG_BLOCK, signals)
+    try:
+        pid = os.fork()
+        if pid:
+            workers[pid] = index
+            return
+        # In the worker: its siblings and the probe socket belong to the supervisor
+        workers.clear()
+        probe.close()
+        for signum in signals:
+            signal.signal(signum, _exit_worker)
+    finally:
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, signals)
+
+    try:
+        serve(index, server_address)
+    except Exception:
+        logger.exception(f"Worker {index} failed")
+        sys.exit(1)
+    sys.exit(0)
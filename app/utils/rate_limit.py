@@ -0,0 +1,99 @@
+"""
+Token-bucket rate limiting per client IP and per route.
+
+Each key (an IP, or an IP and route) gets a bucket that refills at ``rate``
+tokens per second up to ``burst``; a request spends one token and is
+refused when the bucket is empty. Buckets live in sharded, bounded LRUs so
+a scan from millions of addresses cannot grow them without limit, and a
+forgotten bucket simply starts full again.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CAPACITY = 100000
+DEFAULT_SHARDS = 64
+
+DEFAULT_IP_RATE = 50.0
+DEFAULT_IP_BURST = 100.0
+DEFAULT_ROUTE_RATE = 20.0
+DEFAULT_ROUTE_BURST = 40.0
+DEFAULT_LOGIN_RATE = 1.0
+DEFAULT_LOGIN_BURST = 10.0
+
+RATE_LIMIT_MODES = ("off", "reject", "tarpit")
+
+
+class RateLimiter:
+    """Token buckets keyed by arbitrary hashable keys"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, shards=DEFAULT_SHARDS):
+        self._per_shard = max(1, capacity // shards)
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+
+    def allow(self, key, rate, burst, now=None):
+        """Spend one token from ``key``'s bucket; False if it is empty"""
+        now = time.monotonic() if now is None else now
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                if len(buckets) >= self._per_shard:
+                    buckets.popitem(last=False)
+                bucket = buckets[key] = [burst, now]
+            else:
+                buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] < 1.0:
+                return False
+            bucket[0] -= 1.0
+            return True
+
+    def __len__(self):
+        return sum(len(buckets) for _, buckets in self._shards)
+
+
+class RateLimitPolicy:
+    """Per-IP limit on all requests plus a per-IP limit on each route"""
+
+    def __init__(self, mode="reject", ip_rate=DEFAULT_IP_RATE, ip_burst=DEFAULT_IP_BURST,
+                 route_rate=DEFAULT_ROUTE_RATE, route_burst=DEFAULT_ROUTE_BURST, route_limits=None,
+                 capacity=DEFAULT_CAPACITY):
+        if mode not in RATE_LIMIT_MODES:
+            raise ValueError(f"Unknown rate limit mode: {mode}")
+        self.mode = mode
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.route_rate = route_rate
+        self.route_burst = route_burst
+        # route name -> (rate, burst) overriding the route default
+        self.route_limits = dict(route_limits or {})
+        self._limiter = RateLimiter(capacity)
+        self.limited = 0
+
+    def allow(self, ip, route, now=None):
+        """Whether a request from ``ip`` to ``route`` (any hashable route name) may proceed"""
+        if self.mode == "off":
+            return True
+        now = time.monotonic() if now is None else now
+        rate, burst = self.route_limits.get(route, (self.route_rate, self.route_burst))
+        allowed = (self._limiter.allow((ip, route), rate, burst, now)
+                   and self._limiter.allow(ip, self.ip_rate, self.ip_burst, now))
+        if not allowed:
+            self.limited += 1
+        return allowed
+
+
+def rate_limits_from_env(login_route):
+    """Build a policy from RATE_LIMIT_* variables; ``login_route`` gets the login limits"""
+    return RateLimitPolicy(
+        mode=os.environ.get("RATE_LIMIT_MODE", "reject"),
+        ip_rate=float(os.environ.get("RATE_LIMIT_IP_RATE", DEFAULT_IP_RATE)),
+        ip_burst=float(os.environ.get("RATE_LIMIT_IP_BURST", DEFAULT_IP_BURST)),
+        route_rate=float(os.environ.get("RATE_LIMIT_ROUTE_RATE", DEFAULT_ROUTE_RATE)),
+        route_burst=float(os.environ.get("RATE_LIMIT_ROUTE_BURST", DEFAULT_ROUTE_BURST)),
+        route_limits={login_route: (float(os.environ.get("RATE_LIMIT_LOGIN_RATE", DEFAULT_LOGIN_RATE)),
+                                    float(os.environ.get("RATE_LIMIT_LOGIN_BURST", DEFAULT_LOGIN_BURST)))},
+    )
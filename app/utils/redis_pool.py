@@ -0,0 +1,100 @@
+"""
+Shared, lazily connected Redis client.
+
+Every module gets the same client, backed by one connection pool and
+configured from REDIS_HOST, REDIS_PORT and REDIS_DB. Nothing connects until
+the first command, and a failed connection is simply retried by the pool on
+the next one. Liveness is tracked by a background thread so request handlers
+can check ``redis_available()`` without a round trip.
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEALTH_CHECK_INTERVAL = 5.0
+
+_client = None
+_client_lock = threading.Lock()
+# None until the health check has pinged the current client
+_available = None
+_monitor = None
+
+
+def redis_settings():
+    return {
+        "host": os.environ.get("REDIS_HOST", "redis"),
+        "port": int(os.environ.get("REDIS_PORT", 6379)),
+        "db": int(os.environ.get("REDIS_DB", 0)),
+        "max_connections": int(os.environ.get("REDIS_MAX_CONNECTIONS", 64)),
+        "socket_connect_timeout": float(os.environ.get("REDIS_CONNECT_TIMEOUT", 1.0)),
+        "socket_timeout": float(os.environ.get("REDIS_SOCKET_TIMEOUT", 2.0)),
+    }
+
+
+def get_redis_client():
+    """Return the process-wide Redis client, creating its pool on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import redis
+
+                settings = redis_settings()
+                # Blocking pool: a burst of worker threads waits for a free
+                # connection instead of failing with "too many connections"
+                pool = redis.BlockingConnectionPool(timeout=settings["socket_timeout"], **settings)
+                _client = redis.Redis(connection_pool=pool)
+                logger.info(f"Redis client configured for {settings['host']}:{settings['port']}/{settings['db']}")
+                _start_health_monitor()
+    return _client
+
+
+def redis_available():
+    """
+    Last known Redis liveness, as seen by the background health check: True,
+    False, or None if the current client has not been checked yet
+    """
+    return _available
+
+
+def reset_redis_client():
+    """Drop the shared client and its pool, e.g. after fork"""
+    global _client, _available
+    with _client_lock:
+        if _client is not None:
+            _client.connection_pool.disconnect()
+        _client = None
+        _available = None
+
+
+def _start_health_monitor():
+    global _monitor
+    if _monitor is not None and _monitor.is_alive():
+        return
+    interval = float(os.environ.get("REDIS_HEALTH_CHECK_INTERVAL", DEFAULT_HEALTH_CHECK_INTERVAL))
+    _monitor = threading.Thread(target=_health_loop, args=(interval,), name="redis-health", daemon=True)
+    _monitor.start()
+
+
+def _health_loop(interval):
+    global _available
+    first_check = True
+    while True:
+        client = _client
+        if client is not None:
+            try:
+                client.ping()
+                healthy, error = True, None
+            except Exception as e:
+                healthy, error = False, e
+
+            if healthy and not _available:
+                logger.info("Connected to Redis successfully")
+            elif not healthy and (_available or first_check):
+                logger.error(f"Failed to connect to Redis: {error}")
+            _available = healthy
+            first_check = False
+        time.sleep(interval)
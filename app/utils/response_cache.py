@@ -0,0 +1,157 @@
+"""
+Pre-encoded response cache with conditional and compressed variants.
+
+Each entry holds the identity body plus a gzip body compressed once when
+the entry is built (deflate, which few clients prefer, on first request), an
+ETag per representation and a Last-Modified time. Handlers answer
+If-None-Match / If-Modified-Since with 304 and pick a representation from
+Accept-Encoding without re-serializing or re-compressing anything.
+"""
+import gzip
+import hashlib
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+MIN_COMPRESS_SIZE = 256
+# Level 6 gives nearly all of level 9's savings on JSON at a fraction of the CPU
+COMPRESS_LEVEL = 6
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class CachedResponse:
+    """One cached resource in all of its encodings"""
+
+    __slots__ = ("content_type", "last_modified", "last_modified_header", "variants", "etags", "size")
+
+    def __init__(self, body, content_type, last_modified, compress=True):
+        self.content_type = content_type
+        self.last_modified = int(last_modified)
+        self.last_modified_header = formatdate(self.last_modified, usegmt=True)
+
+        digest = hashlib.sha1(body).hexdigest()[:20]
+        # encoding -> (body, etag); each representation needs its own strong ETag
+        self.variants = {None: (body, f'"{digest}"')}
+        self.etags = {f'"{digest}"'}
+        if compress and len(body) >= MIN_COMPRESS_SIZE:
+            self.variants["gzip"] = (gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0), f'"{digest}-gz"')
+            # Built by select() if a client asks for it
+            self.variants["deflate"] = None
+            self.etags.update((f'"{digest}-gz"', f'"{digest}-df"'))
+        # Bytes held once deflate is built too; it is within a few bytes of gzip
+        self.size = len(body)
+        if "gzip" in self.variants:
+            self.size += 2 * len(self.variants["gzip"][0])
+
+    def is_not_modified(self, if_none_match, if_modified_since):
+        """Evaluate conditional request headers (If-None-Match takes precedence)"""
+        if if_none_match:
+            for candidate in if_none_match.split(","):
+                candidate = candidate.strip()
+                if candidate == "*":
+                    return True
+                if candidate.startswith("W/"):
+                    candidate = candidate[2:]
+                if candidate in self.etags:
+                    return True
+            return False
+
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError, IndexError):
+                return False
+            return self.last_modified <= since
+        return False
+
+    def select(self, accept_encoding):
+        """Return ``(body, content_encoding, etag)`` for the client's Accept-Encoding"""
+        for encoding in _accepted_encodings(accept_encoding):
+            if encoding in self.variants:
+                variant = self.variants[encoding]
+                if variant is None:
+                    # Racing requests may each build it; they build the same bytes
+                    identity, etag = self.variants[None]
+                    variant = self.variants[encoding] = (zlib.compress(identity, COMPRESS_LEVEL), etag[:-1] + '-df"')
+                body, etag = variant
+                return body, encoding, etag
+        body, etag = self.variants[None]
+        return body, None, etag
+
+
+class ResponseCache:
+    """
+    Cache of pre-encoded responses keyed by resource.
+
+    Whoever changes the underlying data must call ``invalidate``; entries are
+    rebuilt on next use with a new Last-Modified time. At most
+    ``max_entries`` entries holding ``max_bytes`` in all are kept, oldest
+    dropped first. Responses that are not worth keeping, such as one-off
+    page sizes, are built with ``build_uncached`` instead.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_modified = time.time()
+        self.bytes = 0
+        self.builds = 0
+
+    def get(self, key, build, content_type="application/json"):
+        """Return the CachedResponse for ``key``, building its body with ``build()`` once"""
+        entries = self._entries
+        entry = entries.get(key)
+        if entry is None:
+            entry = CachedResponse(build(), content_type, self._last_modified)
+            with self._lock:
+                self.builds += 1
+                # As in PageTemplateCache: a body built across an invalidate is not kept
+                if entries is not self._entries or entry.size > self.max_bytes:
+                    return entry
+                previous = entries.pop(key, None)
+                if previous is not None:
+                    self.bytes -= previous.size
+                entries[key] = entry
+                self.bytes += entry.size
+                while len(entries) > self.max_entries or self.bytes > self.max_bytes:
+                    self.bytes -= entries.popitem(last=False)[1].size
+        return entry
+
+    def build_uncached(self, build, content_type="application/json"):
+        """A CachedResponse for one request only: not kept, so not compressed either"""
+        return CachedResponse(build(), content_type, self._last_modified, compress=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = OrderedDict()
+            self._last_modified = time.time()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _accepted_encodings(accept_encoding):
+    """Encodings from an Accept-Encoding header in preference order, q=0 excluded"""
+    if not accept_encoding:
+        return ()
+    ranked = []
+    for position, item in enumerate(accept_encoding.split(",")):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        name = name.strip().lower()
+        if name and quality > 0:
+            ranked.append((-quality, position, name))
+    ranked.sort()
+    return [name for _, _, name in ranked]
@@ -0,0 +1,101 @@
+"""
+Precompiled request router.
+
+Static paths are looked up in a dict keyed by (method, path). Paths with
+``<name>`` placeholders live in a per-method segment tree, so matching costs
+one dict lookup plus one step per path segment no matter how many decoy
+endpoints are registered. A literal segment always wins over a placeholder
+at the same depth, and placeholders never match an empty segment.
+"""
+
+
+class _Node:
+    __slots__ = ("children", "param_name", "param_child", "handler")
+
+    def __init__(self):
+        self.children = {}
+        self.param_name = None
+        self.param_child = None
+        self.handler = None
+
+
+class Router:
+    """Maps (method, path) to a handler and the path parameters it captured"""
+
+    def __init__(self):
+        self._exact = {}
+        self._trees = {}
+
+    def add(self, method, pattern, handler):
+        segments = _split(pattern)
+        if not any(_is_param(segment) for segment in segments):
+            self._exact[(method, pattern)] = handler
+            return
+
+        node = self._trees.setdefault(method, _Node())
+        for segment in segments:
+            if _is_param(segment):
+                name = segment[1:-1]
+                if node.param_child is None:
+                    node.param_child = _Node()
+                    node.param_name = name
+                elif node.param_name != name:
+                    raise ValueError(f"Conflicting parameter names <{node.param_name}> and <{name}> in {pattern}")
+                node = node.param_child
+            else:
+                node = node.children.setdefault(segment, _Node())
+        if node.handler is not None:
+            raise ValueError(f"Duplicate route: {method} {pattern}")
+        node.handler = handler
+
+    def route(self, method, pattern):
+        """Decorator form of ``add``"""
+        def register(handler):
+            self.add(method, pattern, handler)
+            return handler
+        return register
+
+    def match(self, method, path):
+        """Return ``(handler, params)``, or ``(None, None)`` if nothing matches"""
+        handler = self._exact.get((method, path))
+        if handler is not None:
+            return handler, {}
+
+        node = self._trees.get(method)
+        if node is None:
+            return None, None
+        return _walk(node, _split(path), 0, {})
+
+    def __len__(self):
+        return len(self._exact) + sum(_count(tree) for tree in self._trees.values())
+
+
+def _walk(node, segments, index, params):
+    if index == len(segments):
+        return (node.handler, params) if node.handler is not None else (None, None)
+
+    segment = segments[index]
+    child = node.children.get(segment)
+    if child is not None:
+        handler, found = _walk(child, segments, index + 1, params)
+        if handler is not None:
+            return handler, found
+
+    if node.param_child is not None and segment:
+        params = dict(params)
+        params[node.param_name] = segment
+        return _walk(node.param_child, segments, index + 1, params)
+    return None, None
+
+
+def _split(path):
+    return path.strip("/").split("/") if path != "/" else []
+
+
+def _is_param(segment):
+    return len(segment) > 2 and segment[0] == "<" and segment[-1] == ">"
+
+
+def _count(node):
+    return (node.handler is not None) + sum(_count(child) for child in node.children.values()) + (
+        _count(node.param_child) if node.param_child is not None else 0)
@@ -0,0 +1,404 @@
+"""
+Serving engines for the Healthcare Deception Framework.
+
+The ``threaded`` engine hands every accepted connection to a bounded worker
+pool, so one slow scanner holding a socket open cannot stall other sessions.
+The ``asyncio`` engine multiplexes connections on an event loop and passes
+each complete request to the same ``BaseHTTPRequestHandler`` routing and
+render methods used by the threaded engine, streaming their output back
+through the loop as it is written.
+
+Both engines keep HTTP/1.1 connections open between requests, pipelined
+ones included, until the client closes, ``keepalive_timeout`` passes with
+no new request, or ``max_requests`` have been served on the connection.
+Handlers opt in with ``KeepAliveHandlerMixin``.
+"""
+import io
+import logging
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import HTTPServer
+
+logger = logging.getLogger(__name__)
+
+SERVER_MODES = ("threaded", "asyncio")
+
+DEFAULT_WORKERS = 32
+DEFAULT_MAX_CONNECTIONS = 512
+DEFAULT_TIMEOUT = 15.0
+DEFAULT_MAX_REQUESTS = 100
+DEFAULT_KEEPALIVE_TIMEOUT = 5.0
+
+# Larger request bodies are refused by the handler, so never buffered here
+MAX_BODY_SIZE = 64 * 1024
+
+# The asyncio engine hands handler output to the event loop in pieces of this size
+STREAM_CHUNK_SIZE = 64 * 1024
+
+BUSY_RESPONSE = (
+    b"HTTP/1.0 503 Service Unavailable\r\n"
+    b"Content-Type: text/html\r\n"
+    b"Content-Length: 0\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+)
+
+ERROR_RESPONSE = (
+    b"HTTP/1.0 500 Internal Server Error\r\n"
+    b"Content-Type: text/html\r\n"
+    b"Content-Length: 0\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+)
+
+
+class KeepAliveHandlerMixin:
+    """
+    Persistent connections for a ``BaseHTTPRequestHandler`` run by these engines.
+
+    Every response must carry Content-Length or chunked encoding. The engine
+    sets ``last_request`` when it will not read another request from the
+    connection, and the response then says ``Connection: close``.
+    """
+
+    protocol_version = "HTTP/1.1"
+    last_request = False
+
+    def handle(self):
+        """Threaded engine: serve requests until the connection closes, idles or hits its cap"""
+        self.close_connection = True
+        served = 0
+        while self._await_request(self.server.keepalive_timeout if served else self.connection.gettimeout()):
+            served += 1
+            # Decided once the request has arrived, so connections that queued
+            # for a worker in the meantime are counted
+            self.last_request = not self.server.keep_alive(served)
+            self.handle_one_request()
+            if self.close_connection:
+                return
+
+    def _await_request(self, timeout):
+        """Wait up to ``timeout`` for the next request; False if none arrives"""
+        previous = self.connection.gettimeout()
+        self.connection.settimeout(timeout)
+        try:
+            # Pipelined requests are already buffered and return at once
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(previous)
+
+    def end_headers(self):
+        if self.last_request and not self.close_connection:
+            self.send_header("Connection", "close")
+        super().end_headers()
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """HTTPServer that runs each connection on a bounded thread pool"""
+
+    def __init__(self, server_address, handler_class, workers=DEFAULT_WORKERS,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, timeout=DEFAULT_TIMEOUT,
+                 max_requests=DEFAULT_MAX_REQUESTS, keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT,
+                 reuse_port=False):
+        self.workers = workers
+        self.reuse_port = reuse_port
+        self.max_connections = max_connections
+        self.connection_timeout = timeout
+        self.max_requests = max_requests
+        self.keepalive_timeout = keepalive_timeout
+        self.active_connections = 0
+        self._active_lock = threading.Lock()
+        # The stock backlog of 5 drops SYNs as soon as a crawler fans out
+        self.request_queue_size = max(max_connections, 5)
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http-worker")
+        self._detached = set()
+        self._detached_lock = threading.Lock()
+        super().__init__(server_address, handler_class)
+
+    def server_bind(self):
+        # Pre-forked workers each bind the same port and the kernel spreads connections
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def tarpit(self, handler, pit, payload):
+        """Hand the handler's connection to ``pit`` (a utils.tarpit.Tarpit); False if it is full"""
+        with self._detached_lock:
+            self._detached.add(handler.request)
+        if pit.hold(handler.request, payload):
+            return True
+        with self._detached_lock:
+            self._detached.discard(handler.request)
+        return False
+
+    def keep_alive(self, served):
+        """Whether a connection that has had ``served`` requests may wait for another"""
+        # An idle keep-alive connection pins a worker, so stop keeping them
+        # once connections are queueing for one
+        return served < self.max_requests and self.active_connections <= self.workers
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            logger.warning(f"Connection limit reached, rejecting {client_address[0]}")
+            try:
+                request.sendall(BUSY_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+
+        if self.connection_timeout:
+            request.settimeout(self.connection_timeout)
+        # Headers and body go out in separate sends; without this a reused
+        # connection stalls on Nagle's algorithm and delayed ACKs
+        request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._active_lock:
+            self.active_connections += 1
+        self._pool.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self._detached_lock:
+                detached = request in self._detached
+                self._detached.discard(request)
+            # A tarpitted socket now belongs to the tarpit, which closes it
+            if not detached:
+                self.shutdown_request(request)
+            with self._active_lock:
+                self.active_connections -= 1
+            self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False)
+
+
+class AsyncioHTTPServer:
+    """Event-loop server that dispatches parsed requests to a handler class"""
+
+    def __init__(self, server_address, handler_class, workers=DEFAULT_WORKERS,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, timeout=DEFAULT_TIMEOUT,
+                 max_requests=DEFAULT_MAX_REQUESTS, keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT,
+                 reuse_port=False):
+        self.handler_class = handler_class
+        self.workers = workers
+        self.max_connections = max_connections
+        self.connection_timeout = timeout
+        self.max_requests = max_requests
+        self.keepalive_timeout = keepalive_timeout
+        self.active_connections = 0
+
+        # Bind up front, like HTTPServer, so callers can read the real port
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.socket.bind(server_address)
+        self.socket.listen(max(max_connections, 5))
+        self.server_address = self.socket.getsockname()
+
+        # Handlers still do blocking work (logging, Redis), so keep it off the loop
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http-worker")
+        self._loop = None
+        self._stopped = None
+        self._finished = threading.Event()
+        self._detached = set()
+
+    def serve_forever(self):
+        # Imported here, not at module level, so the threaded engine never pays for asyncio
+        import asyncio
+
+        self._finished.clear()
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self._finished.set()
+
+    def shutdown(self):
+        """Stop serve_forever and wait for it to return, like HTTPServer.shutdown"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+            self._finished.wait()
+
+    def server_close(self):
+        self.socket.close()
+        self._pool.shutdown(wait=False)
+
+    def tarpit(self, handler, pit, payload):
+        """Hand the handler's connection to ``pit`` (a utils.tarpit.Tarpit); False if it is full"""
+        import asyncio
+
+        if not pit.reserve():
+            return False
+        writer = handler.wfile.writer
+        self._detached.add(writer)
+        asyncio.run_coroutine_threadsafe(pit.drip(writer, payload), self._loop)
+        return True
+
+    def keep_alive(self, served):
+        """Whether a connection that has had ``served`` requests may wait for another"""
+        return served < self.max_requests
+
+    async def _serve(self):
+        import asyncio
+
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        server = await asyncio.start_server(self._handle_connection, sock=self.socket)
+        async with server:
+            await self._stopped.wait()
+
+    async def _handle_connection(self, reader, writer):
+        import asyncio
+
+        peer = writer.get_extra_info("peername") or ("", 0)
+        if self.active_connections >= self.max_connections:
+            logger.warning(f"Connection limit reached, rejecting {peer[0]}")
+            writer.write(BUSY_RESPONSE)
+            await self._close(writer)
+            return
+
+        self.active_connections += 1
+        detached = False
+        served = 0
+        try:
+            while True:
+                # Idle connections cost nothing here, but still give them up after a while
+                timeout = self.keepalive_timeout if served else self.connection_timeout
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+                    length = _content_length(head)
+                    body = b""
+                    if 0 < length <= MAX_BODY_SIZE:
+                        body = await asyncio.wait_for(reader.readexactly(length), self.connection_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                        asyncio.LimitOverrunError, ConnectionError, ValueError):
+                    break
+
+                served += 1
+                close = await self._loop.run_in_executor(
+                    self._pool, self._dispatch, head + body, peer, writer, served)
+                if length > MAX_BODY_SIZE:
+                    # The unread body is still in the stream
+                    close = True
+                if writer in self._detached:
+                    # Tarpitted: the drip task owns the connection now
+                    self._detached.discard(writer)
+                    detached = True
+                    break
+                if close:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.active_connections -= 1
+            if not detached:
+                await self._close(writer)
+
+    def _dispatch(self, raw_request, client_address, writer, served=1):
+        """Run one buffered request through the handler's routing; returns whether to close"""
+        handler = self.handler_class.__new__(self.handler_class)
+        handler.server = self
+        handler.request = None
+        handler.client_address = client_address
+        handler.rfile = io.BytesIO(raw_request)
+        handler.wfile = _LoopWriter(self._loop, writer, self.connection_timeout)
+        handler.close_connection = True
+        handler.last_request = not self.keep_alive(served)
+        try:
+            handler.handle_one_request()
+            handler.wfile.flush()
+        except (ConnectionError, FutureTimeoutError):
+            # Client went away or stopped reading mid-response
+            return True
+        except Exception:
+            logger.exception(f"Error handling request from {client_address[0]}")
+            if not handler.wfile.written:
+                handler.wfile.discard()
+                handler.wfile.write(ERROR_RESPONSE)
+                handler.wfile.flush()
+            return True
+        return handler.close_connection
+
+    @staticmethod
+    async def _close(writer):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+class _LoopWriter:
+    """
+    Handler ``wfile`` for the asyncio engine.
+
+    Output is buffered and handed to the event loop every STREAM_CHUNK_SIZE
+    bytes, waiting for the transport to drain, so a streamed response never
+    piles up in memory and a client that stops reading only holds one
+    worker until ``timeout``.
+    """
+
+    def __init__(self, loop, writer, timeout):
+        self._loop = loop
+        self.writer = writer
+        self._timeout = timeout
+        self._buffer = bytearray()
+        self.written = 0
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= STREAM_CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        import asyncio
+
+        if not self._buffer:
+            return
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        self.written += len(data)
+        asyncio.run_coroutine_threadsafe(self._send(data), self._loop).result(self._timeout)
+
+    def discard(self):
+        self._buffer.clear()
+
+    async def _send(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+
+def _content_length(head):
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            return int(value.strip())
+    return 0
+
+
+def make_server(mode, server_address, handler_class, workers=DEFAULT_WORKERS,
+                max_connections=DEFAULT_MAX_CONNECTIONS, timeout=DEFAULT_TIMEOUT,
+                max_requests=DEFAULT_MAX_REQUESTS, keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT,
+                reuse_port=False):
+    """Build a server for the selected engine; ``reuse_port`` lets several processes bind its port"""
+    if mode == "threaded":
+        server_class = ThreadPoolHTTPServer
+    elif mode == "asyncio":
+        server_class = AsyncioHTTPServer
+    else:
+        raise ValueError(f"Unknown server mode: {mode}")
+
+    return server_class(server_address, handler_class, workers=workers,
+                        max_connections=max_connections, timeout=timeout,
+                        max_requests=max_requests, keepalive_timeout=keepalive_timeout,
+                        reuse_port=reuse_port)
@@ -0,0 +1,283 @@
+"""
+Per-IP attacker sessions and periodic profile reports.
+
+Every request, login attempt and honeytoken hit is folded into a compact
+session for the client IP: path counts, a short trail of recent steps with
+their timing, the credentials tried and the tokens triggered. Sessions live
+in an LRU bounded by ``capacity`` and end after ``ttl`` seconds of silence.
+
+A reporter thread emits one aggregated profile every ``report_interval`` for
+each session that changed since its last report, plus a final profile when
+a changed session expires or is evicted, so downstream consumers see one
+event per attacker per interval instead of one per request.
+"""
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 50000
+DEFAULT_TTL = 30 * 60
+DEFAULT_REPORT_INTERVAL = 60.0
+DEFAULT_TRAIL_LENGTH = 16
+MAX_PATHS = 64
+MAX_CREDENTIALS = 32
+MAX_TOKENS = 16
+MAX_PENDING = 10000
+REPORT_BATCH = 256
+
+
+class Session:
+    """Activity of one client IP; collections are allocated on first use"""
+
+    __slots__ = ("ip", "first_seen", "last_seen", "requests", "min_interval", "paths", "other_paths",
+                 "trail", "login_attempts", "login_successes", "credentials", "tokens", "dirty")
+
+    def __init__(self, ip, now):
+        self.ip = ip
+        self.first_seen = now
+        self.last_seen = now
+        self.requests = 0
+        self.min_interval = None
+        self.paths = None
+        self.other_paths = 0
+        self.trail = None
+        self.login_attempts = 0
+        self.login_successes = 0
+        self.credentials = None
+        self.tokens = None
+        self.dirty = False
+
+    def touch(self, now, step, trail_length):
+        self.last_seen = now
+        # Flat [time, step, time, step, ...] list: far smaller than a deque of tuples
+        trail = self.trail
+        if trail is None:
+            trail = self.trail = []
+        elif len(trail) >= 2 * trail_length:
+            del trail[:2]
+        trail.append(now)
+        trail.append(step)
+        self.dirty = True
+
+    def to_profile(self, final=False):
+        duration = self.last_seen - self.first_seen
+        trail = self.trail or []
+        return {
+            "event_type": "attacker_profile",
+            "ip": self.ip,
+            "first_seen": _isoformat(self.first_seen),
+            "last_seen": _isoformat(self.last_seen),
+            "duration": round(duration, 3),
+            "requests": self.requests,
+            "mean_interval": round(duration / (self.requests - 1), 3) if self.requests > 1 else None,
+            "min_interval": round(self.min_interval, 3) if self.min_interval is not None else None,
+            "paths": dict(self.paths) if self.paths else {},
+            "other_paths": self.other_paths,
+            "trail": [{"offset": round(trail[i] - self.first_seen, 3), "step": trail[i + 1]}
+                      for i in range(0, len(trail), 2)],
+            "login_attempts": self.login_attempts,
+            "login_successes": self.login_successes,
+            "credentials": [{"username": username, "password": password, "attempts": attempts}
+                            for (username, password), attempts in (self.credentials or {}).items()],
+            "tokens": [{"token_id": token_id, "context": context} for token_id, context in self.tokens or ()],
+            "final": final,
+        }
+
+
+class SessionTracker:
+    """Bounded LRU of per-IP sessions with a background profile reporter"""
+
+    def __init__(self, emit, capacity=DEFAULT_CAPACITY, ttl=DEFAULT_TTL,
+                 report_interval=DEFAULT_REPORT_INTERVAL, trail_length=DEFAULT_TRAIL_LENGTH):
+        self.emit = emit
+        self.capacity = capacity
+        self.ttl = ttl
+        self.report_interval = report_interval
+        self.trail_length = trail_length
+
+        self._sessions = OrderedDict()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        self.events = 0
+        self.evicted = 0
+        self.expired = 0
+        self.reported = 0
+        self.dropped_reports = 0
+
+    def record_request(self, ip, method, path):
+        now = time.time()
+        with self._lock:
+            session = self._session(ip)
+            if session.requests:
+                interval = now - session.last_seen
+                if session.min_interval is None or interval < session.min_interval:
+                    session.min_interval = interval
+            session.requests += 1
+            path = sys.intern(path)
+            paths = session.paths
+            if paths is None:
+                paths = session.paths = {}
+            if path in paths:
+                paths[path] += 1
+            elif len(paths) < MAX_PATHS:
+                paths[path] = 1
+            else:
+                session.other_paths += 1
+            session.touch(now, sys.intern(f"{method} {path}"), self.trail_length)
+
+    def record_login(self, ip, username, password, success):
+        with self._lock:
+            session = self._session(ip)
+            session.login_attempts += 1
+            if success:
+                session.login_successes += 1
+            credentials = session.credentials
+            if credentials is None:
+                credentials = session.credentials = {}
+            key = (username, password)
+            if key in credentials:
+                credentials[key] += 1
+            elif len(credentials) < MAX_CREDENTIALS:
+                credentials[key] = 1
+            session.touch(time.time(), sys.intern(f"login {username} {'ok' if success else 'failed'}"),
+                          self.trail_length)
+
+    def record_token(self, ip, token_id, context):
+        with self._lock:
+            session = self._session(ip)
+            if session.tokens is None:
+                session.tokens = []
+            if len(session.tokens) < MAX_TOKENS:
+                session.tokens.append((token_id, context))
+            session.touch(time.time(), sys.intern(f"honeytoken {context}"), self.trail_length)
+
+    def _session(self, ip):
+        """Find or create the session for ``ip`` and mark it most recent; caller holds the lock"""
+        if self._thread is None:
+            self.start()
+        self.events += 1
+        session = self._sessions.get(ip)
+        if session is not None:
+            self._sessions.move_to_end(ip)
+            return session
+
+        now = time.time()
+        self._expire(now)
+        if len(self._sessions) >= self.capacity:
+            _, oldest = self._sessions.popitem(last=False)
+            self.evicted += 1
+            self._retire(oldest)
+        session = self._sessions[ip] = Session(ip, now)
+        return session
+
+    def _expire(self, now):
+        """Drop sessions idle for longer than the TTL; caller holds the lock"""
+        cutoff = now - self.ttl
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_seen > cutoff:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+            self._retire(session)
+
+    def _retire(self, session):
+        if not session.dirty:
+            return
+        if len(self._pending) < MAX_PENDING:
+            self._pending.append(session.to_profile(final=True))
+        else:
+            self.dropped_reports += 1
+
+    def get(self, ip):
+        """Current profile for ``ip``, or None if it has no live session"""
+        with self._lock:
+            session = self._sessions.get(ip)
+            return session.to_profile() if session is not None else None
+
+    def collect(self):
+        """Profiles of sessions that changed since the last report, plus ended sessions"""
+        with self._lock:
+            self._expire(time.time())
+            profiles, self._pending = self._pending, []
+            changed = [session for session in self._sessions.values() if session.dirty]
+
+        # Snapshot in small batches so request threads are never held up for long
+        for start in range(0, len(changed), REPORT_BATCH):
+            with self._lock:
+                for session in changed[start:start + REPORT_BATCH]:
+                    profiles.append(session.to_profile())
+                    session.dirty = False
+        return profiles
+
+    def report(self):
+        """Emit collected profiles; returns how many were emitted"""
+        profiles = self.collect()
+        for profile in profiles:
+            try:
+                self.emit(profile)
+            except Exception:
+                logger.exception(f"Failed to emit attacker profile for {profile['ip']}")
+        self.reported += len(profiles)
+        return len(profiles)
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="session-reporter", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout=5.0):
+        """Stop the reporter after a last report"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._stopping.set()
+        thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.wait(self.report_interval):
+            self.report()
+        self.report()
+
+    def stats(self):
+        return {
+            "sessions": len(self._sessions),
+            "events": self.events,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "reported": self.reported,
+            "pending": len(self._pending),
+            "dropped_reports": self.dropped_reports,
+        }
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec="seconds")
+
+
+def sessions_from_env(emit):
+    """Build a tracker configured by SESSION_* environment variables"""
+    return SessionTracker(
+        emit,
+        capacity=int(os.environ.get("SESSION_CAPACITY", DEFAULT_CAPACITY)),
+        ttl=float(os.environ.get("SESSION_TTL", DEFAULT_TTL)),
+        report_interval=float(os.environ.get("SESSION_REPORT_INTERVAL", DEFAULT_REPORT_INTERVAL)),
+        trail_length=int(os.environ.get("SESSION_TRAIL_LENGTH", DEFAULT_TRAIL_LENGTH)),
+    )
@@ -0,0 +1,276 @@
+"""
+Honeytoken store in shared memory, for pre-forked workers without Redis.
+
+The store is one anonymous shared mmap created before the workers are
+forked, so a token minted by any worker is seen by all of them. It has the
+same interface as ``token_store.HoneytokenStore`` but a fixed size: tokens
+are hashed into buckets of ``WAYS`` fixed-size slots, like a set-associative
+cache. A new token takes a free slot in its bucket, else the slot of an
+expired or the oldest never-accessed token, and only if every slot holds an
+accessed token the least recently accessed one. There is no spill file:
+accessed tokens have already been logged and alerted on, but each such
+eviction is logged and counted as ``evicted_accessed`` in ``stats()``.
+
+Each bucket is guarded by one of a set of striped ``multiprocessing`` locks,
+which work across processes as well as threads. Tokens are keyed by a
+16-byte BLAKE2 digest of their id, and ids of up to ``MAX_ID_BYTES`` (UUIDs
+and signed tokens alike) are stored with them. Contexts longer than
+``MAX_CONTEXT_BYTES`` are truncated, and only the first ``MAX_IPS`` accessing
+IPs are kept; later IPs are counted but always reported as new.
+
+``query`` scans every slot, so it is for the admin API, not request paths.
+"""
+import hashlib
+import ipaddress
+import logging
+import mmap
+import multiprocessing
+import struct
+import time
+
+from .token_store import DEFAULT_CAPACITY, DEFAULT_LOCK_STRIPES, DEFAULT_QUERY_LIMIT, DEFAULT_TTL, \
+    AccessSnapshot, TokenRecord
+
+logger = logging.getLogger(__name__)
+
+WAYS = 8
+MAX_IPS = 4
+MAX_CONTEXT_BYTES = 150
+MAX_ID_BYTES = 160
+
+# Slot: key, created_at, last_accessed (0: never), access_count, distinct IPs
+# seen, context length, context, token id, then MAX_IPS IPv6 (or v4-mapped)
+# addresses
+_HEAD = struct.Struct("<16sddIHH")
+_SLOT = struct.Struct(f"<16sddIHH{MAX_CONTEXT_BYTES}s{MAX_ID_BYTES}s{16 * MAX_IPS}s")
+# Per stripe: fresh, accessed, expired, evicted, evicted_accessed
+_COUNTERS = struct.Struct("<5q")
+_EMPTY = bytes(16)
+
+
+class SharedTokenStore:
+    """Fixed-size, set-associative honeytoken store shared by forked processes"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, ttl=DEFAULT_TTL, lock_stripes=DEFAULT_LOCK_STRIPES):
+        self.ttl = ttl
+        self.buckets = max(1, -(-capacity // WAYS))
+        self.capacity = self.buckets * WAYS
+        self._stripes = [multiprocessing.Lock() for _ in range(lock_stripes)]
+        self._slots_offset = _COUNTERS.size * lock_stripes
+        self._memory = mmap.mmap(-1, self._slots_offset + self.capacity * _SLOT.size)
+
+    def create(self, token_id, context, now=None):
+        """Add a new, never-accessed token, replacing an older one if its bucket is full"""
+        now = time.time() if now is None else now
+        key = _key(token_id)
+        if key is None:
+            raise ValueError(f"token ids are limited to {MAX_ID_BYTES} bytes")
+        bucket = self._bucket(key)
+        stripe = bucket % len(self._stripes)
+        with self._stripes[stripe]:
+            self._insert(bucket, stripe, key, token_id, context, now, now)
+        return TokenRecord(context, now)
+
+    def record_access(self, token_id, ip_address, now=None, minted=None):
+        """
+        Count an access to ``token_id``; returns an AccessSnapshot, or None if
+        unknown. ``minted`` is the ``(context, created_at)`` of a verified
+        stateless token (see utils.signed_tokens), which is added if unknown.
+        """
+        now = time.time() if now is None else now
+        key = _key(token_id)
+        if key is None:
+            return None
+        packed_ip = _pack_ip(ip_address)
+        bucket = self._bucket(key)
+        stripe = bucket % len(self._stripes)
+        with self._stripes[stripe]:
+            offset = self._find(bucket, key, now)
+            if offset is None:
+                if minted is None:
+                    return None
+                offset = self._insert(bucket, stripe, key, token_id, minted[0], minted[1], now)
+            _, created_at, _, count, ip_count, length, context, text, ips = _SLOT.unpack_from(self._memory, offset)
+            stored = _split_ips(ips)
+            new_ip = packed_ip is None or packed_ip not in stored
+            if new_ip:
+                ip_count = min(ip_count + 1, 0xFFFF)
+                if packed_ip is not None and len(stored) < MAX_IPS:
+                    stored.append(packed_ip)
+            if count == 0:
+                self._count(stripe, 0, -1)
+                self._count(stripe, 1, 1)
+            count += 1
+            _SLOT.pack_into(self._memory, offset, key, created_at, now, count, ip_count, length, context, text,
+                            b"".join(stored))
+        return AccessSnapshot(_decode_context(context, length), count, now, new_ip)
+
+    def get(self, token_id):
+        key = _key(token_id)
+        if key is None:
+            return None
+        bucket = self._bucket(key)
+        with self._stripes[bucket % len(self._stripes)]:
+            offset = self._find(bucket, key, time.time())
+            return None if offset is None else _record(_SLOT.unpack_from(self._memory, offset))
+
+    def query(self, context=None, ip=None, created_after=None, created_before=None,
+              accessed_after=None, accessed_before=None, limit=DEFAULT_QUERY_LIMIT):
+        """Tokens matching every given filter, newest first, as ``(matches, truncated)``"""
+        now = time.time()
+        matches = []
+        for bucket in range(self.buckets):
+            with self._stripes[bucket % len(self._stripes)]:
+                slots = [_SLOT.unpack_from(self._memory, self._offset(bucket, way)) for way in range(WAYS)]
+            for slot in slots:
+                if slot[0] == _EMPTY or self._expired(slot[1], slot[3], now):
+                    continue
+                record = _record(slot)
+                if context is not None and record.context != context:
+                    continue
+                if ip is not None and (not record.access_ips or ip not in record.access_ips):
+                    continue
+                if created_after is not None and record.created_at < created_after:
+                    continue
+                if created_before is not None and record.created_at > created_before:
+                    continue
+                if accessed_after is not None or accessed_before is not None:
+                    if record.last_accessed is None:
+                        continue
+                    if accessed_after is not None and record.last_accessed < accessed_after:
+                        continue
+                    if accessed_before is not None and record.last_accessed > accessed_before:
+                        continue
+                matches.append((_token_id(slot), record))
+        matches.sort(key=lambda match: match[1].created_at, reverse=True)
+        return matches[:limit], len(matches) > limit
+
+    def __contains__(self, token_id):
+        return self.get(token_id) is not None
+
+    def __len__(self):
+        stats = self.stats()
+        return stats["fresh"] + stats["accessed"]
+
+    def stats(self):
+        """
+        Counts across all workers; ``fresh`` includes expired tokens not yet
+        replaced, ``evicted`` includes the accessed tokens in ``evicted_accessed``
+        """
+        totals = [0] * 5
+        for stripe in range(len(self._stripes)):
+            for i, value in enumerate(_COUNTERS.unpack_from(self._memory, stripe * _COUNTERS.size)):
+                totals[i] += value
+        return dict(zip(("fresh", "accessed", "expired", "evicted", "evicted_accessed"), totals), spilled=0)
+
+    def _bucket(self, key):
+        return int.from_bytes(key[:8], "little") % self.buckets
+
+    def _offset(self, bucket, way):
+        return self._slots_offset + (bucket * WAYS + way) * _SLOT.size
+
+    def _expired(self, created_at, access_count, now):
+        return access_count == 0 and created_at <= now - self.ttl
+
+    def _find(self, bucket, key, now):
+        """Offset of the live slot holding ``key``, or None; caller holds the stripe"""
+        for way in range(WAYS):
+            offset = self._offset(bucket, way)
+            token, created_at, _, count, _, _ = _HEAD.unpack_from(self._memory, offset)
+            if token == key:
+                return None if self._expired(created_at, count, now) else offset
+        return None
+
+    def _victim(self, bucket, key, now):
+        """
+        ``(offset, replaced)`` of the slot a new token should take, where
+        ``replaced`` is None (free slot), "expired", "fresh" or "accessed";
+        caller holds the stripe
+        """
+        oldest_fresh = oldest_accessed = None
+        for way in range(WAYS):
+            offset = self._offset(bucket, way)
+            token, created_at, last_accessed, count, _, _ = _HEAD.unpack_from(self._memory, offset)
+            if token == _EMPTY:
+                return offset, None
+            if count == 0:
+                if self._expired(created_at, count, now):
+                    return offset, "expired"
+                if oldest_fresh is None or created_at < oldest_fresh[0]:
+                    oldest_fresh = (created_at, offset)
+            elif oldest_accessed is None or last_accessed < oldest_accessed[0]:
+                oldest_accessed = (last_accessed, offset)
+        if oldest_fresh is not None:
+            return oldest_fresh[1], "fresh"
+        return oldest_accessed[1], "accessed"
+
+    def _insert(self, bucket, stripe, key, token_id, context, created_at, now):
+        """Write a never-accessed token into ``bucket``; returns its offset. Caller holds the stripe."""
+        offset, replaced = self._victim(bucket, key, now)
+        if replaced is None:
+            self._count(stripe, 0, 1)
+        elif replaced == "expired":
+            self._count(stripe, 2, 1)
+        elif replaced == "fresh":
+            self._count(stripe, 3, 1)
+        else:
+            # An accessed token made room: one fewer accessed, one more fresh
+            self._count(stripe, 1, -1)
+            self._count(stripe, 0, 1)
+            self._count(stripe, 3, 1)
+            self._count(stripe, 4, 1)
+            evicted = _SLOT.unpack_from(self._memory, offset)
+            logger.warning(f"Honeytoken bucket full of accessed tokens; evicting {_token_id(evicted)} "
+                           f"({evicted[3]} accesses) for {token_id}")
+        encoded = context.encode("utf-8")[:MAX_CONTEXT_BYTES]
+        _SLOT.pack_into(self._memory, offset, key, created_at, 0.0, 0, 0, len(encoded), encoded,
+                        token_id.encode("utf-8"), b"")
+        return offset
+
+    def _count(self, stripe, field, amount):
+        offset = stripe * _COUNTERS.size + field * 8
+        (value,) = struct.unpack_from("<q", self._memory, offset)
+        struct.pack_into("<q", self._memory, offset, value + amount)
+
+
+def _key(token_id):
+    """The 16-byte key of a token id, or None if the id is too long to store"""
+    encoded = token_id.encode("utf-8")
+    if len(encoded) > MAX_ID_BYTES:
+        return None
+    return hashlib.blake2b(encoded, digest_size=16).digest()
+
+
+def _pack_ip(ip_address):
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return None
+    if address.version == 4:
+        address = ipaddress.IPv6Address(b"\0" * 10 + b"\xff\xff" + address.packed)
+    return address.packed
+
+
+def _split_ips(ips):
+    """The packed addresses stored in a slot (unused entries are zero)"""
+    return [ips[i:i + 16] for i in range(0, len(ips), 16) if ips[i:i + 16] != _EMPTY]
+
+
+def _unpack_ip(packed):
+    address = ipaddress.IPv6Address(packed)
+    return str(address.ipv4_mapped or address)
+
+
+def _decode_context(context, length):
+    return context[:length].decode("utf-8", "ignore")
+
+
+def _token_id(slot):
+    return slot[7].rstrip(b"\0").decode("utf-8")
+
+
+def _record(slot):
+    _, created_at, last_accessed, count, _, length, context, _, ips = slot
+    access_ips = {_unpack_ip(packed) for packed in _split_ips(ips)}
+    return TokenRecord(_decode_context(context, length), created_at, count,
+                       last_accessed if count else None, access_ips or None)
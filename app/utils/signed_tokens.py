@@ -0,0 +1,132 @@
+"""
+Stateless, signed honeytokens.
+
+A signed token carries its own record: a format version, the second it was
+issued, a 64-bit random nonce (so two page views never share a token) and
+the context, followed by a truncated MAC of all of it, base64url encoded.
+The context is encrypted with a keystream derived from the key and nonce,
+so decoding a token does not reveal the page it was planted on. The MAC is
+keyed BLAKE2b, which needs one hash pass where HMAC-SHA256 needs two.
+Minting a token is a couple of hashes with nothing stored or logged; a
+token only becomes state when it is accessed and ``verify`` proves it was
+ours. A token is accepted however old it is, since a late access is still
+evidence.
+
+The key comes from HONEYTOKEN_SECRET, or is generated once and kept in
+HONEYTOKEN_SECRET_PATH so tokens handed out before a restart still verify.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import logging
+import os
+import struct
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION = 2
+TAG_BYTES = 12
+NONCE_BYTES = 8
+# Keeps tokens within 154 characters, short enough for every token store
+MAX_CONTEXT_BYTES = 90
+DEFAULT_SECRET_PATH = "honeytoken.key"
+
+# Version and issue time, then the nonce
+_HEADER = struct.Struct(">BI")
+_PREFIX_BYTES = _HEADER.size + NONCE_BYTES
+_MAX_TOKEN_LENGTH = -(-(_PREFIX_BYTES + MAX_CONTEXT_BYTES + TAG_BYTES) * 4 // 3)
+
+
+class TokenSigner:
+    """Mints and verifies self-describing honeytokens under one secret key"""
+
+    def __init__(self, key):
+        if len(key) < 16:
+            raise ValueError("honeytoken key must be at least 16 bytes")
+        # BLAKE2b keys are at most 64 bytes; any secret is condensed to 32
+        self._key = hashlib.blake2b(key, digest_size=32).digest()
+        # A separate key for the context keystream, derived from the MAC key
+        self._context_key = hashlib.blake2b(self._key, digest_size=32, person=b"context").digest()
+
+    def mint(self, context, now=None):
+        """A new token for ``context``; contexts over MAX_CONTEXT_BYTES are truncated"""
+        issued = int(time.time() if now is None else now)
+        prefix = _HEADER.pack(TOKEN_VERSION, issued) + os.urandom(NONCE_BYTES)
+        payload = prefix + self._crypt(prefix, context.encode("utf-8")[:MAX_CONTEXT_BYTES])
+        tag = hashlib.blake2b(payload, key=self._key, digest_size=TAG_BYTES).digest()
+        return base64.urlsafe_b64encode(payload + tag).rstrip(b"=").decode("ascii")
+
+    def verify(self, token):
+        """``(context, issued_at)`` of a token this key minted, else None"""
+        if len(token) > _MAX_TOKEN_LENGTH:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (binascii.Error, ValueError):
+            return None
+        if len(raw) < _PREFIX_BYTES + TAG_BYTES:
+            return None
+        payload, tag = raw[:-TAG_BYTES], raw[-TAG_BYTES:]
+        if not hmac.compare_digest(tag, hashlib.blake2b(payload, key=self._key, digest_size=TAG_BYTES).digest()):
+            return None
+        version, issued = _HEADER.unpack_from(payload)
+        if version != TOKEN_VERSION:
+            return None
+        context = self._crypt(payload[:_PREFIX_BYTES], payload[_PREFIX_BYTES:])
+        # A truncated context can end mid-character
+        return context.decode("utf-8", "ignore"), float(issued)
+
+    def _crypt(self, prefix, data):
+        """XOR ``data`` with a keystream unique to the token's prefix (its own inverse)"""
+        size = len(data)
+        if not size:
+            return data
+        if size <= 64:
+            stream = hashlib.blake2b(prefix, key=self._context_key, digest_size=size).digest()
+        else:
+            # One 64-byte block per counter value; contexts need at most two
+            stream = b"".join(hashlib.blake2b(prefix + bytes((block,)), key=self._context_key,
+                                              digest_size=min(64, size - 64 * block)).digest()
+                              for block in range(-(-size // 64)))
+        return (int.from_bytes(data, "big") ^ int.from_bytes(stream, "big")).to_bytes(size, "big")
+
+
+def load_key(path=DEFAULT_SECRET_PATH):
+    """The key stored at ``path``, creating it (readable by the owner only) on first use"""
+    try:
+        with open(path, "rb") as key_file:
+            return key_file.read()
+    except FileNotFoundError:
+        pass
+    key = os.urandom(32)
+    # Written aside and linked into place, so a concurrent reader never sees a
+    # partial key; the temporary name is unique per thread as well as process
+    fd, temporary = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                     dir=os.path.dirname(path) or ".")
+    with os.fdopen(fd, "wb") as key_file:
+        key_file.write(key)
+    try:
+        os.link(temporary, path)
+        logger.info(f"Generated a new honeytoken key at {path}")
+    except FileExistsError:
+        with open(path, "rb") as key_file:
+            key = key_file.read()
+    finally:
+        os.unlink(temporary)
+    return key
+
+
+def signer_from_env():
+    """A TokenSigner when HONEYTOKEN_MODE=signed, else None (tokens are stored)"""
+    mode = os.environ.get("HONEYTOKEN_MODE", "stored")
+    if mode == "stored":
+        return None
+    if mode != "signed":
+        raise ValueError(f"Unknown honeytoken mode: {mode}")
+    secret = os.environ.get("HONEYTOKEN_SECRET")
+    if secret:
+        return TokenSigner(secret.encode("utf-8"))
+    return TokenSigner(load_key(os.environ.get("HONEYTOKEN_SECRET_PATH", DEFAULT_SECRET_PATH)))
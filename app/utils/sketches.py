@@ -0,0 +1,349 @@
+"""
+Fixed-memory sketches of attacker activity.
+
+A botnet sweep repeats the same few events millions of times. Instead of
+publishing each of them, the decoy keeps probabilistic summaries whose size
+does not grow with the traffic:
+
+- ``HyperLogLog`` estimates distinct IPs per route and per honeytoken
+  (about 1.04 / sqrt(2 ** precision) relative error).
+- ``RotatingBloomFilter`` answers "has this IP already hit this token?".
+  It forgets everything within two generations, so a returning attacker is
+  reported again eventually. A false positive suppresses one alert, but the
+  access is still counted exactly in the token store.
+- ``CountMinSketch`` counts attempts per credential across all IPs. Its
+  estimates can only be too high, never too low.
+
+``AttackSketches`` combines them and decides which exact events are still
+worth publishing: a token access from an IP seen for the first time, and
+after that only when the number of distinct IPs sweeping a token passes a
+power of two, or a credential's attempt count crosses a threshold.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+DEFAULT_BLOOM_CAPACITY = 1000000
+DEFAULT_BLOOM_ERROR_RATE = 0.01
+DEFAULT_BLOOM_WINDOW = 3600.0
+DEFAULT_SWEEP_THRESHOLD = 32
+DEFAULT_HEAVY_HITTER_THRESHOLD = 100
+DEFAULT_MAX_KEYS = 10000
+ROUTE_PRECISION = 12
+TOKEN_PRECISION = 8
+CMS_WIDTH = 1 << 16
+CMS_DEPTH = 4
+MAX_HEAVY_HITTERS = 100
+
+_MASK64 = (1 << 64) - 1
+
+
+def _hash128(item):
+    """Two independent 64-bit hashes of a str or bytes item"""
+    if isinstance(item, str):
+        item = item.encode("utf-8")
+    digest = hashlib.blake2b(item, digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+class HyperLogLog:
+    """Distinct-count estimator in ``2 ** precision`` one-byte registers"""
+
+    __slots__ = ("precision", "registers", "_inverse_sum", "_zeros")
+
+    def __init__(self, precision=ROUTE_PRECISION):
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+        # Kept up to date by add(), so count() does not scan the registers
+        self._inverse_sum = float(len(self.registers))
+        self._zeros = len(self.registers)
+
+    def add(self, item):
+        """Add ``item``; returns True if a register changed (the estimate may have grown)"""
+        value = _hash128(item)[0]
+        index = value >> (64 - self.precision)
+        rest = (value << self.precision) & _MASK64
+        rank = 64 - self.precision + 1 if rest == 0 else 65 - rest.bit_length()
+        old = self.registers[index]
+        if rank <= old:
+            return False
+        self.registers[index] = rank
+        self._inverse_sum += 2.0 ** -rank - 2.0 ** -old
+        if old == 0:
+            self._zeros -= 1
+        return True
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLogs of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        self._inverse_sum = sum(2.0 ** -register for register in self.registers)
+        self._zeros = self.registers.count(0)
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / self._inverse_sum
+        # Linear counting is more accurate while many registers are still empty
+        if estimate <= 2.5 * m and self._zeros:
+            estimate = m * math.log(m / self._zeros)
+        return int(round(estimate))
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives"""
+
+    __slots__ = ("size", "hashes", "bits", "count")
+
+    def __init__(self, capacity, error_rate=DEFAULT_BLOOM_ERROR_RATE):
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray(-(-self.size // 8))
+        self.count = 0
+
+    def _positions(self, item):
+        h1, h2 = _hash128(item)
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item, positions=None):
+        """Add ``item``; returns True if it was (probably) present already"""
+        present = True
+        bits = self.bits
+        for position in positions or self._positions(item):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                present = False
+        if not present:
+            self.count += 1
+        return present
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RotatingBloomFilter:
+    """
+    A Bloom filter that forgets: items go into the current generation, and
+    lookups check the previous one too. The generations rotate when the
+    current one holds ``capacity`` items or is ``window`` seconds old.
+    """
+
+    def __init__(self, capacity=DEFAULT_BLOOM_CAPACITY, error_rate=DEFAULT_BLOOM_ERROR_RATE,
+                 window=DEFAULT_BLOOM_WINDOW):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.window = window
+        self.rotations = 0
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._started = time.monotonic()
+
+    def add(self, item, now=None):
+        """Add ``item``; returns True if it was (probably) seen within the last two generations"""
+        now = time.monotonic() if now is None else now
+        if self._current.count >= self.capacity or now - self._started >= self.window:
+            self._previous, self._current = self._current, BloomFilter(self.capacity, self.error_rate)
+            self._started = now
+            self.rotations += 1
+        positions = self._current._positions(item)
+        seen_before = self._current.add(item, positions)
+        if not seen_before:
+            bits = self._previous.bits
+            seen_before = all(bits[position >> 3] & (1 << (position & 7)) for position in positions)
+        return seen_before
+
+    def __contains__(self, item):
+        return item in self._current or item in self._previous
+
+    def nbytes(self):
+        return len(self._current.bits) + len(self._previous.bits)
+
+
+class CountMinSketch:
+    """Approximate per-item counts in ``depth`` rows of ``width`` counters"""
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.counters = array("I", bytes(4 * width * depth))
+
+    def _cells(self, item):
+        h1, h2 = _hash128(item)
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def add(self, item, count=1):
+        """Count ``item``; returns its new estimate"""
+        counters = self.counters
+        cells = self._cells(item)
+        # Conservative update: raise only the counters below the new minimum
+        estimate = min(counters[cell] for cell in cells) + count
+        for cell in cells:
+            if counters[cell] < estimate:
+                counters[cell] = min(estimate, 0xFFFFFFFF)
+        return estimate
+
+    def estimate(self, item):
+        counters = self.counters
+        return min(counters[cell] for cell in self._cells(item))
+
+    def nbytes(self):
+        return self.counters.itemsize * len(self.counters)
+
+
+class _SweepState:
+    __slots__ = ("ips", "distinct", "reported")
+
+    def __init__(self):
+        self.ips = HyperLogLog(TOKEN_PRECISION)
+        self.distinct = 0
+        self.reported = 0
+
+
+class AttackSketches:
+    """Distinct-IP estimates, repeat suppression and credential heavy hitters"""
+
+    def __init__(self, dedupe=True, bloom_capacity=DEFAULT_BLOOM_CAPACITY,
+                 bloom_error_rate=DEFAULT_BLOOM_ERROR_RATE, bloom_window=DEFAULT_BLOOM_WINDOW,
+                 sweep_threshold=DEFAULT_SWEEP_THRESHOLD, heavy_hitter_threshold=DEFAULT_HEAVY_HITTER_THRESHOLD,
+                 max_keys=DEFAULT_MAX_KEYS):
+        self.dedupe = dedupe
+        self.sweep_threshold = sweep_threshold
+        self.heavy_hitter_threshold = heavy_hitter_threshold
+        self.max_keys = max_keys
+
+        self._all_ips = HyperLogLog(ROUTE_PRECISION)
+        self._routes = OrderedDict()
+        self._tokens = OrderedDict()
+        self._seen = RotatingBloomFilter(bloom_capacity, bloom_error_rate, bloom_window)
+        self._credentials = CountMinSketch()
+        self._heavy_hitters = {}
+        self._lock = threading.Lock()
+
+        self.published = 0
+        self.suppressed = 0
+        self.heavy_hitter_alerts = 0
+
+    def record_request(self, ip, route):
+        """Count ``ip`` towards the distinct IPs of ``route`` and of the whole decoy"""
+        with self._lock:
+            self._all_ips.add(ip)
+            self._lru(self._routes, route, lambda: HyperLogLog(ROUTE_PRECISION)).add(ip)
+
+    def record_token_access(self, token_id, ip):
+        """
+        Returns ``(publish, distinct_ips)``: whether this access should still
+        be published as an exact event, and the estimated number of distinct
+        IPs that accessed ``token_id``
+        """
+        with self._lock:
+            sweep = self._lru(self._tokens, token_id, _SweepState)
+            if sweep.ips.add(ip):
+                sweep.distinct = sweep.ips.count()
+            distinct = sweep.distinct
+            seen_before = self._seen.add(f"{token_id}|{ip}")
+            if not self.dedupe:
+                publish = True
+            elif seen_before:
+                publish = False
+            elif distinct <= self.sweep_threshold:
+                publish = True
+            else:
+                # A sweep: report it again each time it doubles in size
+                level = distinct.bit_length()
+                publish = level > sweep.reported
+            if publish:
+                sweep.reported = max(sweep.reported, distinct.bit_length())
+                self.published += 1
+            else:
+                self.suppressed += 1
+            return publish, distinct
+
+    def record_credential(self, username, password):
+        """
+        Count one attempt of a credential pair; returns its estimated attempt
+        count when that first reaches the heavy-hitter threshold or a higher
+        power of ten times it, else None. Only tracked heavy hitters alert.
+        """
+        with self._lock:
+            credential = f"{username}\0{password}"
+            attempts = self._credentials.add(credential)
+            if attempts < self.heavy_hitter_threshold:
+                return None
+            # Each entry is [attempts, highest level alerted]
+            entry = self._heavy_hitters.get(credential)
+            if entry is None:
+                if len(self._heavy_hitters) >= MAX_HEAVY_HITTERS:
+                    smallest = min(self._heavy_hitters, key=lambda key: self._heavy_hitters[key][0])
+                    if self._heavy_hitters[smallest][0] >= attempts:
+                        return None
+                    del self._heavy_hitters[smallest]
+                entry = self._heavy_hitters[credential] = [attempts, 0]
+            entry[0] = attempts
+            level = self.heavy_hitter_threshold
+            while level * 10 <= attempts:
+                level *= 10
+            # Other credentials sharing its counters can make an estimate skip
+            # past a level, so compare levels rather than exact counts
+            if level <= entry[1]:
+                return None
+            entry[1] = level
+            self.heavy_hitter_alerts += 1
+            return attempts
+
+    def distinct_ips(self):
+        """Estimated distinct IPs overall and per route"""
+        with self._lock:
+            routes = {route: hll.count() for route, hll in self._routes.items()}
+            return self._all_ips.count(), routes
+
+    def heavy_hitters(self, limit=20):
+        """The most attempted credentials as ``(username, password, attempts)``, highest first"""
+        with self._lock:
+            ranked = sorted(((credential, entry[0]) for credential, entry in self._heavy_hitters.items()),
+                            key=lambda item: item[1], reverse=True)[:limit]
+        return [tuple(credential.split("\0", 1)) + (attempts,) for credential, attempts in ranked]
+
+    def _lru(self, table, key, factory):
+        value = table.get(key)
+        if value is None:
+            if len(table) >= self.max_keys:
+                table.popitem(last=False)
+            value = table[key] = factory()
+        else:
+            table.move_to_end(key)
+        return value
+
+    def stats(self):
+        return {"published": self.published, "suppressed": self.suppressed,
+                "heavy_hitter_alerts": self.heavy_hitter_alerts, "bloom_rotations": self._seen.rotations,
+                "tracked_routes": len(self._routes), "tracked_tokens": len(self._tokens)}
+
+    def nbytes(self):
+        """Bytes of sketch state held now; at most ``max_keys`` of each kind of HyperLogLog"""
+        return ((len(self._routes) + 1) * (1 << ROUTE_PRECISION) + len(self._tokens) * (1 << TOKEN_PRECISION)
+                + self._seen.nbytes() + self._credentials.nbytes())
+
+
+def sketches_from_env():
+    """Build the sketches configured by ALERT_DEDUPE and SKETCH_* environment variables"""
+    mode = os.environ.get("ALERT_DEDUPE", "on")
+    if mode not in ("on", "off"):
+        raise ValueError(f"Unknown ALERT_DEDUPE mode: {mode}")
+    return AttackSketches(
+        dedupe=mode == "on",
+        bloom_capacity=int(os.environ.get("SKETCH_BLOOM_CAPACITY", DEFAULT_BLOOM_CAPACITY)),
+        bloom_error_rate=float(os.environ.get("SKETCH_BLOOM_ERROR_RATE", DEFAULT_BLOOM_ERROR_RATE)),
+        bloom_window=float(os.environ.get("SKETCH_BLOOM_WINDOW", DEFAULT_BLOOM_WINDOW)),
+        sweep_threshold=int(os.environ.get("SKETCH_SWEEP_THRESHOLD", DEFAULT_SWEEP_THRESHOLD)),
+        heavy_hitter_threshold=int(os.environ.get("SKETCH_HEAVY_HITTER_THRESHOLD", DEFAULT_HEAVY_HITTER_THRESHOLD)),
+        max_keys=int(os.environ.get("SKETCH_MAX_KEYS", DEFAULT_MAX_KEYS)),
+    )
@@ -0,0 +1,119 @@
+"""
+Startup timing and deferred initialization.
+
+simple_server marks the end of each import-time phase (imports, logging,
+stores, publishers and so on) with ``StartupTimer.mark``, so
+``--measure-startup`` can show where cold start goes. Work that the first
+request does not need is registered with ``defer`` and run by
+``run_deferred`` once the port is bound; today that is only loading the
+generated dataset, as every other phase builds something requests use. The
+event store (a few ms to open SQLite) records the first request's token, and
+the static preload (a few ms, mostly the mimetypes table the first asset
+request would load anyway) versions the stylesheet link on every page, so
+both stay eager. By default the deferred work runs in a background thread
+and the built-in records are served until it finishes. With
+STARTUP_MODE=eager it runs inline before the server accepts connections.
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STARTUP_MODES = ("background", "eager")
+
+
+class StartupTimer:
+    """Elapsed time per startup phase, plus the deferred init tasks"""
+
+    def __init__(self, started=None, mode="background"):
+        if mode not in STARTUP_MODES:
+            raise ValueError(f"Unknown startup mode: {mode}")
+        self.started = time.perf_counter() if started is None else started
+        self.mode = mode
+        self.phases = []
+        self.deferred_phases = []
+        self.failed = 0
+        self.ready_seconds = None
+        self.ready = threading.Event()
+        self._last = self.started
+        self._deferred = []
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def mark(self, phase):
+        """Record the time since the previous mark as ``phase``"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def defer(self, name, function):
+        """Run ``function`` from ``run_deferred`` rather than now"""
+        self._deferred.append((name, function))
+
+    def run_deferred(self, background=None):
+        """
+        Run the deferred tasks once, in a daemon thread unless the mode is
+        eager or ``background`` is False (e.g. before forking, which threads
+        do not survive)
+        """
+        if background is None:
+            background = self.mode == "background"
+        with self._lock:
+            if self._thread is not None or self.ready.is_set():
+                return
+            if background and self._deferred:
+                self._thread = threading.Thread(target=self._run_tasks, name="startup-init", daemon=True)
+                self._thread.start()
+                return
+            self._thread = threading.current_thread()
+        self._run_tasks()
+
+    def wait(self, timeout=None):
+        """Block until the deferred tasks are done; False on timeout"""
+        return self.ready.wait(timeout)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "ready": self.ready.is_set(),
+            "ready_seconds": self.ready_seconds,
+            "failed": self.failed,
+            "phases": dict(self.phases),
+            "deferred": dict(self.deferred_phases),
+        }
+
+    def report(self):
+        """Plain-text breakdown of the phases and deferred tasks, in milliseconds"""
+        lines = [f"{'phase':<24} {'ms':>9}"]
+        lines.extend(f"{phase:<24} {seconds * 1000:>9.1f}" for phase, seconds in self.phases)
+        lines.append(f"{'startup total':<24} {(self._last - self.started) * 1000:>9.1f}")
+        if self.deferred_phases:
+            lines.append(f"deferred ({self.mode})")
+            lines.extend(f"  {name:<22} {seconds * 1000:>9.1f}" for name, seconds in self.deferred_phases)
+        if self.ready_seconds is not None:
+            lines.append(f"{'ready':<24} {self.ready_seconds * 1000:>9.1f}")
+        return "\n".join(lines)
+
+    def _run_tasks(self):
+        for name, function in self._deferred:
+            started = time.perf_counter()
+            try:
+                function()
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Deferred startup task {name} failed: {e}")
+            self.deferred_phases.append((name, time.perf_counter() - started))
+        self.ready_seconds = self.elapsed()
+        self.ready.set()
+        if self._deferred:
+            logger.info(f"Deferred startup tasks finished {self.ready_seconds:.3f}s after start")
+
+
+def startup_from_env(started=None):
+    """Timer whose deferred tasks run as STARTUP_MODE (background or eager) says"""
+    return StartupTimer(started, mode=os.environ.get("STARTUP_MODE", "background"))
@@ -0,0 +1,83 @@
+"""
+Static assets preloaded into memory.
+
+Every file under the static directory is read once at startup into a
+CachedResponse, so it is served with its gzip and deflate variants, ETags
+and a Last-Modified time already computed. Pages link assets through
+``url()``, which appends a short content hash: a request carrying the
+current hash is cacheable for a year, because a changed file gets a new URL.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+
+from .response_cache import CachedResponse
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+STATIC_PREFIX = "/static/"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=3600"
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+class StaticAsset:
+    """One preloaded file and the version string its URLs carry"""
+
+    __slots__ = ("entry", "version")
+
+    def __init__(self, entry, version):
+        self.entry = entry
+        self.version = version
+
+
+class StaticFiles:
+    """In-memory copy of a static directory, keyed by path relative to it"""
+
+    def __init__(self, root=STATIC_DIR, prefix=STATIC_PREFIX, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.prefix = prefix
+        self._assets = {}
+        self.total_bytes = 0
+        self._load(max_bytes)
+
+    def _load(self, max_bytes):
+        for directory, _, files in os.walk(self.root):
+            for filename in sorted(files):
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, "/")
+                size = os.path.getsize(path)
+                if self.total_bytes + size > max_bytes:
+                    logger.warning(f"Static files over {max_bytes} bytes, not preloading {name}")
+                    continue
+                with open(path, "rb") as f:
+                    body = f.read()
+                content_type, _ = mimetypes.guess_type(filename)
+                if content_type is None:
+                    content_type = "application/octet-stream"
+                elif content_type.startswith("text/") or content_type == "application/javascript":
+                    content_type += "; charset=utf-8"
+                version = hashlib.sha1(body).hexdigest()[:10]
+                self._assets[name] = StaticAsset(CachedResponse(body, content_type, os.path.getmtime(path)), version)
+                self.total_bytes += size
+        logger.info(f"Preloaded {len(self._assets)} static files ({self.total_bytes} bytes) from {self.root}")
+
+    def get(self, name):
+        """The StaticAsset for a path relative to the static root, or None"""
+        return self._assets.get(name)
+
+    def url(self, name):
+        """Versioned URL for linking ``name`` from a page"""
+        asset = self._assets.get(name)
+        if asset is None:
+            return self.prefix + name
+        return f"{self.prefix}{name}?v={asset.version}"
+
+    def cache_control(self, asset, version):
+        """Cache-Control for a request that asked for ``version`` of ``asset``"""
+        return IMMUTABLE_CACHE_CONTROL if version == asset.version else DEFAULT_CACHE_CONTROL
+
+    def __len__(self):
+        return len(self._assets)
@@ -0,0 +1,161 @@
+"""
+Tarpit for abusive clients.
+
+Instead of answering a rate-limited client, the server can hand its
+connection to the tarpit, which drips a plausible response out a few bytes
+every ``interval`` seconds until ``duration`` has passed, then hangs up. The
+client's tooling waits the whole time while no request worker is held.
+
+Threaded connections are serviced by one background thread. Every held
+socket is due again exactly ``interval`` after it was last serviced, so a
+FIFO queue is already ordered by due time and acts as a single-slot timer
+wheel: each tick costs one non-blocking send per due connection. The
+asyncio engine drips with ``asyncio.sleep`` on its own loop instead.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 2.0
+DEFAULT_DURATION = 60.0
+DEFAULT_MAX_CONNECTIONS = 5000
+DEFAULT_CHUNK_SIZE = 1
+
+
+class _Held:
+    __slots__ = ("sock", "payload", "offset", "due", "deadline")
+
+    def __init__(self, sock, payload, due, deadline):
+        self.sock = sock
+        self.payload = payload
+        self.offset = 0
+        self.due = due
+        self.deadline = deadline
+
+
+class Tarpit:
+    """Holds connections open and drip-feeds them until they time out"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, duration=DEFAULT_DURATION,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.interval = interval
+        self.duration = duration
+        self.max_connections = max_connections
+        self.chunk_size = chunk_size
+
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._held_async = 0
+
+        self.held = 0
+        self.rejected = 0
+
+    def hold(self, sock, payload):
+        """Take ownership of a connected socket; returns False (and leaves it alone) if full"""
+        now = time.monotonic()
+        with self._lock:
+            if not self._reserve():
+                return False
+            try:
+                sock.setblocking(False)
+            except OSError:
+                return True
+            self._queue.append(_Held(sock, payload, now + self.interval, now + self.duration))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tarpit", daemon=True)
+                self._thread.start()
+        return True
+
+    def reserve(self):
+        """Claim a slot for an asyncio-held connection; pair with ``drip``"""
+        with self._lock:
+            if not self._reserve():
+                return False
+            self._held_async += 1
+            return True
+
+    async def drip(self, writer, payload):
+        """Drip ``payload`` to an asyncio stream writer, then close it (after ``reserve``)"""
+        import asyncio
+
+        deadline = time.monotonic() + self.duration
+        try:
+            for offset in range(0, len(payload), self.chunk_size):
+                await asyncio.sleep(self.interval)
+                if time.monotonic() >= deadline:
+                    break
+                writer.write(payload[offset:offset + self.chunk_size])
+                await asyncio.wait_for(writer.drain(), self.interval)
+        except (ConnectionError, OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            with self._lock:
+                self._held_async -= 1
+            writer.close()
+
+    def _reserve(self):
+        # Caller holds the lock
+        if len(self._queue) + self._held_async >= self.max_connections:
+            self.rejected += 1
+            return False
+        self.held += 1
+        return True
+
+    def __len__(self):
+        return len(self._queue) + self._held_async
+
+    def stats(self):
+        return {"holding": len(self), "held": self.held, "rejected": self.rejected}
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            due = []
+            with self._lock:
+                while self._queue and self._queue[0].due <= now:
+                    due.append(self._queue.popleft())
+                next_due = self._queue[0].due if self._queue else now + self.interval
+
+            keep = []
+            for held in due:
+                if now >= held.deadline or held.offset >= len(held.payload):
+                    _close(held.sock)
+                    continue
+                try:
+                    held.offset += held.sock.send(held.payload[held.offset:held.offset + self.chunk_size])
+                except (BlockingIOError, InterruptedError):
+                    pass
+                except OSError:
+                    _close(held.sock)
+                    continue
+                held.due = now + self.interval
+                keep.append(held)
+
+            if keep:
+                with self._lock:
+                    self._queue.extend(keep)
+                    next_due = self._queue[0].due
+            time.sleep(max(0.0, min(next_due, now + self.interval) - time.monotonic()))
+
+
+def _close(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    sock.close()
+
+
+def tarpit_from_env():
+    """Build a tarpit configured by TARPIT_* environment variables"""
+    return Tarpit(
+        interval=float(os.environ.get("TARPIT_INTERVAL", DEFAULT_INTERVAL)),
+        duration=float(os.environ.get("TARPIT_DURATION", DEFAULT_DURATION)),
+        max_connections=int(os.environ.get("TARPIT_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+    )
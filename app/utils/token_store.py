@@ -0,0 +1,485 @@
+"""
+Bounded in-memory honeytoken store.
+
+Tokens that were never accessed live in an LRU ordered by creation time and
+are dropped once they pass their TTL or the store is over capacity. Tokens
+that were accessed are evidence: they are never expired, and when too many
+of them pile up the earliest accessed are spilled to an append-only JSON
+lines file and reloaded from there if they are hit again. The file is
+re-read on startup, and rewritten without the lines of reloaded tokens once
+those are the majority.
+
+Structural changes (create, expiry, moving a token between the fresh,
+accessed and spilled sets) take the store lock. Recording an access takes
+one of a fixed set of striped per-token locks, so concurrent hits on
+different tokens do not serialize and hits on the same token are never lost.
+Locks are always taken spill lock first, then stripe, then store lock.
+
+Tokens are also indexed by context, by accessing IP, and by creation and
+last-access time (in one-minute buckets), so ``query`` can answer filtered
+lookups from the most selective index instead of scanning every token.
+Spilled tokens stay in the indexes.
+"""
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 100000
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_ACCESSED_CAPACITY = 10000
+DEFAULT_LOCK_STRIPES = 64
+DEFAULT_QUERY_LIMIT = 100
+TIME_BUCKET_SECONDS = 60
+
+
+class TokenRecord:
+    """Compact honeytoken record; ``access_ips`` is only allocated on first access"""
+
+    __slots__ = ("context", "created_at", "access_count", "last_accessed", "access_ips")
+
+    def __init__(self, context, created_at, access_count=0, last_accessed=None, access_ips=None):
+        self.context = context
+        self.created_at = created_at
+        self.access_count = access_count
+        self.last_accessed = last_accessed
+        self.access_ips = access_ips
+
+    @property
+    def accessed(self):
+        return self.access_count > 0
+
+    def to_dict(self):
+        data = {
+            "context": self.context,
+            "created_at": self.created_at,
+            "accessed": self.accessed,
+            "access_count": self.access_count,
+            "access_ips": sorted(self.access_ips) if self.access_ips else [],
+        }
+        if self.last_accessed is not None:
+            data["last_accessed"] = self.last_accessed
+        return data
+
+
+class AccessSnapshot:
+    """Consistent view of a token as of one recorded access"""
+
+    __slots__ = ("context", "access_count", "last_accessed", "new_ip")
+
+    def __init__(self, context, access_count, last_accessed, new_ip):
+        self.context = context
+        self.access_count = access_count
+        self.last_accessed = last_accessed
+        self.new_ip = new_ip
+
+
+class TimeIndex:
+    """Token ids bucketed by timestamp, for newest-first time-range scans"""
+
+    def __init__(self, bucket_seconds=TIME_BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        self._buckets = {}
+        self._keys = []
+
+    def add(self, token_id, timestamp):
+        key = int(timestamp // self.bucket_seconds)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = {}
+            bisect.insort(self._keys, key)
+        bucket[token_id] = None
+
+    def remove(self, token_id, timestamp):
+        key = int(timestamp // self.bucket_seconds)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return
+        bucket.pop(token_id, None)
+        if not bucket:
+            del self._buckets[key]
+            del self._keys[bisect.bisect_left(self._keys, key)]
+
+    def _key_range(self, after, before):
+        low = 0 if after is None else bisect.bisect_left(self._keys, int(after // self.bucket_seconds))
+        high = len(self._keys) if before is None else bisect.bisect_right(
+            self._keys, int(before // self.bucket_seconds))
+        return self._keys[low:high]
+
+    def count(self, after=None, before=None):
+        """Upper bound on the ids in ``[after, before]`` (whole buckets are counted)"""
+        return sum(len(self._buckets[key]) for key in self._key_range(after, before))
+
+    def scan(self, after=None, before=None):
+        """Ids in buckets overlapping ``[after, before]``, newest bucket first"""
+        for key in reversed(self._key_range(after, before)):
+            yield from reversed(self._buckets[key])
+
+
+class HoneytokenStore:
+    """Capacity- and TTL-bounded token store with disk spill for accessed tokens"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, ttl=DEFAULT_TTL,
+                 accessed_capacity=DEFAULT_ACCESSED_CAPACITY, spill_path=None,
+                 lock_stripes=DEFAULT_LOCK_STRIPES):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.accessed_capacity = accessed_capacity
+        self.spill_path = spill_path
+
+        self._fresh = OrderedDict()
+        self._accessed = OrderedDict()
+        self._spilled = {}
+        # Lines in the spill file that no longer hold a spilled token
+        self._spill_dead = 0
+        self._spill_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(lock_stripes)]
+
+        # Secondary indexes (insertion-ordered dicts used as ordered sets)
+        self._by_context = {}
+        self._by_ip = {}
+        self._created = TimeIndex()
+        self._last_accessed = TimeIndex()
+
+        self.expired = 0
+        self.evicted = 0
+
+        if spill_path and os.path.exists(spill_path):
+            self._scan_spill()
+
+    def create(self, token_id, context, now=None):
+        """Add a new, never-accessed token"""
+        now = time.time() if now is None else now
+        # Page-visit contexts repeat constantly; share one string per context
+        record = TokenRecord(sys.intern(context), now)
+        with self._lock:
+            self._fresh[token_id] = record
+            self._by_context.setdefault(record.context, {})[token_id] = None
+            self._created.add(token_id, now)
+            self._expire(now)
+            while len(self._fresh) > self.capacity:
+                self._unindex(*self._fresh.popitem(last=False))
+                self.evicted += 1
+        return record
+
+    def record_access(self, token_id, ip_address, now=None, minted=None):
+        """
+        Count an access to ``token_id``; returns an AccessSnapshot, or None if
+        unknown. ``minted`` is the ``(context, created_at)`` of a verified
+        stateless token (see utils.signed_tokens), which is added if unknown.
+        """
+        now = time.time() if now is None else now
+        with self._stripe(token_id):
+            record = self._accessed.get(token_id)
+            if record is None:
+                with self._lock:
+                    record = self._fresh.pop(token_id, None)
+                    if record is None:
+                        record = self._load_spilled(token_id)
+                    if record is None:
+                        if minted is None:
+                            return None
+                        record = TokenRecord(sys.intern(minted[0]), minted[1])
+                        self._by_context.setdefault(record.context, {})[token_id] = None
+                        self._created.add(token_id, record.created_at)
+                    self._accessed[token_id] = record
+
+            previous_access = record.last_accessed
+            record.access_count += 1
+            record.last_accessed = now
+            if record.access_ips is None:
+                record.access_ips = set()
+            new_ip = ip_address not in record.access_ips
+            if new_ip:
+                record.access_ips.add(ip_address)
+            snapshot = AccessSnapshot(record.context, record.access_count, now, new_ip)
+
+            # Only take the store lock when an index actually changes
+            moved = previous_access is None or int(previous_access // TIME_BUCKET_SECONDS) != int(
+                now // TIME_BUCKET_SECONDS)
+            if new_ip or moved:
+                with self._lock:
+                    if new_ip:
+                        self._by_ip.setdefault(ip_address, {})[token_id] = None
+                    if moved:
+                        if previous_access is not None:
+                            self._last_accessed.remove(token_id, previous_access)
+                        self._last_accessed.add(token_id, now)
+
+        if len(self._accessed) > self.accessed_capacity:
+            self._spill_overflow()
+        elif self._spill_dead > len(self._spilled):
+            with self._spill_lock:
+                self._compact_spill()
+        return snapshot
+
+    def get(self, token_id):
+        with self._lock:
+            record = self._fresh.get(token_id) or self._accessed.get(token_id)
+            if record is None and token_id in self._spilled:
+                record = self._read_spilled(self._spilled[token_id])
+            return record
+
+    def query(self, context=None, ip=None, created_after=None, created_before=None,
+              accessed_after=None, accessed_before=None, limit=DEFAULT_QUERY_LIMIT):
+        """
+        Tokens matching every given filter, newest first.
+
+        Returns ``(matches, truncated)`` where ``matches`` is a list of
+        ``(token_id, TokenRecord)`` and ``truncated`` says more than ``limit``
+        tokens matched. Times are epoch seconds; ranges are inclusive.
+        """
+        def wanted(record):
+            if context is not None and record.context != context:
+                return False
+            if ip is not None and (not record.access_ips or ip not in record.access_ips):
+                return False
+            if created_after is not None and record.created_at < created_after:
+                return False
+            if created_before is not None and record.created_at > created_before:
+                return False
+            if accessed_after is not None or accessed_before is not None:
+                if record.last_accessed is None:
+                    return False
+                if accessed_after is not None and record.last_accessed < accessed_after:
+                    return False
+                if accessed_before is not None and record.last_accessed > accessed_before:
+                    return False
+            return True
+
+        matches = []
+        with self._lock:
+            candidates = self._candidates(context, ip, created_after, created_before,
+                                          accessed_after, accessed_before)
+            for token_id in candidates:
+                record = self._fresh.get(token_id) or self._accessed.get(token_id)
+                if record is None and token_id in self._spilled:
+                    record = self._read_spilled(self._spilled[token_id])
+                if record is None or not wanted(record):
+                    continue
+                if len(matches) == limit:
+                    return matches, True
+                matches.append((token_id, record))
+        return matches, False
+
+    def _candidates(self, context, ip, created_after, created_before, accessed_after, accessed_before):
+        """Newest-first ids from the smallest index that covers a filter; caller holds the lock"""
+        options = []
+        if ip is not None:
+            by_ip = self._by_ip.get(ip, {})
+            options.append((len(by_ip), reversed(by_ip)))
+        if context is not None:
+            by_context = self._by_context.get(context, {})
+            options.append((len(by_context), reversed(by_context)))
+        if created_after is not None or created_before is not None:
+            options.append((self._created.count(created_after, created_before),
+                            self._created.scan(created_after, created_before)))
+        if accessed_after is not None or accessed_before is not None:
+            options.append((self._last_accessed.count(accessed_after, accessed_before),
+                            self._last_accessed.scan(accessed_after, accessed_before)))
+        if not options:
+            return self._created.scan()
+        return min(options, key=lambda option: option[0])[1]
+
+    def __contains__(self, token_id):
+        return token_id in self._fresh or token_id in self._accessed or token_id in self._spilled
+
+    def __len__(self):
+        return len(self._fresh) + len(self._accessed)
+
+    def stats(self):
+        return {
+            "fresh": len(self._fresh),
+            "accessed": len(self._accessed),
+            "spilled": len(self._spilled),
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+    def _expire(self, now):
+        # _fresh is in creation order, so expired tokens sit at the front
+        cutoff = now - self.ttl
+        fresh = self._fresh
+        while fresh:
+            token_id = next(iter(fresh))
+            record = fresh[token_id]
+            if record.created_at > cutoff:
+                break
+            del fresh[token_id]
+            self._unindex(token_id, record)
+            self.expired += 1
+
+    def _unindex(self, token_id, record):
+        """Drop a never-accessed token from the indexes; caller holds the lock"""
+        by_context = self._by_context.get(record.context)
+        if by_context is not None:
+            by_context.pop(token_id, None)
+            if not by_context:
+                del self._by_context[record.context]
+        self._created.remove(token_id, record.created_at)
+
+    def _stripe(self, token_id):
+        return self._stripes[hash(token_id) % len(self._stripes)]
+
+    def _spill_overflow(self):
+        if not self.spill_path:
+            return
+
+        with self._spill_lock:
+            try:
+                with open(self.spill_path, "a", encoding="utf-8") as spill_file:
+                    while len(self._accessed) > self.accessed_capacity:
+                        with self._lock:
+                            if not self._accessed:
+                                break
+                            token_id = next(iter(self._accessed))
+                        # Hold the token's stripe so no access is counted mid-spill
+                        with self._stripe(token_id), self._lock:
+                            record = self._accessed.pop(token_id, None)
+                            if record is None:
+                                continue
+                            offset = spill_file.seek(0, os.SEEK_END)
+                            spill_file.write(json.dumps(dict(record.to_dict(), token_id=token_id)) + "\n")
+                            spill_file.flush()
+                            self._spilled[token_id] = offset
+            except OSError as e:
+                logger.error(f"Failed to spill accessed honeytokens to {self.spill_path}: {e}")
+            self._compact_spill()
+
+    def _compact_spill(self):
+        """Rewrite the spill file without dead lines once they are the majority; caller holds the spill lock"""
+        with self._lock:
+            if self._spill_dead <= len(self._spilled):
+                return
+            temporary = self.spill_path + ".tmp"
+            offsets = {}
+            try:
+                with open(self.spill_path, "rb") as old, open(temporary, "wb") as new:
+                    for token_id, offset in sorted(self._spilled.items(), key=lambda item: item[1]):
+                        old.seek(offset)
+                        offsets[token_id] = new.tell()
+                        new.write(old.readline())
+                os.replace(temporary, self.spill_path)
+            except OSError as e:
+                logger.error(f"Failed to compact honeytoken spill file {self.spill_path}: {e}")
+                return
+            logger.info(f"Compacted {self.spill_path}: dropped {self._spill_dead} lines, kept {len(offsets)}")
+            self._spilled = offsets
+            self._spill_dead = 0
+
+    def _scan_spill(self):
+        """Rebuild the spilled set and its index entries from an existing spill file"""
+        latest = {}
+        lines = 0
+        try:
+            with open(self.spill_path, "r+b") as spill_file:
+                offset = 0
+                for line in spill_file:
+                    if not line.endswith(b"\n"):
+                        # Torn by a crash mid-write; later appends must start a new line
+                        spill_file.truncate(offset)
+                        break
+                    lines += 1
+                    try:
+                        data = json.loads(line)
+                        # A token spilled, reloaded and spilled again: the last line wins
+                        latest[data["token_id"]] = (offset, sys.intern(data["context"]), data["created_at"],
+                                                    data["access_ips"], data.get("last_accessed"))
+                    except (ValueError, KeyError, TypeError):
+                        pass
+                    offset += len(line)
+        except OSError as e:
+            logger.error(f"Failed to read honeytoken spill file {self.spill_path}: {e}")
+            return
+
+        for token_id, (offset, context, created_at, access_ips, last_accessed) in latest.items():
+            self._spilled[token_id] = offset
+            self._by_context.setdefault(context, {})[token_id] = None
+            self._created.add(token_id, created_at)
+            for ip_address in access_ips:
+                self._by_ip.setdefault(ip_address, {})[token_id] = None
+            if last_accessed is not None:
+                self._last_accessed.add(token_id, last_accessed)
+        self._spill_dead = lines - len(latest)
+        logger.info(f"Loaded {len(latest)} spilled honeytokens from {self.spill_path}")
+        with self._spill_lock:
+            self._compact_spill()
+
+    def _load_spilled(self, token_id):
+        offset = self._spilled.pop(token_id, None)
+        if offset is None:
+            return None
+        self._spill_dead += 1
+        return self._read_spilled(offset)
+
+    def _read_spilled(self, offset):
+        try:
+            with open(self.spill_path, "r", encoding="utf-8") as spill_file:
+                spill_file.seek(offset)
+                data = json.loads(spill_file.readline())
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read spilled honeytoken at offset {offset}: {e}")
+            return None
+        return TokenRecord(data["context"], data["created_at"], data["access_count"],
+                           data.get("last_accessed"), set(data["access_ips"]))
+
+
+def store_from_env(processes=1):
+    """
+    Build the store selected by HONEYTOKEN_BACKEND, configured by HONEYTOKEN_* variables
+
+    ``memory`` is this module's store, ``shared`` the shared-memory store of
+    utils.shared_tokens and ``redis`` the Redis store of
+    utils.honeytoken_manager. ``auto`` (the default) keeps tokens in memory
+    for a single process; ``processes`` pre-forked workers must share them,
+    through Redis if it answers, else through shared memory.
+    """
+    backend = os.environ.get("HONEYTOKEN_BACKEND", "auto")
+    capacity = int(os.environ.get("HONEYTOKEN_CAPACITY", DEFAULT_CAPACITY))
+    ttl = float(os.environ.get("HONEYTOKEN_TTL", DEFAULT_TTL))
+    if backend == "auto":
+        backend = "memory" if processes <= 1 else "redis" if _redis_reachable() else "shared"
+
+    if backend == "memory":
+        if processes > 1:
+            logger.warning(f"Honeytokens are kept per process; a token minted by one of the {processes} "
+                           f"workers will not be recognised by the others")
+        return HoneytokenStore(
+            capacity=capacity,
+            ttl=ttl,
+            accessed_capacity=int(os.environ.get("HONEYTOKEN_ACCESSED_CAPACITY", DEFAULT_ACCESSED_CAPACITY)),
+            spill_path=os.environ.get("HONEYTOKEN_SPILL_PATH", "honeytokens_accessed.jsonl"),
+        )
+    if backend == "shared":
+        from .shared_tokens import SharedTokenStore
+        return SharedTokenStore(capacity=capacity, ttl=ttl)
+    if backend == "redis":
+        from .honeytoken_manager import RedisTokenStore
+        # Holds tokens not yet written to Redis, and everything while Redis is down
+        if processes > 1:
+            from .shared_tokens import SharedTokenStore
+            local = SharedTokenStore(capacity=capacity, ttl=ttl)
+        else:
+            local = HoneytokenStore(capacity=capacity, ttl=ttl)
+        return RedisTokenStore(ttl=ttl, local=local)
+    raise ValueError(f"Unknown honeytoken backend: {backend}")
+
+
+def _redis_reachable():
+    from .redis_pool import get_redis_client, reset_redis_client
+
+    try:
+        return bool(get_redis_client().ping())
+    except Exception as e:
+        logger.info(f"Redis unavailable for honeytokens ({e}), using shared memory")
+        return False
+    finally:
+        # Connections must not be shared with forked workers
+        reset_redis_client()
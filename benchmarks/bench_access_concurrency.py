@@ -0,0 +1,127 @@
+"""
+Concurrency stress check for honeytoken access recording.
+
+Fires thousands of concurrent accesses at a handful of tokens and verifies
+that every access was counted and every distinct IP recorded, against the
+in-memory ``HoneytokenStore`` and, with ``--backend redis``, the Redis
+backend in ``utils.honeytoken_manager`` at REDIS_HOST (the ``redis`` package
+is only imported then). Exits non-zero on any mismatch:
+
+    python benchmarks/bench_access_concurrency.py --threads 64 --accesses 2000
+    python benchmarks/bench_access_concurrency.py --backend memory --backend redis
+
+``tests/test_token_store_concurrency.py`` runs a smaller version of the
+in-memory check with pytest.
+"""
+import argparse
+import logging
+import sys
+import threading
+import time
+import uuid
+
+from common import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+from utils.token_store import HoneytokenStore
+
+
+def hammer(record, token_ids, threads, accesses, ips):
+    """Run ``record(token_id, ip)`` from many threads at once"""
+    barrier = threading.Barrier(threads)
+
+    def worker(worker_id):
+        barrier.wait()
+        for i in range(accesses):
+            record(token_ids[i % len(token_ids)], ips[(worker_id + i) % len(ips)])
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def expected_counts(token_ids, threads, accesses):
+    counts = dict.fromkeys(token_ids, 0)
+    for i in range(accesses):
+        counts[token_ids[i % len(token_ids)]] += threads
+    return counts
+
+
+def check(name, actual, expected, ip_sets, ip_count, elapsed, total):
+    failures = [t for t in expected if actual[t] != expected[t]]
+    failures += [t for t in expected if ip_sets[t] > ip_count]
+    status = "OK" if not failures else f"FAILED ({len(failures)} tokens wrong)"
+    print(f"{name:<10} {total:>9} accesses {total / elapsed:>10.0f}/s  {status}")
+    for token_id in failures[:5]:
+        print(f"  {token_id}: expected {expected[token_id]}, got {actual[token_id]}")
+    return not failures
+
+
+def run_memory(args, ips):
+    store = HoneytokenStore(spill_path=None)
+    token_ids = [str(uuid.uuid4()) for _ in range(args.tokens)]
+    for token_id in token_ids:
+        store.create(token_id, "stress")
+
+    elapsed = hammer(store.record_access, token_ids, args.threads, args.accesses, ips)
+    actual = {t: store.get(t).access_count for t in token_ids}
+    ip_sets = {t: len(store.get(t).access_ips) for t in token_ids}
+    return check("memory", actual, expected_counts(token_ids, args.threads, args.accesses),
+                 ip_sets, len(ips), elapsed, args.threads * args.accesses)
+
+
+def run_redis(args, ips):
+    from utils import honeytoken_manager
+    from utils.redis_pool import get_redis_client
+
+    redis_client = get_redis_client()
+    try:
+        redis_client.ping()
+    except Exception as e:
+        print(f"redis      skipped ({e})")
+        return True
+
+    token_ids = [honeytoken_manager.generate_honeytoken("stress") for _ in range(args.tokens)]
+    publish = redis_client.publish
+    redis_client.publish = lambda *a, **k: None
+    try:
+        elapsed = hammer(honeytoken_manager.check_honeytoken_access, token_ids,
+                         args.threads, args.accesses, ips)
+    finally:
+        redis_client.publish = publish
+
+    tokens = {t: honeytoken_manager.get_honeytoken(t) for t in token_ids}
+    actual = {t: tokens[t]["access_count"] for t in token_ids}
+    ip_sets = {t: len(tokens[t]["access_ips"]) for t in token_ids}
+    for token_id in token_ids:
+        redis_client.delete(f"honeytoken:{token_id}", f"honeytoken:{token_id}:ips")
+    return check("redis", actual, expected_counts(token_ids, args.threads, args.accesses),
+                 ip_sets, len(ips), elapsed, args.threads * args.accesses)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--accesses", type=int, default=2000, help="accesses per thread")
+    parser.add_argument("--tokens", type=int, default=8)
+    parser.add_argument("--ips", type=int, default=100)
+    parser.add_argument("--backend", action="append", choices=("memory", "redis"),
+                        help="store to check, repeatable (default: memory)")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    # Switch threads far more often than usual to shake out races
+    sys.setswitchinterval(1e-6)
+    ips = [f"10.1.{i // 256}.{i % 256}" for i in range(args.ips)]
+
+    runs = {"memory": run_memory, "redis": run_redis}
+    ok = True
+    for backend in args.backend or ["memory"]:
+        ok = runs[backend](args, ips) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Bytes sent and CPU per request for the patient API.
+
+Runs requests through ``HealthcareHandler`` in-process (no sockets) and
+compares the old per-request ``json.dumps`` handler with the cached
+response in identity, gzip, deflate and 304 Not Modified form:
+
+    python benchmarks/bench_api_cache.py --requests 5000
+"""
+import argparse
+import json
+import logging
+import time
+
+from common import buffered_request
+
+
+def request(path, headers=()):
+    lines = [f"GET {path} HTTP/1.1", "Host: localhost"] + [f"{k}: {v}" for k, v in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+def measure(handler_class, raw, requests):
+    response = buffered_request(handler_class, raw)
+    started = time.process_time()
+    for _ in range(requests):
+        buffered_request(handler_class, raw)
+    cpu = (time.process_time() - started) / requests
+    status = response.split(b" ", 2)[1].decode()
+    return status, len(response), cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--path", default="/api/patients")
+    parser.add_argument("--patients", type=int, default=500,
+                        help="pad PATIENTS to this many records (copies of the built-in ones)")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    import simple_server
+    from simple_server import HealthcareHandler, PATIENTS
+
+    seed = list(PATIENTS.values())
+    for i in range(len(PATIENTS), args.patients):
+        record = dict(seed[i % len(seed)], id=f"PB{i:06d}")
+        PATIENTS[record["id"]] = record
+    simple_server.notify_data_changed()
+
+    def legacy_api_patients(self):
+        self.send_body(200, json.dumps(list(PATIENTS.values())).encode(), 'application/json')
+
+    simple_server.ROUTES.add("GET", "/bench/legacy", legacy_api_patients)
+
+    plain = measure(HealthcareHandler, request("/bench/legacy"), args.requests)
+    identity = measure(HealthcareHandler, request(args.path), args.requests)
+    gzipped = measure(HealthcareHandler, request(args.path, [("Accept-Encoding", "gzip")]), args.requests)
+    deflated = measure(HealthcareHandler, request(args.path, [("Accept-Encoding", "deflate")]), args.requests)
+    response = buffered_request(HealthcareHandler, request(args.path, [("Accept-Encoding", "gzip")]))
+    etag = next(line.split(b":", 1)[1].strip().decode() for line in response.split(b"\r\n")
+                if line.lower().startswith(b"etag:"))
+    revalidated = measure(HealthcareHandler, request(args.path, [("Accept-Encoding", "gzip"),
+                                                                 ("If-None-Match", etag)]), args.requests)
+
+    print(f"{'variant':<24} {'status':>6} {'bytes sent':>11} {'CPU us/req':>11}")
+    for name, (status, sent, cpu) in [("json.dumps per request", plain), ("cached identity", identity),
+                                      ("cached gzip", gzipped), ("cached deflate", deflated),
+                                      ("If-None-Match (304)", revalidated)]:
+        print(f"{name:<24} {status:>6} {sent:>11} {cpu * 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
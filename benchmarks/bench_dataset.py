@@ -0,0 +1,126 @@
+"""
+Generation and memory benchmark for the synthetic decoy dataset.
+
+For each scale, generates and saves a dataset in a fresh process (time and
+peak RSS), then memory-maps it in another fresh process and times indexed
+lookups by patient, doctor and date, reporting the Python heap and RSS the
+loaded dataset costs the server:
+
+    python benchmarks/bench_dataset.py --scales 100000 1000000 10000000
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from common import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+
+LOOKUPS = 10000
+
+
+def rss_mib():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def child_generate(patients, seed, directory):
+    from utils.dataset import generate
+
+    started = time.perf_counter()
+    dataset = generate(patients, seed)
+    generated = time.perf_counter() - started
+    dataset.save(directory)
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    return {
+        "generate_s": generated,
+        "save_s": time.perf_counter() - started - generated,
+        "disk_mib": size / 2**20,
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "appointments": dataset.meta["appointments"],
+        "prescriptions": dataset.meta["prescriptions"],
+    }
+
+
+def child_load(patients, directory):
+    from utils.dataset import DOCTORS, ColumnarDataset
+
+    baseline_rss = rss_mib()
+    tracemalloc.start()
+    started = time.perf_counter()
+    dataset = ColumnarDataset.load(directory)
+    load_s = time.perf_counter() - started
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    rng = random.Random(1)
+    ids = [f"P{10000000 + rng.randrange(patients)}" for _ in range(LOOKUPS)]
+    dates = [f"2023-{rng.randint(3, 12):02d}-{rng.randint(1, 28):02d}" for _ in range(LOOKUPS)]
+    doctors = [rng.choice(DOCTORS) for _ in range(LOOKUPS)]
+
+    timings = {}
+    for name, lookup, keys in (
+        ("patient", lambda key: dataset.patients[key], ids),
+        ("appointments_for_patient", dataset.appointments_for_patient, ids),
+        ("appointments_on(limit=50)", lambda key: dataset.appointments_on(key, limit=50), dates),
+        ("appointments_for_doctor(limit=50)", lambda key: dataset.appointments_for_doctor(key, limit=50), doctors),
+    ):
+        started = time.perf_counter()
+        for key in keys:
+            lookup(key)
+        timings[name] = (time.perf_counter() - started) / len(keys) * 1e6
+
+    return {"load_ms": load_s * 1000, "heap_kib": heap / 1024,
+            "rss_after_lookups_mib": rss_mib() - baseline_rss, "lookup_us": timings}
+
+
+def run_child(seed, *args):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--seed", str(seed),
+                             "--child", *map(str, args)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--seed", type=int, default=1337)
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        command, patients, directory = args.child[0], int(args.child[1]), args.child[2]
+        result = child_generate(patients, args.seed, directory) if command == "generate" \
+            else child_load(patients, directory)
+        print(json.dumps(result))
+        return
+
+    for patients in args.scales:
+        directory = tempfile.mkdtemp(prefix="decoy-dataset-")
+        try:
+            generated = run_child(args.seed, "generate", patients, directory)
+            loaded = run_child(args.seed, "load", patients, directory)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        print(f"{patients} patients ({generated['appointments']} appointments, "
+              f"{generated['prescriptions']} prescriptions)")
+        print(f"  generate {generated['generate_s']:.1f}s, save {generated['save_s']:.2f}s, "
+              f"peak RSS {generated['peak_rss_mib']:.0f} MiB, on disk {generated['disk_mib']:.1f} MiB")
+        print(f"  load {loaded['load_ms']:.1f} ms, heap {loaded['heap_kib']:.0f} KiB, "
+              f"RSS after {LOOKUPS} random lookups +{loaded['rss_after_lookups_mib']:.1f} MiB")
+        for name, micros in loaded["lookup_us"].items():
+            print(f"  {name:<36} {micros:>8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Sustained write throughput and commit (fsync) cost of the SQLite event store.
+
+For each synchronous mode and batch size, writes ``--events`` attacker-shaped
+events through ``EventStore.record`` into a fresh database. It reports
+events/sec from the first record to the last commit, and the mean and worst
+time per batch commit. With ``FULL`` every commit is fsynced. With
+``NORMAL``, the default, only WAL checkpoints are. Indexed query latency
+on the last database is reported as well:
+
+    python benchmarks/bench_event_store.py --events 100000 --batch-sizes 1 50 500
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from common import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+from utils.event_store import EventStore
+
+
+def events(count):
+    for i in range(count):
+        ip = f"10.2.{(i // 256) % 256}.{i % 256}"
+        if i % 3 == 0:
+            yield {"event_type": "honeytoken_access", "token_id": f"token-{i % 5000}", "ip_address": ip,
+                   "context": "page_visit:/patients", "access_count": 1}
+        else:
+            yield {"event_type": "login_attempt", "username": "admin", "password": f"guess{i}",
+                   "ip_address": ip, "success": False}
+
+
+def run(path, count, batch_size, synchronous):
+    store = EventStore(path, batch_size=batch_size, queue_size=count + 1, synchronous=synchronous)
+    started = time.perf_counter()
+    for event in events(count):
+        store.record(event)
+    store.flush(timeout=3600)
+    elapsed = time.perf_counter() - started
+    return store, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--modes", nargs="+", choices=["NORMAL", "FULL"], default=["NORMAL", "FULL"])
+    parser.add_argument("--dir", help="directory for the databases (defaults to a temporary one)")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as workdir:
+        print(f"{'sync':<7} {'batch':>6} {'events/s':>10} {'avg commit ms':>14} {'max commit ms':>14}")
+        store = None
+        for synchronous in args.modes:
+            for batch_size in args.batch_sizes:
+                path = os.path.join(workdir, f"events-{synchronous}-{batch_size}.db")
+                # A batch size of 1 with fsync is slow; keep that run short
+                count = args.events if batch_size > 1 else min(args.events, 5000)
+                store, elapsed = run(path, count, batch_size, synchronous)
+                stats = store.stats()
+                print(f"{synchronous:<7} {batch_size:>6} {count / elapsed:>10.0f} "
+                      f"{stats['avg_commit_seconds'] * 1000:>14.2f} {stats['max_commit_seconds'] * 1000:>14.2f}")
+                store.stop()
+
+        if store is not None:
+            for label, filters in (("by ip", {"ip": "10.2.0.7"}), ("by token", {"token_id": "token-42"}),
+                                   ("by type, last hour", {"event_type": "honeytoken_access",
+                                                           "after": time.time() - 3600})):
+                started = time.perf_counter()
+                found, _ = store.query(limit=100, **filters)
+                print(f"query {label}: {len(found)} events in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
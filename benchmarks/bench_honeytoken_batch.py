@@ -0,0 +1,83 @@
+"""
+Batch vs one-at-a-time honeytoken writes against a live Redis.
+
+Creates ``--tokens`` tokens with ``generate_honeytoken`` and with
+``generate_honeytokens``, then records ``--accesses`` accesses with
+``check_honeytoken_access`` and with ``record_accesses``, and reports
+operations per second for each. Uses REDIS_HOST/REDIS_PORT/REDIS_DB and
+deletes the keys it creates:
+
+    REDIS_HOST=localhost REDIS_PORT=6380 python benchmarks/bench_honeytoken_batch.py
+"""
+import argparse
+import logging
+import sys
+import time
+
+from common import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+from utils import honeytoken_manager
+from utils.redis_pool import get_redis_client
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def cleanup(redis_client, token_ids, ips, contexts):
+    pipe = redis_client.pipeline(transaction=False)
+    for token_id in token_ids:
+        pipe.delete(honeytoken_manager.TOKEN_KEY.format(token_id), honeytoken_manager.IPS_KEY.format(token_id))
+        pipe.zrem(honeytoken_manager.CREATED_INDEX_KEY, token_id)
+        pipe.zrem(honeytoken_manager.ACCESSED_INDEX_KEY, token_id)
+    for ip_address in ips:
+        pipe.delete(honeytoken_manager.IP_INDEX_KEY.format(ip_address))
+    for context in contexts:
+        pipe.delete(honeytoken_manager.CONTEXT_INDEX_KEY.format(context))
+    pipe.execute()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--accesses", type=int, default=20000)
+    parser.add_argument("--ips", type=int, default=50, help="distinct attacker IPs")
+    parser.add_argument("--batch-size", type=int, default=honeytoken_manager.WRITE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    redis_client = get_redis_client()
+    try:
+        redis_client.ping()
+    except Exception as e:
+        sys.exit(f"Redis is not reachable: {e}")
+
+    contexts = [f"bench_batch:{i % 20}" for i in range(args.tokens)]
+    ips = [f"10.1.{i // 256}.{i % 256}" for i in range(args.ips)]
+
+    single_ids, single_create = timed(lambda: [honeytoken_manager.generate_honeytoken(c) for c in contexts])
+    batch_ids, batch_create = timed(honeytoken_manager.generate_honeytokens, contexts, None, args.batch_size)
+
+    events = [(batch_ids[i % len(batch_ids)], ips[i % len(ips)]) for i in range(args.accesses)]
+    # Silence the per-access alert on the one-at-a-time path, and skip it on the batch path
+    publish = redis_client.publish
+    redis_client.publish = lambda *a, **k: None
+    try:
+        _, single_access = timed(lambda: [honeytoken_manager.check_honeytoken_access(*e) for e in events])
+    finally:
+        redis_client.publish = publish
+    snapshots, batch_access = timed(honeytoken_manager.record_accesses, events, False, args.batch_size)
+    assert all(snapshot is not None for snapshot in snapshots)
+
+    cleanup(redis_client, single_ids + batch_ids, ips, set(contexts))
+
+    print(f"{'operation':<10} {'one at a time/s':>16} {'batched/s':>12} {'speedup':>8}")
+    print(f"{'create':<10} {args.tokens / single_create:>16.0f} {args.tokens / batch_create:>12.0f} "
+          f"{single_create / batch_create:>7.1f}x")
+    print(f"{'access':<10} {args.accesses / single_access:>16.0f} {args.accesses / batch_access:>12.0f} "
+          f"{single_access / batch_access:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
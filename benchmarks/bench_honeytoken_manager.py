@@ -0,0 +1,85 @@
+"""
+Access throughput of ``utils.honeytoken_manager`` against a live Redis.
+
+Compares the legacy layout (GET, eval, SET of a str(dict)) with the hash
+layout's single MULTI round trip. Uses REDIS_HOST/REDIS_PORT/REDIS_DB and
+deletes the keys it creates:
+
+    REDIS_HOST=localhost REDIS_PORT=6380 python benchmarks/bench_honeytoken_manager.py
+"""
+import argparse
+import logging
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from common import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+from utils import honeytoken_manager
+from utils.redis_pool import get_redis_client
+
+
+def legacy_access(redis_client, token_id, ip_address):
+    """The pre-hash implementation, kept here only as a baseline"""
+    token_key = f"honeytoken:{token_id}"
+    token_data = eval(redis_client.get(token_key).decode('utf-8'))
+    token_data["accessed"] = True
+    token_data["access_count"] += 1
+    token_data["last_accessed"] = datetime.now().isoformat()
+    if ip_address not in token_data["access_ips"]:
+        token_data["access_ips"].append(ip_address)
+    redis_client.set(token_key, str(token_data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accesses", type=int, default=5000)
+    parser.add_argument("--ips", type=int, default=50, help="distinct attacker IPs per token")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    redis_client = get_redis_client()
+    try:
+        redis_client.ping()
+    except Exception as e:
+        sys.exit(f"Redis is not reachable: {e}")
+
+    ips = [f"10.0.{i // 256}.{i % 256}" for i in range(args.ips)]
+
+    legacy_id = str(uuid.uuid4())
+    redis_client.set(f"honeytoken:{legacy_id}", str({
+        "context": "bench", "created_at": datetime.now().isoformat(),
+        "accessed": False, "access_count": 0, "access_ips": []}))
+    started = time.perf_counter()
+    for i in range(args.accesses):
+        legacy_access(redis_client, legacy_id, ips[i % len(ips)])
+    legacy_rate = args.accesses / (time.perf_counter() - started)
+
+    token_id = honeytoken_manager.generate_honeytoken("bench")
+    # Silence the per-access alert so both paths do the same work
+    publish = redis_client.publish
+    redis_client.publish = lambda *a, **k: None
+    try:
+        started = time.perf_counter()
+        for i in range(args.accesses):
+            honeytoken_manager.check_honeytoken_access(token_id, ips[i % len(ips)])
+        hash_rate = args.accesses / (time.perf_counter() - started)
+    finally:
+        redis_client.publish = publish
+
+    migrated_id = str(uuid.uuid4())
+    redis_client.set(f"honeytoken:{migrated_id}", redis_client.get(f"honeytoken:{legacy_id}"))
+    honeytoken_manager.migrate_token(migrated_id)
+    assert honeytoken_manager.get_honeytoken(migrated_id)["access_count"] == args.accesses
+    assert honeytoken_manager.get_honeytoken(token_id)["access_count"] == args.accesses
+
+    for tid in (legacy_id, token_id, migrated_id):
+        redis_client.delete(f"honeytoken:{tid}", f"honeytoken:{tid}:ips")
+
+    print(f"{'layout':<24} {'accesses/s':>12}")
+    print(f"{'legacy str()/eval()':<24} {legacy_rate:>12.0f}")
+    print(f"{'hash + ip set (MULTI)':<24} {hash_rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
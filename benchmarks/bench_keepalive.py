@@ -0,0 +1,139 @@
+"""
+Connection reuse benchmark: one connection per request vs HTTP/1.1 keep-alive.
+
+Each client thread requests a mix of pages for a fixed time, either opening
+a new connection per request (``Connection: close``, the pre-keep-alive
+behaviour), reusing one persistent connection, or pipelining several
+requests per write on it. Reports requests/sec, new connections/sec and
+p99 latency per engine:
+
+    python benchmarks/bench_keepalive.py --clients 32 --seconds 5 --depth 8
+"""
+import argparse
+import logging
+import socket
+import threading
+import time
+
+from common import percentile, start_server, stop_server
+
+PATHS = ["/", "/patients", "/api/patients", "/static/css/portal.css", "/login"]
+
+
+def read_response(f):
+    """Read one response from a buffered socket file; returns ``(status, body, close)``"""
+    status_line = f.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = f.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding") == "chunked":
+        body = bytearray()
+        while True:
+            size = int(f.readline().split(b";")[0], 16)
+            chunk = f.read(size + 2)
+            if size == 0:
+                break
+            body += chunk[:-2]
+    elif "content-length" in headers:
+        body = f.read(int(headers["content-length"]))
+    elif status in (204, 304):
+        body = b""
+    else:
+        body = f.read()
+    return status, bytes(body), headers.get("connection", "").lower() == "close"
+
+
+def request_bytes(path, close=False):
+    connection = "Connection: close\r\n" if close else ""
+    return f"GET {path} HTTP/1.1\r\nHost: localhost\r\n{connection}\r\n".encode()
+
+
+class Connection:
+    def __init__(self, port):
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=30)
+        self.file = self.sock.makefile("rb")
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+def client(port, style, depth, stop, results):
+    latencies, connections, errors, step = [], 0, 0, 0
+    conn = None
+    while not stop.is_set():
+        batch = [PATHS[(step + i) % len(PATHS)] for i in range(depth if style == "pipelined" else 1)]
+        step += len(batch)
+        started = time.perf_counter()
+        try:
+            if conn is None:
+                conn = Connection(port)
+                connections += 1
+            conn.sock.sendall(b"".join(request_bytes(path, close=style == "close") for path in batch))
+            served, closed = 0, False
+            while served < len(batch) and not closed:
+                # The server may close mid-batch at its request cap; the rest are resent
+                _, _, closed = read_response(conn.file)
+                served += 1
+            step -= len(batch) - served
+            elapsed = time.perf_counter() - started
+            latencies.extend([elapsed / served] * served)
+            if closed or style == "close":
+                conn.close()
+                conn = None
+        except (OSError, ValueError, IndexError):
+            errors += 1
+            if conn is not None:
+                conn.close()
+                conn = None
+    if conn is not None:
+        conn.close()
+    results.append((latencies, connections, errors))
+
+
+def run(port, style, clients, seconds, depth):
+    stop = threading.Event()
+    results = []
+    threads = [threading.Thread(target=client, args=(port, style, depth, stop, results), daemon=True)
+               for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies = [latency for result in results for latency in result[0]]
+    return latencies, sum(r[1] for r in results), sum(r[2] for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", nargs="+", default=["threaded", "asyncio"])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--depth", type=int, default=8, help="requests per pipelined write")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    print(f"{'mode':<9} {'connection':<10} {'req/s':>8} {'conn/s':>8} {'p99 ms':>7} {'errors':>6}")
+    for mode in args.modes:
+        for style in ("close", "keep-alive", "pipelined"):
+            server, port = start_server(mode, workers=args.clients * 2)
+            try:
+                latencies, connections, errors = run(port, style, args.clients, args.seconds, args.depth)
+            finally:
+                stop_server(server)
+            print(f"{mode:<9} {style:<10} {len(latencies) / args.seconds:>8.0f} "
+                  f"{connections / args.seconds:>8.0f} {percentile(latencies, 99) * 1000:>7.1f} {errors:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Overhead benchmark for the per-thread metrics.
+
+Times ``Histogram.observe`` and ``Counter.inc`` (including the two
+``perf_counter`` calls a timed request pays) from one and several threads,
+next to the same histogram guarded by a global lock, then times a full
+scrape after a load run of the decoy server:
+
+    python benchmarks/bench_metrics.py --calls 1000000 --threads 8
+"""
+import argparse
+import http.client
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from common import run_load, start_server, stop_server
+from utils.metrics import LATENCY_BUCKETS, MetricsRegistry
+
+
+class LockedHistogram:
+    """The obvious alternative: one shared dict behind one lock"""
+
+    def __init__(self):
+        self.buckets = LATENCY_BUCKETS
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self.lock:
+            counts = self.counts.get(labels)
+            if counts is None:
+                counts = self.counts[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+
+def per_call(threads, calls, record):
+    def worker():
+        perf_counter = time.perf_counter
+        for _ in range(calls):
+            started = perf_counter()
+            record(perf_counter() - started)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return (time.perf_counter() - started) / (threads * calls) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=1000000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    registry = MetricsRegistry()
+    histogram = registry.histogram("bench_seconds", "bench", ("route", "method"))
+    counter = registry.counter("bench_total", "bench", ("code",))
+    locked = LockedHistogram()
+    cases = [
+        ("perf_counter x2 only", lambda elapsed: None),
+        ("histogram.observe", lambda elapsed: histogram.observe(elapsed, "serve_patients", "GET")),
+        ("counter.inc", lambda elapsed: counter.inc(200)),
+        ("locked histogram", lambda elapsed: locked.observe(elapsed, "serve_patients", "GET")),
+    ]
+    print(f"{'case':<22} {'1 thread ns':>12} {f'{args.threads} threads ns':>14}")
+    for name, record in cases:
+        single = per_call(1, args.calls, record)
+        multi = per_call(args.threads, args.calls // args.threads, record)
+        print(f"{name:<22} {single:>12.0f} {multi:>14.0f}")
+
+    import simple_server
+    server, port = start_server()
+    try:
+        for path in ("/", "/patients", "/api/patients", "/nope"):
+            run_load(port, path, 16, 50)
+        started = time.perf_counter()
+        body = simple_server.METRICS.render()
+        elapsed = time.perf_counter() - started
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        conn.request("GET", "/metrics")
+        status = conn.getresponse().status
+    finally:
+        stop_server(server)
+    print(f"scrape: {len(body.splitlines())} lines, {len(body)} bytes in {elapsed * 1000:.2f} ms "
+          f"(/metrics without the admin key: {status})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Time-to-first-byte and memory benchmark for paginated and streamed lists.
+
+Loads a generated dataset (1M patients by default), then for each serving
+engine measures TTFB, total time and peak server RSS growth for the fully
+streamed ``/api/patients``, a deep cursor page and a deep HTML page. The
+old approach (one ``json.dumps`` of the whole list) is measured in-process
+for comparison:
+
+    python benchmarks/bench_pagination.py --patients 1000000 --dataset-dir /tmp/decoy-1m
+"""
+import argparse
+import http.client
+import json
+import logging
+import shutil
+import tempfile
+import threading
+import time
+
+from common import start_server, stop_server
+
+STREAM_READ_SIZE = 64 * 1024
+
+
+def rss_mib():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class PeakRss:
+    """Samples this process's RSS in the background and reports the peak growth"""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.baseline = self.peak = rss_mib()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, rss_mib())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_mib())
+
+    @property
+    def growth(self):
+        return self.peak - self.baseline
+
+
+def fetch(port, path):
+    """Return ``(ttfb, total, body_bytes)`` for one GET"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+    started = time.perf_counter()
+    conn.request("GET", path)
+    response = conn.getresponse()
+    received = len(response.read(1))
+    ttfb = time.perf_counter() - started
+    while True:
+        chunk = response.read(STREAM_READ_SIZE)
+        if not chunk:
+            break
+        received += len(chunk)
+    total = time.perf_counter() - started
+    conn.close()
+    return ttfb, total, received
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--patients", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=1337)
+    parser.add_argument("--dataset-dir", help="reuse (or keep) the generated dataset here")
+    parser.add_argument("--modes", nargs="+", default=["threaded", "asyncio"])
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    import simple_server
+    from utils.dataset import load_or_generate
+    from utils.pagination import encode_cursor
+
+    directory = args.dataset_dir or tempfile.mkdtemp(prefix="decoy-dataset-")
+    started = time.perf_counter()
+    simple_server.load_dataset(load_or_generate(args.patients, args.seed, directory))
+    print(f"dataset ready in {time.perf_counter() - started:.1f}s: {len(simple_server.PATIENTS)} patients")
+
+    deep_page = max(1, args.patients // 50 - 1)
+    deep_cursor = encode_cursor(max(0, args.patients - 1000))
+    paths = [
+        "/api/patients",
+        f"/api/patients?cursor={deep_cursor}&limit=500",
+        f"/patients?page={deep_page}&limit=50",
+    ]
+
+    print(f"{'engine':<10} {'path':<48} {'TTFB ms':>9} {'total s':>8} {'MiB':>8} {'RSS +MiB':>9}")
+    with PeakRss() as peak:
+        started = time.perf_counter()
+        body = json.dumps(list(simple_server.DATASET.rows("patients"))).encode()
+        elapsed = time.perf_counter() - started
+        size = len(body)
+        del body
+    print(f"{'buffered':<10} {'json.dumps(all patients)':<48} {elapsed * 1000:>9.1f} {elapsed:>8.2f} "
+          f"{size / 2**20:>8.1f} {peak.growth:>9.1f}")
+
+    for mode in args.modes:
+        server, port = start_server(mode)
+        try:
+            for path in paths:
+                with PeakRss() as peak:
+                    ttfb, total, received = fetch(port, path)
+                print(f"{mode:<10} {path:<48} {ttfb * 1000:>9.1f} {total:>8.2f} "
+                      f"{received / 2**20:>8.1f} {peak.growth:>9.1f}")
+        finally:
+            stop_server(server)
+
+    if not args.dataset_dir:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
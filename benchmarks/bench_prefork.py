@@ -0,0 +1,139 @@
+"""
+Pre-fork scaling benchmark: throughput by number of worker processes.
+
+Runs ``simple_server.py --processes N`` for each N, loads it from several
+client processes (a single Python client would be the bottleneck) on
+keep-alive connections, and reports requests/sec, the speedup over one
+process and p99 latency. It then checks the shared honeytoken store: tokens
+are harvested from pages and each is accessed several times on new
+connections, which the kernel spreads across workers, and the admin API
+must report every one of those accesses:
+
+    python benchmarks/bench_prefork.py --processes 1 2 4 --seconds 10
+"""
+import argparse
+import http.client
+import json
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+
+from common import percentile, start_server_process
+from fake_redis import FakeRedis
+
+PATHS = ["/", "/patients", "/appointments", "/api/patients", "/patient/P001", "/login"]
+TOKEN_PATTERN = re.compile(r"<!-- Honeytoken: ([A-Za-z0-9_-]+) -->")
+ADMIN_KEY = "bench-prefork"
+
+
+def client(port, deadline, latencies):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    step = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.request("GET", PATHS[step % len(PATHS)])
+            response = conn.getresponse()
+            response.read()
+            if response.will_close:
+                conn.close()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            continue
+        step += 1
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+def load_process(port, clients, seconds):
+    """One client process: ``clients`` threads for ``seconds``; returns their latencies"""
+    deadline = time.perf_counter() + seconds
+    latencies = []
+    threads = [threading.Thread(target=client, args=(port, deadline, latencies), daemon=True)
+               for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def run_load(port, clients, client_processes, seconds):
+    per_process = max(1, clients // client_processes)
+    with multiprocessing.Pool(client_processes) as pool:
+        started = time.perf_counter()
+        results = pool.starmap(load_process, [(port, per_process, seconds)] * client_processes)
+        elapsed = time.perf_counter() - started
+    latencies = [latency for result in results for latency in result]
+    return len(latencies) / elapsed, percentile(latencies, 99) * 1000
+
+
+def get(port, path, headers=None):
+    # A new connection per request, so requests land on different workers
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request("GET", path, headers=headers or {})
+        return conn.getresponse().read()
+    finally:
+        conn.close()
+
+
+def check_tokens(port, tokens, hits):
+    """Access each token ``hits`` times; returns ``(accesses recorded, accesses made)``"""
+    for token in tokens:
+        for _ in range(hits):
+            get(port, f"/honeytoken?token={token}")
+    body = get(port, "/admin/api/honeytokens?limit=1000", {"Authorization": f"Bearer {ADMIN_KEY}"})
+    counts = {token["token_id"]: token["access_count"] for token in json.loads(body)["tokens"]}
+    return sum(counts.get(token, 0) for token in tokens), len(tokens) * hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--mode", choices=["threaded", "asyncio"], default="threaded")
+    parser.add_argument("--backend", choices=["shared", "redis"], default="shared",
+                        help="honeytoken store shared by the workers (redis needs a real Redis at REDIS_HOST)")
+    parser.add_argument("--clients", type=int, default=32, help="keep-alive connections in total")
+    parser.add_argument("--client-processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--tokens", type=int, default=20, help="tokens checked across workers")
+    parser.add_argument("--hits", type=int, default=5, help="accesses per checked token")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    # Alerts go to a fake Redis unless the tokens need the real one
+    redis = FakeRedis().start() if args.backend == "shared" else None
+    print(f"{'processes':>9} {'req/s':>8} {'speedup':>8} {'p99 ms':>7} {'token accesses seen':>20}")
+    baseline = None
+    try:
+        for processes in args.processes:
+            with tempfile.TemporaryDirectory() as workdir:
+                env = dict(os.environ, HONEYTOKEN_BACKEND=args.backend, ADMIN_API_KEY=ADMIN_KEY,
+                           RATE_LIMIT_MODE="off", LOG_PATH=os.path.join(workdir, "server.log"))
+                if redis is not None:
+                    env.update(REDIS_HOST="127.0.0.1", REDIS_PORT=str(redis.port))
+                process, port = start_server_process(
+                    ["--mode", args.mode, "--processes", str(processes)], env=env, cwd=workdir)
+                try:
+                    rps, p99 = run_load(port, args.clients, args.client_processes, args.seconds)
+                    tokens = []
+                    while len(tokens) < args.tokens:
+                        tokens.extend(TOKEN_PATTERN.findall(get(port, "/patients").decode()))
+                    seen, made = check_tokens(port, tokens[:args.tokens], args.hits)
+                finally:
+                    process.terminate()
+                    process.wait(30)
+            baseline = baseline or rps
+            print(f"{processes:>9} {rps:>8.0f} {rps / baseline:>7.2f}x {p99:>7.1f} {f'{seen}/{made}':>20}")
+    finally:
+        if redis is not None:
+            redis.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Legitimate-traffic benchmark for rate limiting and the tarpit under a brute-force attack.
+
+Paced legitimate clients crawl the decoy pages, each from its own loopback
+address, while attacker threads hammer ``POST /login`` from another. The
+same load runs with no attack, then with the attack and limiting off, in
+reject mode and in tarpit mode, reporting legitimate latency and errors,
+the attacker's completed request rate, and the tarpit and login-coalescing
+counters:
+
+    python benchmarks/bench_rate_limit.py --seconds 10 --attackers 32
+"""
+import argparse
+import http.client
+import logging
+import threading
+import time
+
+from common import percentile, start_server, stop_server
+import simple_server
+from utils.rate_limit import RateLimitPolicy
+from utils.tarpit import Tarpit
+
+PAGES = ["/", "/login", "/dashboard", "/patients", "/appointments", "/prescriptions", "/api/patients"]
+ATTACKER_IP = "127.0.0.3"
+LOGIN_BODY = "username=admin&password=guess"
+
+
+def legit_client(port, index, stop, results, think):
+    source = (f"127.0.1.{index + 1}", 0)
+    latencies, errors, limited = [], 0, 0
+    step = 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10, source_address=source)
+            conn.request("GET", PAGES[step % len(PAGES)])
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            if response.status == 429:
+                limited += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+        step += 1
+        stop.wait(think)
+    results.append((latencies, errors, limited))
+
+
+def attacker(port, stop, counts, timeout):
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    while not stop.is_set():
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout, source_address=(ATTACKER_IP, 0))
+            conn.request("POST", "/login", LOGIN_BODY, headers)
+            conn.getresponse().read()
+            conn.close()
+            counts[0] += 1
+        except (OSError, http.client.HTTPException):
+            counts[1] += 1
+
+
+def run(port, args, attack):
+    stop = threading.Event()
+    results = []
+    counts = [0, 0]
+    threads = [threading.Thread(target=legit_client, args=(port, i, stop, results, args.think), daemon=True)
+               for i in range(args.clients)]
+    if attack:
+        threads += [threading.Thread(target=attacker, args=(port, stop, counts, args.attacker_timeout), daemon=True)
+                    for _ in range(args.attackers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads[:args.clients]:
+        thread.join()
+    latencies = [latency for result in results for latency in result[0]]
+    return latencies, sum(r[1] for r in results), sum(r[2] for r in results), counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["threaded", "asyncio"], default="threaded")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--think", type=float, default=0.05, help="pause between legitimate requests")
+    parser.add_argument("--attackers", type=int, default=32)
+    parser.add_argument("--attacker-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    scenarios = [("no attack", "off", False), ("attack, limits off", "off", True),
+                 ("attack, reject", "reject", True), ("attack, tarpit", "tarpit", True)]
+    print(f"{'scenario':<20} {'legit req/s':>11} {'p50 ms':>7} {'p95 ms':>7} {'errors':>6} {'429s':>5} "
+          f"{'attack req/s':>12}")
+    for name, mode, attack in scenarios:
+        simple_server.RATE_LIMITS = RateLimitPolicy(mode=mode, route_limits={"handle_login": (1.0, 10.0)})
+        simple_server.TARPIT = Tarpit(interval=1.0, duration=args.attacker_timeout)
+        server, port = start_server(args.mode)
+        try:
+            latencies, errors, limited, counts = run(port, args, attack)
+        finally:
+            stop_server(server)
+        print(f"{name:<20} {len(latencies) / args.seconds:>11.1f} {percentile(latencies, 50) * 1000:>7.1f} "
+              f"{percentile(latencies, 95) * 1000:>7.1f} {errors:>6} {limited:>5} "
+              f"{counts[0] / args.seconds:>12.1f}")
+        if attack and mode != "off":
+            print(f"{'':<20} limited={simple_server.RATE_LIMITS.limited} tarpit={simple_server.TARPIT.stats()}")
+    print(f"login events: {simple_server.LOGINS.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Routing micro-benchmark at 10, 100 and 1000 routes.
+
+Half of the routes are exact paths and half take a ``<id>`` parameter. Each
+size is matched with ``utils.router.Router`` and with a linear if/elif-style
+scan (``==`` / ``startswith`` in registration order, like the old do_GET):
+
+    python benchmarks/bench_routing.py --lookups 100000
+"""
+import argparse
+import random
+import time
+
+from common import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+from utils.router import Router
+
+SIZES = [10, 100, 1000]
+
+
+def build(size):
+    router = Router()
+    linear = []
+    paths = []
+    for i in range(size):
+        if i % 2:
+            router.add("GET", f"/decoy{i}/<record_id>", i)
+            linear.append((False, f"/decoy{i}/", i))
+            paths.append(f"/decoy{i}/R{i:05d}")
+        else:
+            router.add("GET", f"/decoy{i}", i)
+            linear.append((True, f"/decoy{i}", i))
+            paths.append(f"/decoy{i}")
+    return router, linear, paths
+
+
+def linear_match(routes, path):
+    for exact, pattern, handler in routes:
+        if exact:
+            if path == pattern:
+                return handler, {}
+        elif path.startswith(pattern):
+            return handler, {"record_id": path.split("/")[2]}
+    return None, None
+
+
+def timed(match, paths, lookups):
+    started = time.perf_counter()
+    for i in range(lookups):
+        match(paths[i % len(paths)])
+    return (time.perf_counter() - started) / lookups * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'routes':>7} {'router ns':>10} {'linear ns':>10} {'router miss ns':>15} {'linear miss ns':>15}")
+    for size in SIZES:
+        router, linear, paths = build(size)
+        rng.shuffle(paths)
+        for path in paths:
+            assert router.match("GET", path)[0] == linear_match(linear, path)[0], path
+        misses = [f"/wp-admin/{i}" for i in range(64)]
+
+        router_ns = timed(lambda p: router.match("GET", p), paths, args.lookups)
+        linear_ns = timed(lambda p: linear_match(linear, p), paths, args.lookups)
+        router_miss = timed(lambda p: router.match("GET", p), misses, args.lookups)
+        linear_miss = timed(lambda p: linear_match(linear, p), misses, args.lookups)
+        print(f"{size:>7} {router_ns:>10.0f} {linear_ns:>10.0f} {router_miss:>15.0f} {linear_miss:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
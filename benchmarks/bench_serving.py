@@ -0,0 +1,45 @@
+"""
+Load benchmark for the serving engines.
+
+Reports requests/sec and p99 latency for ``/``, ``/patients`` and
+``/api/patients`` at 1, 50 and 500 concurrent clients for each mode:
+
+    python benchmarks/bench_serving.py --modes threaded asyncio
+"""
+import argparse
+import logging
+
+from common import run_load, start_server, stop_server
+
+PATHS = ["/", "/patients", "/api/patients"]
+CONCURRENCY = [1, 50, 500]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", nargs="+", default=["threaded", "asyncio"])
+    parser.add_argument("--requests", type=int, default=2000,
+                        help="approximate total requests per path and concurrency level")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--max-connections", type=int, default=1024)
+    args = parser.parse_args()
+
+    # Keep per-request log lines from dominating the measurement
+    logging.disable(logging.INFO)
+
+    print(f"{'mode':<10} {'path':<15} {'clients':>7} {'req/s':>10} {'p99 ms':>9} {'errors':>7}")
+    for mode in args.modes:
+        server, port = start_server(mode, workers=args.workers, max_connections=args.max_connections)
+        try:
+            for path in PATHS:
+                for concurrency in CONCURRENCY:
+                    per_client = max(1, args.requests // concurrency)
+                    result = run_load(port, path, concurrency, per_client)
+                    print(f"{mode:<10} {path:<15} {concurrency:>7} {result['rps']:>10.1f} "
+                          f"{result['p99_ms']:>9.2f} {result['errors']:>7}")
+        finally:
+            stop_server(server)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Memory and throughput benchmark for per-IP session tracking.
+
+Replays a typical attacker session (crawl, credential guessing, sensitive
+pages, a honeytoken hit) for many IPs and reports traced memory per tracked
+IP, then measures how many events per second the tracker absorbs from one
+and several threads, and under IP churn well beyond its capacity:
+
+    python benchmarks/bench_sessions.py --ips 50000 --threads 8
+"""
+import argparse
+import threading
+import time
+import tracemalloc
+
+from common import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+from utils.sessions import SessionTracker
+
+CRAWL = ["/", "/login", "/dashboard", "/patients", "/appointments", "/prescriptions", "/admin", "/backup",
+         "/api/patients", "/wp-login.php", "/.env", "/phpmyadmin/"]
+PASSWORDS = ["123456", "password", "admin", "letmein", "qwerty", "password123"]
+
+
+def attacker_session(tracker, ip, steps=24):
+    """Record ``steps`` requests for ``ip`` with a few logins and one honeytoken hit; returns event count"""
+    events = 0
+    for step in range(steps):
+        path = CRAWL[step % len(CRAWL)]
+        tracker.record_request(ip, "GET", path)
+        events += 1
+        if step % 4 == 1:
+            tracker.record_request(ip, "POST", "/login")
+            tracker.record_login(ip, "admin", PASSWORDS[step % len(PASSWORDS)], False)
+            events += 2
+    tracker.record_token(ip, "9f0c2a4e-5b7d-4e61-8a3f-2d1c0b9e8f7a", "page_visit:/backup")
+    return events + 1
+
+
+def ip_address(index):
+    return f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}"
+
+
+def new_tracker(capacity):
+    # Never report during the run; the reporter cost is measured separately
+    return SessionTracker(lambda profile: None, capacity=capacity, report_interval=3600)
+
+
+def run_threads(tracker, threads, ips_per_thread, offset=0):
+    counts = [0] * threads
+
+    def worker(index):
+        base = offset + index * ips_per_thread
+        for i in range(ips_per_thread):
+            counts[index] += attacker_session(tracker, ip_address(base + i))
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sum(counts), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ips", type=int, default=50000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    tracker = new_tracker(args.ips)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(args.ips):
+        attacker_session(tracker, ip_address(i))
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"memory: {used / args.ips:.0f} bytes per tracked IP ({len(tracker)} sessions, "
+          f"{used / 2**20:.1f} MiB)")
+
+    started = time.perf_counter()
+    profiles = tracker.collect()
+    print(f"report: {len(profiles)} profiles collected in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    for threads in (1, args.threads):
+        tracker = new_tracker(args.ips)
+        events, elapsed = run_threads(tracker, threads, args.ips // threads)
+        print(f"{threads:>2} thread(s): {events / elapsed:>10.0f} events/s")
+
+    # Churn: four times as many IPs as the tracker holds, so most sessions are evicted
+    tracker = new_tracker(args.ips // 4)
+    events, elapsed = run_threads(tracker, args.threads, args.ips // args.threads)
+    print(f"churn (capacity {args.ips // 4}): {events / elapsed:>10.0f} events/s, stats={tracker.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Stored vs signed honeytokens over a long crawl.
+
+Mints one token per page view of a crawl, the way ``generate_honeytoken``
+does in each mode, and reports tokens minted per second and the growth in
+resident memory. Stored mode creates a UUID and a record in a bounded
+``HoneytokenStore``, so memory grows until the store is full and older
+tokens are evicted after that. Signed mode only computes a MAC, so nothing
+is kept and nothing is lost. Verifying a signed token, which is paid once
+per honeytoken access instead, is timed as well:
+
+    python benchmarks/bench_signed_tokens.py --requests 10000000
+"""
+import argparse
+import logging
+import os
+import time
+import uuid
+
+from common import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+from utils.signed_tokens import TokenSigner
+from utils.token_store import DEFAULT_CAPACITY, HoneytokenStore
+
+PATHS = ["/", "/login", "/dashboard", "/patients", "/appointments", "/prescriptions",
+         "/admin", "/backup", "/api/patients", "/wp-login.php"]
+CONTEXTS = [f"page_visit:{path}" for path in PATHS]
+
+
+def rss_mib():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def crawl_signed(requests, signer):
+    contexts = CONTEXTS
+    for i in range(requests):
+        signer.mint(contexts[i % len(contexts)])
+    return None
+
+
+def crawl_stored(requests, capacity):
+    store = HoneytokenStore(capacity=capacity, spill_path=None)
+    contexts = CONTEXTS
+    for i in range(requests):
+        store.create(str(uuid.uuid4()), contexts[i % len(contexts)])
+    return store
+
+
+def measure(crawl, *args):
+    before = rss_mib()
+    started = time.perf_counter()
+    result = crawl(*args)
+    elapsed = time.perf_counter() - started
+    return result, elapsed, rss_mib() - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10000000, help="page views in the crawl")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY, help="capacity of the stored-mode store")
+    parser.add_argument("--verifications", type=int, default=200000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    signer = TokenSigner(os.urandom(32))
+    # Signed first: it allocates nothing, so the stored run cannot inflate its figure
+    _, signed_time, signed_growth = measure(crawl_signed, args.requests, signer)
+    store, stored_time, stored_growth = measure(crawl_stored, args.requests, args.capacity)
+
+    token = signer.mint(CONTEXTS[3])
+    started = time.perf_counter()
+    for _ in range(args.verifications):
+        signer.verify(token)
+    verify_us = (time.perf_counter() - started) / args.verifications * 1e6
+
+    stats = store.stats()
+    print(f"{args.requests} page views, store capacity {args.capacity}")
+    print(f"{'mode':<8} {'tokens/s':>10} {'RSS growth MiB':>15} {'tokens lost':>12}")
+    print(f"{'stored':<8} {args.requests / stored_time:>10.0f} {stored_growth:>15.1f} "
+          f"{stats['expired'] + stats['evicted']:>12}")
+    print(f"{'signed':<8} {args.requests / signed_time:>10.0f} {signed_growth:>15.1f} {0:>12}")
+    print(f"signed token length {len(token)}, verify {verify_us:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
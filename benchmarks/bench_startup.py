@@ -0,0 +1,73 @@
+"""
+Import-to-first-request startup benchmark.
+
+Starts a fresh interpreter per run, imports ``simple_server``, binds an
+ephemeral port, starts the deferred startup tasks and times the first
+``GET /`` and the moment those tasks are done ("ready"). REDIS_HOST points
+at an unroutable address by default so the run shows whether startup waits
+on Redis. With ``--patients`` a generated dataset of that size is loaded
+in the background; the first run generates it, later runs load the cached
+copy:
+
+    python benchmarks/bench_startup.py --runs 5 --patients 1000000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from common import APP_DIR
+
+PROBE = r"""
+import http.client, json, sys, threading, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import simple_server
+from utils.serving import make_server
+imported = time.perf_counter()
+server = make_server("threaded", ("127.0.0.1", 0), simple_server.HealthcareHandler)
+simple_server.STARTUP.run_deferred()
+threading.Thread(target=server.serve_forever, daemon=True).start()
+bound = time.perf_counter()
+conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=30)
+conn.request("GET", "/")
+status = conn.getresponse().status
+served = time.perf_counter()
+simple_server.STARTUP.wait()
+ready = time.perf_counter()
+print(json.dumps({"import": imported - started, "bind": bound - imported,
+                  "first_request": served - bound, "total": served - started,
+                  "ready": ready - started, "status": status}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--redis-host", default="10.255.255.1",
+                        help="REDIS_HOST for the probe (default: unroutable)")
+    parser.add_argument("--patients", type=int, default=0, help="DATASET_PATIENTS (default: built-in records)")
+    parser.add_argument("--startup-mode", choices=["background", "eager"], default="background",
+                        help="STARTUP_MODE for the probe")
+    args = parser.parse_args()
+
+    runs = []
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, REDIS_HOST=args.redis_host, DATASET_PATIENTS=str(args.patients),
+                   DATASET_DIR=os.path.join(workdir, "dataset"), STARTUP_MODE=args.startup_mode)
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, "-c", PROBE, os.path.abspath(APP_DIR)],
+                                    cwd=workdir, env=env, capture_output=True, text=True, check=True)
+            runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    print(f"{'phase':<15} {'median ms':>10} {'max ms':>10}")
+    for phase in ("import", "bind", "first_request", "total", "ready"):
+        values = [run[phase] * 1000 for run in runs]
+        print(f"{phase:<15} {statistics.median(values):>10.1f} {max(values):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
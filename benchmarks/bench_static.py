@@ -0,0 +1,108 @@
+"""
+Bytes-on-the-wire benchmark for page views and their static assets.
+
+Plays a browser crawling the portal pages: each view fetches the page with
+``Accept-Encoding: gzip``, then the stylesheets and scripts it links unless
+they are still fresh in the client's cache (``max-age``), revalidating stale
+ones with If-None-Match. Reports response bytes (headers and body) for the
+first view, the average over the remaining views, and asset fetch counts:
+
+    python benchmarks/bench_static.py --views 200
+"""
+import argparse
+import logging
+import re
+import socket
+import time
+
+from common import start_server, stop_server
+
+PAGES = ["/", "/login", "/dashboard", "/patients", "/appointments", "/prescriptions", "/patient/P001",
+         "/admin", "/backup"]
+ASSET_LINK = re.compile(r'<(?:link[^>]+href|script[^>]+src)="(/static/[^"]+)"')
+
+
+def fetch(port, path, headers=()):
+    """GET ``path`` over HTTP/1.0; returns ``(status, headers, body, wire_bytes)``"""
+    request = f"GET {path} HTTP/1.0\r\nHost: localhost\r\n"
+    request += "".join(f"{name}: {value}\r\n" for name, value in headers) + "\r\n"
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        sock.sendall(request.encode())
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    raw = b"".join(chunks)
+    head, _, body = raw.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    response_headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+    return status, response_headers, body, len(raw)
+
+
+def max_age(cache_control):
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else 0
+
+
+class Browser:
+    """Just enough of an HTTP cache to model repeat page views"""
+
+    def __init__(self, port):
+        self.port = port
+        self.cache = {}  # url -> (expires, etag)
+        self.asset_fetches = 0
+        self.revalidations = 0
+
+    def view(self, path):
+        _, _, body, wire = fetch(self.port, path, [("Accept-Encoding", "gzip")])
+        for url in ASSET_LINK.findall(body.decode("utf-8", "replace")):
+            wire += self.asset(url)
+        return wire
+
+    def asset(self, url):
+        now = time.time()
+        cached = self.cache.get(url)
+        headers = [("Accept-Encoding", "gzip")]
+        if cached is not None:
+            expires, etag = cached
+            if expires > now:
+                return 0
+            headers.append(("If-None-Match", etag))
+            self.revalidations += 1
+        else:
+            self.asset_fetches += 1
+        status, response_headers, _, wire = fetch(self.port, url, headers)
+        if status in (200, 304) and "etag" in response_headers:
+            self.cache[url] = (now + max_age(response_headers.get("cache-control")), response_headers["etag"])
+        return wire
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["threaded", "asyncio"], default="threaded")
+    parser.add_argument("--views", type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    server, port = start_server(args.mode)
+    try:
+        browser = Browser(port)
+        first = browser.view(PAGES[0])
+        rest = [browser.view(PAGES[i % len(PAGES)]) for i in range(1, args.views)]
+    finally:
+        stop_server(server)
+
+    print(f"first view:      {first:>8} bytes")
+    print(f"later views:     {sum(rest) / max(1, len(rest)):>8.0f} bytes/view (avg over {len(rest)})")
+    print(f"total:           {first + sum(rest):>8} bytes for {args.views} views")
+    print(f"asset fetches:   {browser.asset_fetches:>8}, revalidations: {browser.revalidations}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+End-to-end load suite replaying attacker workloads against the decoy server.
+
+Starts a fake Redis (``fake_redis.py``) and ``simple_server.py`` in its own
+process, then runs each workload for a fixed time with seeded clients on
+keep-alive connections, after an untimed warm-up:
+
+- ``crawl``: page and asset requests across the portal
+- ``credential_stuffing``: ``POST /login`` with leaked-looking credentials
+- ``api_scrape``: paging through ``/api/patients`` and per-patient APIs
+- ``honeytoken_callbacks``: ``/honeytoken?token=`` with tokens harvested from pages
+- ``mixed``: all of the above at once
+
+Each workload records throughput, latency percentiles, the server's CPU
+time and memory (from /proc) and the alerts that reached Redis. Results are
+saved as JSON and compared against a stored baseline; a metric that is
+worse than the baseline by more than ``--tolerance`` fails the run:
+
+    python benchmarks/bench_suite.py --seconds 10
+    python benchmarks/bench_suite.py --save-baseline
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from common import percentile, start_server_process
+from fake_redis import FakeRedis
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, "results", "latest.json")
+
+WORKLOADS = ["crawl", "credential_stuffing", "api_scrape", "honeytoken_callbacks", "mixed"]
+CRAWL_PATHS = ["/", "/login", "/dashboard", "/patients", "/appointments", "/prescriptions", "/admin",
+               "/backup", "/static/css/portal.css", "/static/js/main.js", "/wp-login.php", "/.env"]
+USERNAMES = ["admin", "doctor", "nurse", "root", "administrator", "jsmith", "billing", "reception"]
+PASSWORDS = ["123456", "password", "password123", "admin", "letmein", "qwerty", "medical", "Summer2024!"]
+FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+TOKEN_PATTERN = re.compile(r"<!-- Honeytoken: ([A-Za-z0-9_-]+) -->")
+
+# metric -> whether bigger is better; checked against the baseline
+CHECKS = [("rps", True), ("p99_ms", False), ("cpu_ms_per_request", False), ("peak_rss_mb", False)]
+# Latency differences smaller than this are noise, whatever the percentage
+P99_SLACK_MS = 1.0
+
+
+# Workloads: each yields (method, path, body, headers) forever
+
+def crawl(rng, context):
+    paths = CRAWL_PATHS + [f"/patient/{patient_id}" for patient_id in context["patient_ids"][:50]]
+    while True:
+        yield "GET", rng.choice(paths), None, {}
+
+
+def credential_stuffing(rng, context):
+    while True:
+        body = f"username={rng.choice(USERNAMES)}&password={rng.choice(PASSWORDS)}{rng.randrange(100)}"
+        yield "POST", "/login", body, FORM_HEADERS
+
+
+def api_scrape(rng, context):
+    pages = max(1, -(-context["patient_total"] // 100))
+    page = rng.randrange(pages)
+    while True:
+        page = page % pages + 1
+        yield "GET", f"/api/patients?page={page}&limit=100", None, {}
+        patient_id = rng.choice(context["patient_ids"])
+        yield "GET", f"/api/patients/{patient_id}", None, {}
+        yield "GET", f"/api/patients/{patient_id}/{rng.choice(['appointments', 'prescriptions'])}", None, {}
+
+
+def honeytoken_callbacks(rng, context):
+    while True:
+        yield "GET", f"/honeytoken?token={rng.choice(context['tokens'])}", None, {}
+
+
+GENERATORS = {
+    "crawl": crawl,
+    "credential_stuffing": credential_stuffing,
+    "api_scrape": api_scrape,
+    "honeytoken_callbacks": honeytoken_callbacks,
+}
+
+
+# Server process
+
+def start_decoy(args, redis_port, workdir):
+    env = dict(os.environ, REDIS_HOST="127.0.0.1", REDIS_PORT=str(redis_port),
+               RATE_LIMIT_MODE=args.rate_limit_mode, LOG_PATH=os.path.join(workdir, "server.log"),
+               ALERT_OVERFLOW_PATH=os.path.join(workdir, "alerts_overflow.jsonl"),
+               HONEYTOKEN_SPILL_PATH=os.path.join(workdir, "honeytokens_accessed.jsonl"))
+    if args.patients:
+        env.update(DATASET_PATIENTS=str(args.patients), DATASET_SEED=str(args.seed),
+                   DATASET_DIR=os.path.join(workdir, "dataset"))
+    return start_server_process(["--mode", args.mode], env=env, cwd=workdir)
+
+
+def process_usage(pid):
+    """``(cpu_seconds, rss_bytes)`` of a process from /proc, or Nones where unavailable"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+        return cpu, rss
+    except (OSError, StopIteration, IndexError, ValueError):
+        return None, None
+
+
+class RssSampler(threading.Thread):
+    """Peak RSS of a process over a run, sampled every ``interval`` seconds"""
+
+    def __init__(self, pid, interval=0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            _, rss = process_usage(self.pid)
+            self.peak = max(self.peak, rss or 0)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.peak
+
+
+# Load generation
+
+def get(port, path):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response, response.read()
+    finally:
+        conn.close()
+
+
+def discover(port):
+    """Patient IDs and live honeytokens for the workloads to use"""
+    response, body = get(port, "/api/patients?limit=1000")
+    patients = json.loads(body)
+    patient_ids = [patient["id"] for patient in patients]
+    tokens = []
+    for path in CRAWL_PATHS[:8] * 4:
+        _, page = get(port, path)
+        tokens.extend(TOKEN_PATTERN.findall(page.decode("utf-8", "replace")))
+    return {"patient_ids": patient_ids, "patient_total": int(response.getheader("X-Total-Count", len(patient_ids))),
+            "tokens": tokens or ["00000000-0000-0000-0000-000000000000"]}
+
+
+def client(port, requests, deadline, latencies, errors):
+    conn = None
+    while time.perf_counter() < deadline:
+        method, path, body, headers = next(requests)
+        started = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            response.read()
+            if response.will_close:
+                conn.close()
+                conn = None
+            if response.status >= 500:
+                errors.append(path)
+                continue
+        except (OSError, http.client.HTTPException):
+            errors.append(path)
+            if conn is not None:
+                conn.close()
+            conn = None
+            continue
+        latencies.append(time.perf_counter() - started)
+    if conn is not None:
+        conn.close()
+
+
+def run_workload(name, port, pid, redis, context, args, seconds):
+    kinds = list(GENERATORS) if name == "mixed" else [name]
+    per_client = []
+    threads = []
+    deadline = time.perf_counter() + seconds
+    for index in range(args.concurrency):
+        kind = kinds[index % len(kinds)]
+        rng = random.Random(f"{args.seed}:{name}:{index}")
+        latencies, errors = [], []
+        per_client.append((latencies, errors))
+        threads.append(threading.Thread(target=client, daemon=True,
+                                         args=(port, GENERATORS[kind](rng, context), deadline, latencies, errors)))
+
+    published_before = redis.stats()["published"]
+    cpu_before, _ = process_usage(pid)
+    sampler = RssSampler(pid)
+    sampler.start()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    peak = sampler.stop()
+    cpu_after, rss = process_usage(pid)
+
+    latencies = [latency for client_latencies, _ in per_client for latency in client_latencies]
+    errors = sum(len(client_errors) for _, client_errors in per_client)
+    cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+        "cpu_seconds": cpu,
+        "cpu_percent": cpu / elapsed * 100 if cpu is not None else None,
+        "cpu_ms_per_request": cpu * 1000 / len(latencies) if cpu is not None and latencies else None,
+        "rss_mb": rss / 2**20 if rss else None,
+        "peak_rss_mb": max(peak, rss or 0) / 2**20 if peak or rss else None,
+        "redis_publishes": redis.stats()["published"] - published_before,
+    }
+
+
+# Results
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Print each checked metric against the baseline; returns the regressions found"""
+    regressions = []
+    if baseline.get("meta", {}).get("config") != results["meta"]["config"]:
+        print("\nnote: the baseline was recorded with different options; compare like with like")
+    print(f"\n{'workload':<22} {'metric':<20} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, current in results["workloads"].items():
+        reference = baseline.get("workloads", {}).get(name)
+        if reference is None:
+            continue
+        for metric, higher_is_better in CHECKS:
+            old, new = reference.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            regressed = worse > tolerance
+            if metric == "p99_ms" and new - old < P99_SLACK_MS:
+                regressed = False
+            if regressed:
+                regressions.append(f"{name}.{metric}")
+            print(f"{name:<22} {metric:<20} {old:>10.2f} {new:>10.2f} {change:>+7.0%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=WORKLOADS)
+    parser.add_argument("--mode", choices=["threaded", "asyncio"], default="threaded")
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration of each workload")
+    parser.add_argument("--warmup", type=float, default=1.0, help="untimed seconds before each workload")
+    parser.add_argument("--concurrency", type=int, default=16, help="client connections per workload")
+    parser.add_argument("--patients", type=int, default=0, help="DATASET_PATIENTS for the server (0: built-in data)")
+    parser.add_argument("--seed", type=int, default=1337)
+    parser.add_argument("--rate-limit-mode", default="off", help="RATE_LIMIT_MODE for the server")
+    parser.add_argument("--redis-delay", type=float, default=0.0, help="seconds the fake Redis adds per command")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed fractional regression")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    redis = FakeRedis(delay=args.redis_delay).start()
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {key: value for key, value in vars(args).items()
+                       if key not in ("output", "baseline", "save_baseline", "workloads")},
+        },
+        "workloads": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        process, port = start_decoy(args, redis.port, workdir)
+        try:
+            context = discover(port)
+            print(f"{'workload':<22} {'req/s':>8} {'p50 ms':>7} {'p99 ms':>7} {'errors':>6} {'cpu %':>6} "
+                  f"{'peak MB':>8} {'publishes':>9}")
+            for name in args.workloads:
+                if args.warmup:
+                    run_workload(name, port, process.pid, redis, context, args, args.warmup)
+                result = results["workloads"][name] = run_workload(name, port, process.pid, redis, context, args,
+                                                                   args.seconds)
+                cpu = f"{result['cpu_percent']:.0f}" if result["cpu_percent"] is not None else "-"
+                peak = f"{result['peak_rss_mb']:.1f}" if result["peak_rss_mb"] is not None else "-"
+                print(f"{name:<22} {result['rps']:>8.0f} {result['p50_ms']:>7.2f} {result['p99_ms']:>7.2f} "
+                      f"{result['errors']:>6} {cpu:>6} {peak:>8} {result['redis_publishes']:>9}")
+        finally:
+            process.terminate()
+            process.wait(10)
+            redis.stop()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nresults written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    print(f"\nno regressions beyond {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
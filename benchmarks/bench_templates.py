@@ -0,0 +1,64 @@
+"""
+Micro-benchmark of per-request page render cost.
+
+Compares rebuilding each page with its ``render_*`` method and encoding it
+(the old path) against splicing the token into the cached template:
+
+    python benchmarks/bench_templates.py --iterations 20000
+"""
+import argparse
+import logging
+import timeit
+import uuid
+
+from common import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    import simple_server
+    from simple_server import HealthcareHandler, PAGE_CACHE, PATIENTS, DATASET
+    from utils.pagination import parse_page
+
+    handler = HealthcareHandler.__new__(HealthcareHandler)
+    token = str(uuid.uuid4())
+    patient_id = next(iter(PATIENTS))
+    pages = {name: parse_page({}, len(getattr(DATASET, name)))
+             for name in ("patients", "appointments", "prescriptions")}
+    error = '<div class="error">Invalid username or password. Please try again.</div>'
+
+    routes = [
+        ("/", "/", handler.render_homepage),
+        ("/login", ("/login", False), lambda t: handler.render_login_page(t)),
+        ("/login?error=1", ("/login", True), lambda t: handler.render_login_page(t, error)),
+        ("/dashboard", "/dashboard", handler.render_dashboard),
+        ("/patients", ("/patients", pages["patients"].key()), lambda t: handler.render_patients_page(t, pages["patients"])),
+        (f"/patient/{patient_id}", ("/patient", patient_id),
+         lambda t: handler.render_patient_details(patient_id, t)),
+        ("/appointments", ("/appointments", pages["appointments"].key()), lambda t: handler.render_appointments_page(t, pages["appointments"])),
+        ("/prescriptions", ("/prescriptions", pages["prescriptions"].key()), lambda t: handler.render_prescriptions_page(t, pages["prescriptions"])),
+        ("/admin", "/admin", handler.render_admin_page),
+        ("/backup", "/backup", handler.render_backup_page),
+    ]
+
+    print(f"{'route':<22} {'render us':>10} {'cached us':>10} {'speedup':>8}")
+    for route, key, build in routes:
+        # Sanity check: both paths must produce identical bytes
+        assert build(token).encode() == PAGE_CACHE.render(key, token, build), route
+
+        before = timeit.timeit(lambda: build(token).encode(), number=args.iterations)
+        after = timeit.timeit(lambda: PAGE_CACHE.render(key, token, build), number=args.iterations)
+        before_us = before / args.iterations * 1e6
+        after_us = after / args.iterations * 1e6
+        print(f"{route:<22} {before_us:>10.2f} {after_us:>10.2f} {before_us / after_us:>7.1f}x")
+
+    print(f"cache entries: {len(PAGE_CACHE)}, template builds: {PAGE_CACHE.builds}")
+    del simple_server
+
+
+if __name__ == "__main__":
+    main()
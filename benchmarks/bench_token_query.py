@@ -0,0 +1,92 @@
+"""
+Query latency benchmark for the honeytoken store's secondary indexes.
+
+Fills ``HoneytokenStore`` with crawl-shaped tokens created over a day,
+records accesses to a fraction of them from a pool of IPs, then times
+``query`` by context, IP, creation and access time range and combinations,
+alongside a full scan for comparison:
+
+    python benchmarks/bench_token_query.py --tokens 1000000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+import uuid
+
+from common import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+from utils.token_store import HoneytokenStore
+
+DAY = 24 * 60 * 60
+
+
+def build(tokens, accessed, ips, contexts):
+    rng = random.Random(7)
+    store = HoneytokenStore(capacity=tokens, ttl=2 * DAY, accessed_capacity=tokens, spill_path=None)
+    start = time.time() - DAY
+    ids = []
+    for i in range(tokens):
+        token_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        store.create(token_id, f"page_visit:/decoy/{rng.randrange(contexts)}", now=start + DAY * i / tokens)
+        ids.append(token_id)
+    for i in range(accessed):
+        store.record_access(rng.choice(ids), f"203.0.113.{rng.randrange(ips)}",
+                            now=start + DAY * (0.5 + 0.5 * i / accessed))
+    return store, start
+
+
+def full_scan(store, context):
+    """What a lookup costs without indexes: test every token"""
+    return [token_id for token_id, record in list(store._fresh.items()) + list(store._accessed.items())
+            if record.context == context]
+
+
+def timed(function, repeat=20):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=1000000)
+    parser.add_argument("--accessed", type=int, default=20000)
+    parser.add_argument("--ips", type=int, default=250)
+    parser.add_argument("--contexts", type=int, default=200)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    store, start = build(args.tokens, args.accessed, args.ips, args.contexts)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"built {len(store)} tokens in {time.perf_counter() - started:.1f}s, "
+          f"{memory / args.tokens:.0f} bytes/token including indexes")
+
+    hour = start + 12 * 60 * 60
+    queries = [
+        ("context (limit 100)", lambda: store.query(context="page_visit:/decoy/17")),
+        ("context (limit 1000)", lambda: store.query(context="page_visit:/decoy/17", limit=1000)),
+        ("ip", lambda: store.query(ip="203.0.113.42", limit=1000)),
+        ("created, 1 hour", lambda: store.query(created_after=hour, created_before=hour + 3600, limit=1000)),
+        ("accessed, 1 hour", lambda: store.query(accessed_after=hour + 6 * 3600,
+                                                 accessed_before=hour + 7 * 3600, limit=1000)),
+        ("context + created, 1 hour", lambda: store.query(context="page_visit:/decoy/17", created_after=hour,
+                                                          created_before=hour + 3600, limit=1000)),
+        ("context + ip", lambda: store.query(context="page_visit:/decoy/17", ip="203.0.113.42")),
+        ("no filter (limit 100)", lambda: store.query()),
+    ]
+    print(f"{'query':<28} {'ms':>8} {'matches':>8}")
+    for name, query in queries:
+        elapsed, (matches, truncated) = timed(query)
+        print(f"{name:<28} {elapsed:>8.2f} {len(matches):>7}{'+' if truncated else ' '}")
+    elapsed, matches = timed(lambda: full_scan(store, "page_visit:/decoy/17"), repeat=3)
+    print(f"{'full scan by context':<28} {elapsed:>8.2f} {len(matches):>7}")
+
+
+if __name__ == "__main__":
+    main()
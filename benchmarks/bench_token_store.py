@@ -0,0 +1,77 @@
+"""
+Memory benchmark for the honeytoken store.
+
+Fills the old per-token dict layout and ``HoneytokenStore`` with the same
+crawl-shaped tokens and reports traced memory per million tokens, plus the
+steady-state size of a bounded store after a crawl larger than its capacity:
+
+    python benchmarks/bench_token_store.py --tokens 200000
+"""
+import argparse
+import time
+import tracemalloc
+import uuid
+
+from common import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+from utils.token_store import HoneytokenStore
+
+PATHS = ["/", "/login", "/dashboard", "/patients", "/appointments", "/prescriptions",
+         "/admin", "/backup", "/api/patients", "/wp-login.php"]
+
+
+def contexts(count):
+    for i in range(count):
+        yield f"page_visit:{PATHS[i % len(PATHS)]}"
+
+
+def fill_dict(count):
+    tokens = {}
+    for context in contexts(count):
+        tokens[str(uuid.uuid4())] = {
+            "context": context,
+            "created_at": time.time(),
+            "accessed": False,
+            "access_count": 0,
+            "access_ips": []
+        }
+    return tokens
+
+
+def fill_store(count, capacity):
+    store = HoneytokenStore(capacity=capacity, spill_path=None)
+    for context in contexts(count):
+        store.create(str(uuid.uuid4()), context)
+    return store
+
+
+def measure(fill, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fill(*args)
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=200000)
+    parser.add_argument("--capacity", type=int, default=50000,
+                        help="capacity of the bounded store in the steady-state run")
+    args = parser.parse_args()
+    scale = 1000000 / args.tokens
+
+    _, dict_bytes, dict_time = measure(fill_dict, args.tokens)
+    _, store_bytes, store_time = measure(fill_store, args.tokens, args.tokens)
+    bounded, bounded_bytes, _ = measure(fill_store, args.tokens, args.capacity)
+
+    print(f"{'layout':<28} {'MiB per 1M tokens':>18} {'inserts/s':>12}")
+    print(f"{'dict per token':<28} {dict_bytes * scale / 2**20:>18.1f} {args.tokens / dict_time:>12.0f}")
+    print(f"{'HoneytokenStore':<28} {store_bytes * scale / 2**20:>18.1f} {args.tokens / store_time:>12.0f}")
+    print(f"bounded store (capacity {args.capacity}) after {args.tokens} tokens: "
+          f"{bounded_bytes / 2**20:.1f} MiB, {len(bounded)} live, stats={bounded.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run from the repository root and import the application from
+``app/`` the same way the container does (``python simple_server.py``).
+"""
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+# Load generators hit the server from one address; measure the server, not the rate limiter
+os.environ.setdefault("RATE_LIMIT_MODE", "off")
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def start_server(mode="threaded", **options):
+    """Start the decoy server on an ephemeral port in a background thread"""
+    from simple_server import HealthcareHandler
+    from utils.serving import make_server
+
+    server = make_server(mode, ("127.0.0.1", 0), HealthcareHandler, **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, server.server_address[1]
+
+
+def free_port():
+    """A local TCP port nothing is listening on"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server_process(options=(), env=None, cwd=None, timeout=120):
+    """
+    Run ``simple_server.py`` with extra command line ``options`` in its own
+    process on a free port; returns ``(process, port)`` once it accepts connections
+    """
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(APP_DIR, "simple_server.py"), "--port", str(port), *options],
+        cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"simple_server.py exited with {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("simple_server.py did not start listening")
+
+
+def stop_server(server):
+    server.shutdown()
+    server.server_close()
+
+
+def run_load(port, path, concurrency, requests_per_client, host="127.0.0.1", timeout=30):
+    """Fire requests from ``concurrency`` client threads and collect latencies"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(concurrency + 1)
+
+    def client():
+        local = []
+        failed = 0
+        start_barrier.wait()
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            try:
+                conn = http.client.HTTPConnection(host, port, timeout=timeout)
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                conn.close()
+                if response.status >= 500:
+                    failed += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                continue
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "path": path,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def buffered_request(handler_class, raw_request, client_address=("127.0.0.1", 40000)):
+    """Run one raw HTTP request through ``handler_class`` without sockets; returns the response bytes"""
+    import io
+
+    handler = handler_class.__new__(handler_class)
+    handler.server = None
+    handler.request = None
+    handler.client_address = client_address
+    handler.rfile = io.BytesIO(raw_request)
+    handler.wfile = io.BytesIO()
+    handler.close_connection = True
+    handler.log_message = lambda *args: None
+    handler.handle_one_request()
+    return handler.wfile.getvalue()
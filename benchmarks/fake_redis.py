@@ -0,0 +1,101 @@
+"""
+Minimal Redis stand-in for benchmarks.
+
+Speaks enough RESP over TCP for the decoy server's real Redis client: PING,
+PUBLISH and the handshake commands a client sends on connect are answered;
+every other command gets ``+OK``. Publishes are counted per channel, and an
+optional delay per command models a remote Redis:
+
+    python benchmarks/fake_redis.py --port 6379
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, host="127.0.0.1", delay=0.0):
+        self.delay = delay
+        self.commands = 0
+        self.published = {}
+        self._lock = threading.Lock()
+        super().__init__((host, port), _RespHandler)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-redis", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def record(self, command, args):
+        with self._lock:
+            self.commands += 1
+            if command == b"PUBLISH" and args:
+                channel = args[0].decode(errors="replace")
+                self.published[channel] = self.published.get(channel, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {"commands": self.commands, "published": sum(self.published.values())}
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                command = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if command is None:
+                return
+            name, args = command[0].upper(), command[1:]
+            self.server.record(name, args)
+            if self.server.delay:
+                time.sleep(self.server.delay)
+            if name == b"PING":
+                reply = b"+PONG\r\n"
+            elif name == b"PUBLISH":
+                reply = b":0\r\n"
+            else:
+                reply = b"+OK\r\n"
+            try:
+                self.wfile.write(reply)
+            except OSError:
+                return
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command, as typed into telnet
+            return line.split() or [b""]
+        parts = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            parts.append(self.rfile.read(length + 2)[:-2])
+        return parts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds added to every command")
+    args = parser.parse_args()
+    server = FakeRedis(args.port, delay=args.delay)
+    print(f"Fake Redis listening on 127.0.0.1:{server.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
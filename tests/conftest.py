@@ -0,0 +1,60 @@
+"""
+Tests import the application from ``app/`` the way the container runs it
+(``python simple_server.py``), so put that directory on sys.path.
+"""
+import io
+import logging
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+@pytest.fixture(scope="session")
+def server_module(tmp_path_factory):
+    """``simple_server``, imported with its log, spill and overflow files in a temporary directory"""
+    directory = tmp_path_factory.mktemp("server")
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("LOG_PATH", str(directory / "server.log"))
+        patch.setenv("LOG_MODE", "sync")
+        patch.setenv("ALERT_OVERFLOW_PATH", str(directory / "alerts_overflow.jsonl"))
+        patch.setenv("HONEYTOKEN_SPILL_PATH", "")
+        # Nothing listens there, so Redis fails fast instead of resolving "redis"
+        patch.setenv("REDIS_HOST", "127.0.0.1")
+        patch.setenv("REDIS_PORT", "1")
+        patch.delenv("EVENT_STORE_PATH", raising=False)
+        patch.delenv("HONEYTOKEN_MODE", raising=False)
+        import simple_server
+    # Its console handler holds the stream pytest was capturing; leave logging to pytest
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    for handler in handlers:
+        root.addHandler(handler)
+    # Background workers log between tests too; keep that off the terminal
+    root.addHandler(logging.NullHandler())
+    root.setLevel(level)
+    return simple_server
+
+
+@pytest.fixture
+def raw_request(server_module):
+    """Run one raw HTTP request through the handler without sockets; returns the response bytes"""
+    def run(raw, client_address=("127.0.0.1", 40000)):
+        handler = server_module.HealthcareHandler.__new__(server_module.HealthcareHandler)
+        handler.server = None
+        handler.request = None
+        handler.client_address = client_address
+        handler.rfile = io.BytesIO(raw)
+        handler.wfile = io.BytesIO()
+        handler.close_connection = True
+        handler.log_message = lambda *args: None
+        handler.handle_one_request()
+        return handler.wfile.getvalue()
+    return run
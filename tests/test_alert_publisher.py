@@ -0,0 +1,171 @@
+"""AlertPublisher batching, reconnect backoff, disk overflow and replay"""
+import json
+
+from utils.alert_publisher import AlertPublisher
+
+
+class FakeRedis:
+    """Records published messages; ``down`` fails pings and ``fail_after`` fails a later execute"""
+
+    def __init__(self, down=False, fail_after=None):
+        self.down = down
+        self.fail_after = fail_after
+        self.batches = []
+
+    @property
+    def published(self):
+        return [message for batch in self.batches for message in batch]
+
+    def ping(self):
+        if self.down:
+            raise ConnectionError("Connection refused")
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.messages = []
+
+    def publish(self, channel, payload):
+        self.messages.append((channel, json.loads(payload)))
+
+    def execute(self):
+        client = self.client
+        if client.down or client.fail_after == len(client.batches):
+            raise ConnectionError("Connection reset")
+        client.batches.append(self.messages)
+
+
+def make_publisher(client, **kwargs):
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return client
+
+    publisher = AlertPublisher(factory, channel="alerts", **kwargs)
+    publisher.factory_calls = calls
+    return publisher
+
+
+def payloads(count, start=0):
+    return [json.dumps({"n": n}) for n in range(start, start + count)]
+
+
+def test_events_are_published_in_batches():
+    client = FakeRedis()
+    publisher = make_publisher(client, batch_size=3)
+    publisher._flush(payloads(7))
+
+    assert [len(batch) for batch in client.batches] == [3, 3, 1]
+    assert client.published == [("alerts", {"n": n}) for n in range(7)]
+    assert publisher.stats()["published"] == 7
+
+
+def test_worker_flushes_queued_events_on_stop():
+    client = FakeRedis()
+    publisher = make_publisher(client, batch_size=4, flush_interval=0.05)
+    for n in range(10):
+        assert publisher.publish({"n": n})
+    publisher.stop()
+
+    assert [event["n"] for _, event in client.published] == list(range(10))
+    assert all(len(batch) <= 4 for batch in client.batches)
+    assert publisher.stats()["queue_depth"] == 0
+
+
+def test_reconnects_back_off_and_count_separately():
+    client = FakeRedis(down=True)
+    publisher = make_publisher(client, max_backoff=2.0)
+
+    assert publisher._connected_client() is None
+    assert publisher._connected_client() is None
+    # The second call fell inside the backoff window
+    assert len(publisher.factory_calls) == 1
+    backoffs = [publisher._backoff]
+    for _ in range(4):
+        publisher._next_attempt = 0.0
+        publisher._connected_client()
+        backoffs.append(publisher._backoff)
+    assert backoffs == [0.5, 1.0, 2.0, 2.0, 2.0]
+    assert (publisher.failed_connects, publisher.failed_batches) == (5, 0)
+
+    client.down = False
+    publisher._next_attempt = 0.0
+    assert publisher._connected_client() is client
+    assert publisher._backoff == 0.0
+    assert publisher.stats()["connected"]
+
+
+def test_failed_batches_spill_to_disk(tmp_path):
+    overflow = tmp_path / "overflow.jsonl"
+    client = FakeRedis(fail_after=1)
+    publisher = make_publisher(client, batch_size=2, overflow_path=str(overflow))
+    publisher._flush(payloads(5))
+
+    # The first batch made it out, the rest was spilled
+    assert client.published == [("alerts", {"n": 0}), ("alerts", {"n": 1})]
+    assert [json.loads(line)["n"] for line in overflow.read_text().splitlines()] == [2, 3, 4]
+    assert (publisher.failed_batches, publisher.failed_connects, publisher.spilled) == (1, 0, 3)
+
+    # While backing off nothing is attempted, and new events go straight to disk
+    publisher._flush(payloads(1, start=5))
+    assert len(overflow.read_text().splitlines()) == 4
+    assert publisher.failed_batches == 1
+
+
+def test_full_overflow_file_drops_events(tmp_path):
+    overflow = tmp_path / "overflow.jsonl"
+    publisher = make_publisher(FakeRedis(down=True), overflow_path=str(overflow), max_overflow_bytes=10)
+    publisher._flush(payloads(2))
+    publisher._flush(payloads(2))
+    assert (publisher.spilled, publisher.dropped) == (2, 2)
+
+    no_file = make_publisher(FakeRedis(down=True))
+    no_file._flush(payloads(3))
+    assert no_file.dropped == 3
+
+
+def test_overflow_is_replayed_in_batches_and_resumes_after_failure(tmp_path):
+    overflow = tmp_path / "overflow.jsonl"
+    overflow.write_text("\n".join(payloads(7)) + "\n\n")
+    client = FakeRedis(fail_after=1)
+    publisher = make_publisher(client, batch_size=3, overflow_path=str(overflow))
+
+    publisher._flush(payloads(1, start=7))
+    assert [len(batch) for batch in client.batches] == [3]
+    # The failed tail of the replay is still on disk, followed by the new event
+    assert publisher._replay_offset > 0
+    assert [json.loads(line)["n"] for line in overflow.read_text().splitlines() if line] == list(range(8))
+
+    client.fail_after = None
+    publisher._next_attempt = 0.0
+    publisher._flush(payloads(1, start=8))
+    assert [event["n"] for _, event in client.published] == list(range(9))
+    assert [len(batch) for batch in client.batches] == [3, 3, 2, 1]
+    assert not overflow.exists()
+    assert publisher._replay_offset == 0
+
+
+def test_outbox_replays_leftover_overflow_first(tmp_path):
+    overflow = tmp_path / "overflow.jsonl"
+    overflow.write_text("\n".join(payloads(2)) + "\n")
+
+    class Store:
+        def __init__(self):
+            self.rows = [(1, json.dumps({"n": 2}))]
+
+        def pending(self, limit):
+            return self.rows[:limit]
+
+        def mark_delivered(self, ids):
+            self.rows = [row for row in self.rows if row[0] not in ids]
+
+    client = FakeRedis()
+    publisher = make_publisher(client, overflow_path=str(overflow), event_store=Store())
+    publisher._deliver_stored()
+    assert [event["n"] for _, event in client.published] == [0, 1, 2]
+    assert not overflow.exists()
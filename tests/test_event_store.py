@@ -0,0 +1,143 @@
+"""EventStore queries and compaction, and at-least-once delivery through the alert outbox"""
+import json
+
+import pytest
+
+from utils.alert_publisher import AlertPublisher
+from utils.event_store import EventStore, replay
+
+
+class Crash(Exception):
+    pass
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.messages = []
+
+    def publish(self, channel, payload):
+        self.messages.append((channel, payload))
+
+    def execute(self):
+        if self.client.down:
+            raise ConnectionError("redis is down")
+        self.client.published.extend(self.messages)
+
+
+class FakeRedis:
+    """Just enough of a redis client for AlertPublisher"""
+
+    def __init__(self):
+        self.down = False
+        self.published = []
+
+    def ping(self):
+        if self.down:
+            raise ConnectionError("redis is down")
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def events(self):
+        return [json.loads(payload)["n"] for _, payload in self.published]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EventStore(str(tmp_path / "events.db"), flush_interval=0.01, compact_interval=3600)
+    yield store
+    store.stop()
+
+
+def record_all(store, events, pending=False):
+    for event in events:
+        assert store.record(event, pending=pending)
+    store.flush()
+
+
+def test_query_filters_newest_first(store):
+    record_all(store, [
+        {"event_type": "honeytoken_access", "token_id": "t1", "ip_address": "10.0.0.1"},
+        {"event_type": "honeytoken_access", "token_id": "t2", "ip_address": "10.0.0.2"},
+        {"event_type": "login_attempt", "ip_address": "10.0.0.1"},
+    ])
+
+    events, truncated = store.query(ip="10.0.0.1")
+    assert [event["event_type"] for event in events] == ["login_attempt", "honeytoken_access"]
+    assert not truncated
+    assert [event["token_id"] for event in store.query(event_type="honeytoken_access")[0]] == ["t2", "t1"]
+    events, truncated = store.query(limit=2)
+    assert len(events) == 2 and truncated
+    assert store.stats()["written"] == 3
+
+
+def test_compact_keeps_pending_events(store):
+    record_all(store, [{"event_type": "history"}])
+    record_all(store, [{"event_type": "alert"}], pending=True)
+
+    assert store.compact(now=store.query()[0][0]["recorded_at"] + store.retention + 1) == 1
+    assert [event["event_type"] for event in store.query()[0]] == ["alert"]
+    assert store.stats()["pending"] == 1
+
+
+def test_replay_sends_stored_events_in_order(store):
+    record_all(store, [{"event_type": "alert", "n": n} for n in range(5)])
+    sent = []
+    assert replay(store, sent.extend, event_type="alert") == 5
+    assert [json.loads(payload)["n"] for payload in sent] == list(range(5))
+
+
+def test_outbox_holds_events_while_redis_is_down(store):
+    redis = FakeRedis()
+    redis.down = True
+    publisher = AlertPublisher(lambda: redis, batch_size=2, event_store=store)
+    record_all(store, [{"n": n} for n in range(5)], pending=True)
+
+    publisher._deliver_stored()
+    assert redis.published == []
+    assert store.stats()["pending"] == 5
+
+    redis.down = False
+    publisher._next_attempt = 0.0
+    publisher._deliver_stored()
+    assert redis.events() == list(range(5))
+    assert store.stats()["pending"] == 0
+
+
+def test_outbox_resends_a_batch_published_but_not_marked(tmp_path):
+    """A crash between publishing and marking delivered resends that batch, never loses it"""
+    path = str(tmp_path / "events.db")
+    redis = FakeRedis()
+    first = EventStore(path)
+    record_all(first, [{"n": n} for n in range(4)], pending=True)
+    first.stop()
+
+    # The first process publishes but dies before marking anything delivered
+    def crash(ids):
+        raise Crash()
+
+    crashed = EventStore(path)
+    crashed.mark_delivered = crash
+    with pytest.raises(Crash):
+        AlertPublisher(lambda: redis, batch_size=10, event_store=crashed)._deliver_stored()
+    assert redis.events() == [0, 1, 2, 3]
+
+    restarted = EventStore(path)
+    assert restarted.stats()["pending"] == 4
+    AlertPublisher(lambda: redis, batch_size=10, event_store=restarted)._deliver_stored()
+    assert redis.events() == [0, 1, 2, 3, 0, 1, 2, 3]
+    assert restarted.stats()["pending"] == 0
+
+
+def test_publish_through_outbox_thread(store):
+    redis = FakeRedis()
+    publisher = AlertPublisher(lambda: redis, batch_size=3, flush_interval=0.01, event_store=store)
+    for n in range(10):
+        assert publisher.publish({"event_type": "alert", "n": n})
+    store.flush()
+    publisher.stop()
+
+    assert redis.events() == list(range(10))
+    assert store.stats()["pending"] == 0
+    assert publisher.stats()["published"] == 10
@@ -0,0 +1,88 @@
+"""Per-thread metric shards and their Prometheus text rendering"""
+import threading
+import urllib.request
+
+from utils.metrics import MetricsRegistry, serve_metrics
+
+
+def test_counter_sums_thread_shards():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+
+    def worker():
+        for _ in range(1000):
+            requests.inc("/")
+        requests.inc("/login", amount=5)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert requests.values() == {("/",): 8000, ("/login",): 40}
+    text = registry.render().decode()
+    assert 'requests_total{route="/"} 8000' in text
+    assert "# TYPE requests_total counter" in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value, "/")
+
+    lines = registry.render().decode().splitlines()
+    assert 'latency_seconds_bucket{route="/",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{route="/",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/"} 4' in lines
+    assert 'latency_seconds_sum{route="/"} 2.65' in lines
+
+
+def test_timed_observes_even_when_the_call_raises():
+    latency = MetricsRegistry().histogram("calls_seconds", "Calls")
+
+    def fail():
+        raise RuntimeError("boom")
+
+    timed = latency.timed(fail)
+    try:
+        timed()
+    except RuntimeError:
+        pass
+    assert sum(latency.values()[()][:-1]) == 1
+
+
+def test_gauges_are_read_at_scrape_time_and_survive_errors():
+    registry = MetricsRegistry()
+    depth = [3]
+    registry.gauge("queue_depth", "Queue depth", lambda: depth[0])
+    registry.gauge("cache_entries", "Cache entries", lambda: {("page",): 2, ("api",): 1}, ("cache",))
+    registry.gauge("broken", "Raises", lambda: 1 / 0)
+
+    depth[0] = 7
+    text = registry.render().decode()
+    assert "queue_depth 7.0" in text
+    assert 'cache_entries{cache="api"} 1.0' in text
+    assert "# TYPE broken gauge" in text
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("paths_total", "Paths", ("path",)).inc('/a"b\\c\nd')
+    assert 'paths_total{path="/a\\"b\\\\c\\nd"} 1' in registry.render().decode()
+
+
+def test_serve_metrics_on_its_own_port():
+    registry = MetricsRegistry()
+    registry.counter("hits_total", "Hits").inc()
+    server = serve_metrics(registry, 0, host="127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert b"hits_total 1" in response.read()
+    finally:
+        server.shutdown()
+        server.server_close()
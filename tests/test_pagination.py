@@ -0,0 +1,109 @@
+"""Page ranges from query parameters, cursors and chunked JSON arrays"""
+import json
+
+import pytest
+
+from utils.pagination import (DEFAULT_LIMIT, MAX_PAGE_LIMIT, Page, decode_cursor, encode_cursor,
+                              json_array_chunks, parse_page)
+
+
+def test_defaults_to_the_first_page():
+    page = parse_page({}, total=120)
+    assert (page.start, page.stop, page.limit) == (0, DEFAULT_LIMIT, DEFAULT_LIMIT)
+    assert page.number == 1 and page.pages == 3
+    assert page.next_cursor == encode_cursor(DEFAULT_LIMIT)
+
+
+def test_page_and_limit():
+    page = parse_page({"page": ["3"], "limit": ["20"]}, total=55)
+    assert (page.start, page.stop) == (40, 55)
+    assert page.number == 3 and page.pages == 3
+    assert page.next_cursor is None
+
+
+def test_cursor_overrides_page():
+    page = parse_page({"cursor": [encode_cursor(70)], "page": ["1"], "limit": ["10"]}, total=100)
+    assert (page.start, page.stop) == (70, 80)
+    assert decode_cursor(page.next_cursor) == 80
+
+
+def test_no_default_limit_means_the_whole_collection():
+    page = parse_page({}, total=12345, default_limit=None)
+    assert (page.start, page.stop, page.limit) == (0, 12345, None)
+    assert page.pages == 1 and page.next_cursor is None
+
+    # Paging without a limit still falls back to the default page size
+    page = parse_page({"page": ["2"]}, total=12345, default_limit=None)
+    assert (page.start, page.limit) == (DEFAULT_LIMIT, DEFAULT_LIMIT)
+
+
+@pytest.mark.parametrize("query", [
+    {"page": ["0"]},
+    {"page": ["-1"]},
+    {"page": ["two"]},
+    {"limit": ["0"]},
+    {"limit": ["1.5"]},
+    {"limit": [str(MAX_PAGE_LIMIT + 1)]},
+    {"cursor": ["!!!"]},
+])
+def test_malformed_parameters_are_rejected(query):
+    with pytest.raises(ValueError):
+        parse_page(query, total=100)
+
+
+def test_limit_up_to_the_maximum_is_accepted():
+    assert parse_page({"limit": [str(MAX_PAGE_LIMIT)]}, total=10).limit == MAX_PAGE_LIMIT
+    assert parse_page({"limit": ["5000"]}, total=10, max_limit=10000).limit == 5000
+
+
+@pytest.mark.parametrize("offset", [0, 1, 49, 10 ** 9])
+def test_cursor_round_trip(offset):
+    cursor = encode_cursor(offset)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == offset
+
+
+@pytest.mark.parametrize("cursor", ["", "by0x", encode_cursor(5)[:-1] + "$", "eDEw", "b-1", "é"])
+def test_invalid_cursors(cursor):
+    # "by0x" is "o-1" and "eDEw" is "x10": neither decodes to an offset
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_canonical_pages_are_aligned_default_pages():
+    assert Page(0, DEFAULT_LIMIT, 500).is_canonical()
+    assert Page(2 * DEFAULT_LIMIT, DEFAULT_LIMIT, 500).is_canonical()
+    assert Page(0, None, 500).is_canonical()
+    assert not Page(7, DEFAULT_LIMIT, 500).is_canonical()
+    assert not Page(0, 20, 500).is_canonical()
+    assert Page(40, 20, 500).is_canonical(default_limit=20)
+
+
+def test_page_key_distinguishes_ranges():
+    assert Page(0, 10, 100).key() == Page(0, 10, 200).key()
+    assert Page(0, 10, 100).key() != Page(10, 10, 100).key()
+
+
+@pytest.mark.parametrize("count", [0, 1, 3, 4, 9])
+def test_json_array_chunks_join_to_valid_json(count):
+    rows = [{"id": i, "name": f"patient {i}"} for i in range(count)]
+    chunks = list(json_array_chunks(iter(rows), batch_rows=3))
+
+    assert json.loads(b"".join(chunks)) == rows
+    assert chunks[0] == b"[" and chunks[-1] == b"]"
+    # One chunk per started batch between the brackets
+    assert len(chunks) == 2 + -(-count // 3)
+
+
+def test_json_array_chunks_are_lazy():
+    consumed = []
+
+    def rows():
+        for i in range(10):
+            consumed.append(i)
+            yield i
+
+    chunks = json_array_chunks(rows(), batch_rows=2)
+    assert next(chunks) == b"["
+    assert next(chunks) == b"0,1"
+    assert consumed == [0, 1]
@@ -0,0 +1,116 @@
+"""Token buckets, the per-IP and per-route policy, and where the server checks it"""
+import pytest
+
+from utils.rate_limit import RateLimiter, RateLimitPolicy, rate_limits_from_env
+
+
+def test_bucket_allows_a_burst_then_refills_at_rate():
+    limiter = RateLimiter()
+    assert [limiter.allow("ip", rate=2.0, burst=3.0, now=0.0) for _ in range(4)] == [True, True, True, False]
+    # Half a token after 0.25 s, one after 0.5 s
+    assert not limiter.allow("ip", rate=2.0, burst=3.0, now=0.25)
+    assert limiter.allow("ip", rate=2.0, burst=3.0, now=0.5)
+    assert not limiter.allow("ip", rate=2.0, burst=3.0, now=0.5)
+
+
+def test_refill_is_capped_at_the_burst():
+    limiter = RateLimiter()
+    for _ in range(3):
+        limiter.allow("ip", rate=1.0, burst=3.0, now=0.0)
+    allowed = [limiter.allow("ip", rate=1.0, burst=3.0, now=1000.0) for _ in range(5)]
+    assert allowed == [True, True, True, False, False]
+
+
+def test_keys_have_separate_buckets():
+    limiter = RateLimiter()
+    assert limiter.allow("a", rate=1.0, burst=1.0, now=0.0)
+    assert not limiter.allow("a", rate=1.0, burst=1.0, now=0.0)
+    assert limiter.allow("b", rate=1.0, burst=1.0, now=0.0)
+
+
+def test_least_recently_used_buckets_are_forgotten():
+    limiter = RateLimiter(capacity=2, shards=1)
+    for key in ("a", "b"):
+        limiter.allow(key, rate=0.0, burst=1.0, now=0.0)
+    assert not limiter.allow("a", rate=0.0, burst=1.0, now=0.0)
+    limiter.allow("c", rate=0.0, burst=1.0, now=0.0)
+
+    assert len(limiter) == 2
+    # "b" was the least recently used, so it starts full again
+    assert limiter.allow("b", rate=0.0, burst=1.0, now=0.0)
+    assert not limiter.allow("c", rate=0.0, burst=1.0, now=0.0)
+
+
+def test_route_limit_is_per_ip_and_route():
+    policy = RateLimitPolicy(ip_rate=0.0, ip_burst=100.0, route_rate=0.0, route_burst=2.0)
+    assert [policy.allow("10.0.0.1", "serve_patients", now=0.0) for _ in range(3)] == [True, True, False]
+    assert policy.allow("10.0.0.1", "serve_homepage", now=0.0)
+    assert policy.allow("10.0.0.2", "serve_patients", now=0.0)
+    assert policy.limited == 1
+
+
+def test_ip_limit_spans_routes():
+    policy = RateLimitPolicy(ip_rate=1.0, ip_burst=3.0, route_rate=0.0, route_burst=100.0)
+    allowed = [policy.allow("10.0.0.1", f"route{i}", now=0.0) for i in range(4)]
+    assert allowed == [True, True, True, False]
+    assert policy.allow("10.0.0.2", "route0", now=0.0)
+    assert policy.allow("10.0.0.1", "route9", now=1.0)
+
+
+def test_login_route_has_its_own_limit(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_MODE", "tarpit")
+    monkeypatch.setenv("RATE_LIMIT_LOGIN_RATE", "0.5")
+    monkeypatch.setenv("RATE_LIMIT_LOGIN_BURST", "2")
+    monkeypatch.setenv("RATE_LIMIT_ROUTE_BURST", "5")
+    policy = rate_limits_from_env("handle_login")
+    assert policy.mode == "tarpit"
+
+    assert [policy.allow("10.0.0.1", "handle_login", now=0.0) for _ in range(3)] == [True, True, False]
+    assert policy.allow("10.0.0.1", "handle_login", now=2.0)
+    assert [policy.allow("10.0.0.1", "serve_login", now=2.0) for _ in range(6)] == [True] * 5 + [False]
+
+
+def test_off_mode_allows_everything():
+    policy = RateLimitPolicy(mode="off", ip_rate=0.0, ip_burst=0.0)
+    assert all(policy.allow("10.0.0.1", "route", now=0.0) for _ in range(100))
+    assert policy.limited == 0
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        RateLimitPolicy(mode="block")
+
+
+def status(response):
+    return int(response.split(b" ", 2)[1])
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append(name)
+
+
+def test_rate_limited_requests_mint_and_record_nothing(server_module, raw_request, monkeypatch):
+    minted = []
+    sessions = Recorder()
+    monkeypatch.setattr(server_module, "RATE_LIMITS", RateLimitPolicy(ip_rate=0.0, ip_burst=1.0))
+    monkeypatch.setattr(server_module, "SESSIONS", sessions)
+    monkeypatch.setattr(server_module, "generate_honeytoken", lambda context: minted.append(context) or "token")
+
+    first = raw_request(b"GET / HTTP/1.1\r\nHost: x\r\n\r\n", ("10.9.9.9", 1))
+    assert status(first) == 200
+    assert minted == ["page_visit:/"]
+    assert sessions.calls == ["record_request"]
+
+    second = raw_request(b"GET / HTTP/1.1\r\nHost: x\r\n\r\n", ("10.9.9.9", 2))
+    assert status(second) == 429
+    assert b"Retry-After: 1" in second
+    assert minted == ["page_visit:/"]
+    assert sessions.calls == ["record_request"]
+    assert server_module.RATE_LIMITS.limited == 1
+
+    # Other clients are unaffected
+    assert status(raw_request(b"GET / HTTP/1.1\r\nHost: x\r\n\r\n", ("10.9.9.8", 1))) == 200
@@ -0,0 +1,158 @@
+"""The batch seeding and access APIs leave Redis exactly as the one-token calls do"""
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+
+redis = pytest.importorskip("redis")
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from utils import honeytoken_manager, redis_pool  # noqa: E402
+from utils.honeytoken_manager import (  # noqa: E402
+    RedisTokenStore, check_honeytoken_access, generate_honeytoken, generate_honeytokens, record_accesses,
+    store_honeytoken, store_honeytokens)
+
+NOW = datetime(2024, 5, 6, 7, 8, 9)
+CREATED = datetime(2024, 5, 1, 12, 0, 0).timestamp()
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return NOW
+
+
+@pytest.fixture
+def use(monkeypatch):
+    """Point the module at a fresh fakeredis; returns the client"""
+    monkeypatch.setattr(honeytoken_manager, "datetime", FrozenDatetime)
+    monkeypatch.setattr(redis_pool, "_available", None)
+
+    def use():
+        client = fakeredis.FakeRedis()
+        monkeypatch.setattr(redis_pool, "_client", client)
+        monkeypatch.setattr(honeytoken_manager, "_record_access_script", None)
+        monkeypatch.setattr(honeytoken_manager, "_create_token_script", None)
+        return client
+
+    return use
+
+
+def redis_state(client):
+    """Every key's type, value and whether it expires"""
+    state = {}
+    for key in client.scan_iter():
+        kind = client.type(key).decode()
+        if kind == "hash":
+            value = client.hgetall(key)
+        elif kind == "set":
+            value = client.smembers(key)
+        elif kind == "zset":
+            value = client.zrange(key, 0, -1, withscores=True)
+        else:
+            value = client.get(key)
+        state[key.decode()] = (kind, value, client.ttl(key) > 0)
+    return state
+
+
+TOKENS = [("t1", "page_visit:/", CREATED), ("t2", "page_visit:/", CREATED + 1),
+          ("t3", "api:/patients", CREATED + 2), ("t4", "login", None), ("t5", "page_visit:/", CREATED + 4)]
+
+
+@pytest.mark.parametrize("ttl", [None, 60])
+def test_store_honeytokens_matches_store_honeytoken(use, ttl):
+    single = use()
+    for token_id, context, created in TOKENS:
+        store_honeytoken(token_id, context, created, ttl)
+
+    batch = use()
+    assert store_honeytokens(iter(TOKENS), ttl, batch_size=2) == len(TOKENS)
+
+    assert redis_state(batch) == redis_state(single)
+    assert len(redis_state(batch)) == (len(TOKENS) if ttl else len(TOKENS) + 4)
+
+
+def test_generate_honeytokens_matches_generate_honeytoken(use, monkeypatch):
+    contexts = ["page_visit:/", "page_visit:/admin", "page_visit:/"]
+
+    def fixed_uuids():
+        ids = iter(uuid.UUID(int=i) for i in range(1, 10))
+        monkeypatch.setattr(honeytoken_manager.uuid, "uuid4", lambda: next(ids))
+
+    single = use()
+    fixed_uuids()
+    single_ids = [generate_honeytoken(context) for context in contexts]
+
+    batch = use()
+    fixed_uuids()
+    assert generate_honeytokens(contexts, batch_size=2) == single_ids
+    assert redis_state(batch) == redis_state(single)
+
+
+def seed(ttl):
+    store_honeytokens([("t1", "page_visit:/", CREATED), ("t2", "api:/patients", CREATED)], ttl)
+    redis_pool._client.set("honeytoken:old", str({
+        "context": "legacy", "created_at": datetime.fromtimestamp(CREATED).isoformat(),
+        "accessed": False, "access_count": 0, "access_ips": []}))
+
+
+EVENTS = [("t1", "10.0.0.1"), ("t1", "10.0.0.1"), ("t2", "10.0.0.2"), ("missing", "10.0.0.1"),
+          ("old", "10.0.0.3"), ("t1", "10.0.0.2"), ("old", "10.0.0.3")]
+
+
+def snapshot(access):
+    if access is None:
+        return None
+    return access.context, access.access_count, access.last_accessed, access.new_ip
+
+
+@pytest.mark.parametrize("batch_size", [1, 3, 100])
+@pytest.mark.parametrize("ttl", [None, 60])
+def test_record_accesses_matches_record_access(use, ttl, batch_size):
+    single = use()
+    seed(ttl)
+    store = RedisTokenStore(ttl=ttl)
+    expected = [snapshot(store.record_access(token_id, ip, NOW.timestamp())) for token_id, ip in EVENTS]
+
+    batch = use()
+    seed(ttl)
+    snapshots = [snapshot(access) for access in record_accesses(iter(EVENTS), publish=False,
+                                                                batch_size=batch_size)]
+
+    assert snapshots == expected
+    assert expected[:3] == [("page_visit:/", 1, NOW.timestamp(), True), ("page_visit:/", 2, NOW.timestamp(), False),
+                            ("api:/patients", 1, NOW.timestamp(), True)]
+    assert expected[3] is None
+    # Accessed tokens are indexed (by context too, even when seeded with a TTL) and kept
+    state = redis_state(batch)
+    assert state == redis_state(single)
+    assert "honeytoken:index:context:page_visit:/" in state
+    assert not state["honeytoken:t1"][2]
+
+
+def test_record_accesses_publishes_the_same_alerts(use):
+    def alerts(client, record):
+        subscriber = client.pubsub()
+        subscriber.subscribe("security_alerts")
+        record()
+        messages = []
+        while True:
+            message = subscriber.get_message()
+            if message is None:
+                break
+            if message["type"] == "message":
+                messages.append(json.loads(message["data"]))
+        subscriber.close()
+        return messages
+
+    single = use()
+    seed(None)
+    expected = alerts(single, lambda: [check_honeytoken_access(token_id, ip) for token_id, ip in EVENTS])
+
+    batch = use()
+    seed(None)
+    assert alerts(batch, lambda: record_accesses(EVENTS, batch_size=3)) == expected
+    assert len(expected) == len(EVENTS) - 1
+    assert expected[0]["timestamp"] == NOW.isoformat()
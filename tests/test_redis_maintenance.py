@@ -0,0 +1,166 @@
+"""Legacy token migration, reindexing and pruning against fakeredis"""
+from datetime import datetime
+
+import pytest
+
+redis = pytest.importorskip("redis")
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from utils import honeytoken_manager, redis_pool  # noqa: E402
+from utils.honeytoken_manager import (  # noqa: E402
+    ACCESSED_INDEX_KEY, CONTEXT_INDEX_KEY, CREATED_INDEX_KEY, IP_INDEX_KEY, migrate_legacy_tokens, migrate_token,
+    prune_indexes, reindex_tokens)
+
+CREATED = datetime(2024, 1, 2, 3, 4, 5)
+ACCESSED = datetime(2024, 1, 3, 0, 0, 0)
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def client(server, monkeypatch):
+    client = fakeredis.FakeRedis(server=server)
+    monkeypatch.setattr(redis_pool, "_client", client)
+    monkeypatch.setattr(redis_pool, "_available", None)
+    monkeypatch.setattr(honeytoken_manager, "_record_access_script", None)
+    monkeypatch.setattr(honeytoken_manager, "_create_token_script", None)
+    return client
+
+
+def legacy(context, access_count=0, ips=()):
+    token = {"context": context, "created_at": CREATED.isoformat(), "accessed": access_count > 0,
+             "access_count": access_count, "access_ips": list(ips)}
+    if access_count:
+        token["last_accessed"] = ACCESSED.isoformat()
+    return str(token)
+
+
+def indexes(client):
+    """Every index zset as ``{key: {member: score}}``"""
+    return {key.decode(): dict(client.zrange(key, 0, -1, withscores=True))
+            for key in client.scan_iter(match="honeytoken:index:*")}
+
+
+def test_migrate_converts_a_legacy_string(client):
+    client.set("honeytoken:old", legacy("page_visit:/admin", access_count=2, ips=["10.0.0.1", "10.0.0.2"]))
+
+    assert migrate_token("old")
+    assert client.type("honeytoken:old") == b"hash"
+    assert client.hgetall("honeytoken:old") == {
+        b"context": b"page_visit:/admin", b"created_at": CREATED.isoformat().encode(), b"accessed": b"1",
+        b"access_count": b"2", b"last_accessed": ACCESSED.isoformat().encode()}
+    assert client.smembers("honeytoken:old:ips") == {b"10.0.0.1", b"10.0.0.2"}
+
+    created, accessed = CREATED.timestamp(), ACCESSED.timestamp()
+    assert indexes(client) == {
+        CREATED_INDEX_KEY: {b"old": created},
+        CONTEXT_INDEX_KEY.format("page_visit:/admin"): {b"old": created},
+        ACCESSED_INDEX_KEY: {b"old": accessed},
+        IP_INDEX_KEY.format("10.0.0.1"): {b"old": accessed},
+        IP_INDEX_KEY.format("10.0.0.2"): {b"old": accessed},
+    }
+
+
+def test_migrate_leaves_hashes_and_reports_missing_tokens(client):
+    client.hset("honeytoken:new", mapping={"context": "x", "access_count": 0})
+    assert migrate_token("new")
+    assert migrate_token("missing") is False
+    assert client.hgetall("honeytoken:new") == {b"context": b"x", b"access_count": b"0"}
+
+
+@pytest.mark.parametrize("raw", [b"not a dict", b"['a list']", b"__import__('os')"])
+def test_unparseable_legacy_value_is_left_alone(client, raw):
+    client.set("honeytoken:bad", raw)
+    assert migrate_token("bad") is False
+    assert client.get("honeytoken:bad") == raw
+    assert indexes(client) == {}
+
+
+def test_migrate_retries_when_the_token_changes_under_it(client, server, monkeypatch):
+    other = fakeredis.FakeRedis(server=server)
+    client.set("honeytoken:raced", legacy("page_visit:/login"))
+    parse = honeytoken_manager._parse_legacy
+    calls = []
+
+    def parse_while_an_old_worker_writes(raw):
+        calls.append(raw)
+        if len(calls) == 1:
+            # An old version records an access between WATCH and EXEC
+            other.set("honeytoken:raced", legacy("page_visit:/login", access_count=1, ips=["10.0.0.9"]))
+        return parse(raw)
+
+    monkeypatch.setattr(honeytoken_manager, "_parse_legacy", parse_while_an_old_worker_writes)
+
+    assert migrate_token("raced")
+    assert len(calls) == 2
+    # The second attempt converted the newer value, access included
+    assert client.hget("honeytoken:raced", "access_count") == b"1"
+    assert client.smembers("honeytoken:raced:ips") == {b"10.0.0.9"}
+    assert IP_INDEX_KEY.format("10.0.0.9") in indexes(client)
+
+
+def test_migrate_stops_when_another_worker_converted_it(client, server, monkeypatch):
+    other = fakeredis.FakeRedis(server=server)
+    client.set("honeytoken:raced", legacy("page_visit:/login"))
+    parse = honeytoken_manager._parse_legacy
+
+    def parse_while_another_worker_migrates(raw):
+        other.delete("honeytoken:raced")
+        other.hset("honeytoken:raced", mapping={"context": "page_visit:/login", "access_count": 5})
+        monkeypatch.setattr(honeytoken_manager, "_parse_legacy", parse)
+        return parse(raw)
+
+    monkeypatch.setattr(honeytoken_manager, "_parse_legacy", parse_while_another_worker_migrates)
+
+    assert migrate_token("raced")
+    assert client.hget("honeytoken:raced", "access_count") == b"5"
+
+
+def test_migrate_legacy_tokens_converts_only_strings(client):
+    for token_id in ("a", "b", "c"):
+        client.set(f"honeytoken:{token_id}", legacy(f"ctx:{token_id}"))
+    client.hset("honeytoken:d", mapping={"context": "ctx:d"})
+    client.set("honeytoken:broken", b"{")
+
+    assert migrate_legacy_tokens(batch_size=2) == 3
+    assert all(client.type(f"honeytoken:{token_id}") == b"hash" for token_id in "abcd")
+    assert client.type("honeytoken:broken") == b"string"
+
+
+def test_reindex_rebuilds_dropped_indexes(client):
+    for token_id, count in (("a", 0), ("b", 1), ("c", 3)):
+        client.set(f"honeytoken:{token_id}", legacy(f"ctx:{token_id}", access_count=count,
+                                                       ips=[f"10.0.0.{i}" for i in range(count)]))
+        migrate_token(token_id)
+    before = indexes(client)
+    for key in before:
+        client.delete(key)
+
+    assert reindex_tokens(batch_size=2) == 3
+    assert indexes(client) == before
+
+
+def test_reindex_keeps_recorded_ip_access_times(client):
+    client.set("honeytoken:t", legacy("ctx", access_count=1, ips=["10.0.0.1"]))
+    migrate_token("t")
+    client.zadd(IP_INDEX_KEY.format("10.0.0.1"), {"t": 1.0}, xx=True)
+
+    reindex_tokens()
+    assert client.zscore(IP_INDEX_KEY.format("10.0.0.1"), "t") == 1.0
+
+
+def test_prune_drops_entries_of_expired_tokens(client):
+    for token_id in ("live", "gone1", "gone2"):
+        client.set(f"honeytoken:{token_id}", legacy("ctx:shared"))
+        migrate_token(token_id)
+    client.delete("honeytoken:gone1", "honeytoken:gone2")
+
+    # Two entries each in the created and context indexes
+    assert prune_indexes(batch_size=1) == 4
+    assert client.zrange(CREATED_INDEX_KEY, 0, -1) == [b"live"]
+    assert client.zrange(CONTEXT_INDEX_KEY.format("ctx:shared"), 0, -1) == [b"live"]
+    assert prune_indexes() == 0
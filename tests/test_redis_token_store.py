@@ -0,0 +1,113 @@
+"""RedisTokenStore against fakeredis: first use after start, outages and index entries"""
+import time
+
+import pytest
+
+redis = pytest.importorskip("redis")
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from utils import honeytoken_manager, redis_pool  # noqa: E402
+from utils.honeytoken_manager import CONTEXT_INDEX_KEY, CREATED_INDEX_KEY, RedisTokenStore  # noqa: E402
+
+
+class BrokenRedis:
+    """A client whose every command fails as if Redis were down"""
+
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise redis.ConnectionError("Connection refused")
+        return fail
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(redis_pool, "_client", client)
+    # As just after start or fork: the health check has not pinged yet
+    monkeypatch.setattr(redis_pool, "_available", None)
+    monkeypatch.setattr(honeytoken_manager, "_record_access_script", None)
+    monkeypatch.setattr(honeytoken_manager, "_create_token_script", None)
+    return client
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_first_calls_reach_redis_before_the_health_check(client):
+    store = RedisTokenStore(ttl=60)
+    store.create("t1", "page_visit:/patients")
+    wait_for(lambda: client.exists("honeytoken:t1"))
+
+    snapshot = store.record_access("t1", "10.0.0.1")
+    assert snapshot.access_count == 1
+    assert client.hget("honeytoken:t1", "access_count") == b"1"
+    assert store.stats()["local_accesses"] == 0
+    assert store.stats()["unsynced"] == 0
+
+
+def test_access_before_the_writer_flushes_is_counted_in_redis(client):
+    store = RedisTokenStore(ttl=60, queue_size=1)
+    store.create("queued", "page_visit:/admin")
+
+    assert store.record_access("queued", "10.0.0.1").access_count == 1
+    assert client.hget("honeytoken:queued", "context") == b"page_visit:/admin"
+
+
+def test_outage_falls_back_to_the_local_store(client, monkeypatch):
+    store = RedisTokenStore(ttl=60, retry_interval=60)
+    store.create("t1", "page_visit:/")
+    wait_for(lambda: client.exists("honeytoken:t1"))
+
+    monkeypatch.setattr(redis_pool, "_client", BrokenRedis())
+    monkeypatch.setattr(honeytoken_manager, "_record_access_script", None)
+    assert store.record_access("t1", "10.0.0.1").access_count == 1
+    assert store.record_access("t1", "10.0.0.2").access_count == 2
+    assert store.get("t1").access_count == 2
+    assert store.stats()["local_accesses"] == 2
+
+    # Tokens minted during the outage are kept locally and counted unsynced
+    store.create("t2", "page_visit:/")
+    wait_for(lambda: store.stats()["unsynced"] == 1)
+    assert "t2" in store
+
+
+def test_health_check_failure_skips_redis(client, monkeypatch):
+    monkeypatch.setattr(redis_pool, "_available", False)
+    store = RedisTokenStore(ttl=60, local=None)
+    store.local.create("t1", "page_visit:/")
+    assert store.record_access("t1", "10.0.0.1").access_count == 1
+    assert not client.exists("honeytoken:t1")
+    assert store.stats()["local_accesses"] == 1
+
+
+def test_ttl_tokens_are_indexed_on_first_access(client):
+    honeytoken_manager.store_honeytoken("t1", "page_visit:/backup", created=1000, ttl=60)
+    assert client.zcard(CREATED_INDEX_KEY) == 0
+
+    honeytoken_manager.check_honeytoken_access("t1", "10.0.0.1")
+    assert client.zscore(CREATED_INDEX_KEY, "t1") == 1000
+    assert client.zscore(CONTEXT_INDEX_KEY.format("page_visit:/backup"), "t1") == 1000
+    assert client.ttl("honeytoken:t1") == -1
+
+
+def test_minted_tokens_are_indexed_through_declared_keys(client):
+    result = honeytoken_manager._record_access("signed", "10.0.0.1", minted=("page_visit:/admin", 2000))
+    # The script indexed the context itself, so nothing is left for the caller
+    assert len(result) == 3
+    assert client.zscore(CONTEXT_INDEX_KEY.format("page_visit:/admin"), "signed") == 2000
+    assert client.zscore(CREATED_INDEX_KEY, "signed") == 2000
+
+
+def test_prune_drops_entries_of_missing_tokens(client):
+    honeytoken_manager.store_honeytoken("kept", "ctx", created=1000)
+    client.zadd(CREATED_INDEX_KEY, {"gone": 1})
+    client.zadd(CONTEXT_INDEX_KEY.format("ctx"), {"gone": 1})
+
+    assert honeytoken_manager.prune_indexes(batch_size=1) == 2
+    assert client.zrange(CREATED_INDEX_KEY, 0, -1) == [b"kept"]
+    assert client.zrange(CONTEXT_INDEX_KEY.format("ctx"), 0, -1) == [b"kept"]
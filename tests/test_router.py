@@ -0,0 +1,68 @@
+"""Route matching, including which route wins when a literal and a parameter both match"""
+import pytest
+
+from utils.router import Router
+
+
+def make_router(*routes):
+    router = Router()
+    for method, pattern in routes:
+        router.add(method, pattern, f"{method} {pattern}")
+    return router
+
+
+def test_exact_and_parameter_routes():
+    router = make_router(("GET", "/"), ("GET", "/patients"), ("GET", "/patient/<patient_id>"))
+
+    assert router.match("GET", "/") == ("GET /", {})
+    assert router.match("GET", "/patients") == ("GET /patients", {})
+    assert router.match("GET", "/patient/P001") == ("GET /patient/<patient_id>", {"patient_id": "P001"})
+    assert router.match("POST", "/patients") == (None, None)
+    assert router.match("GET", "/missing") == (None, None)
+    assert len(router) == 3
+
+
+@pytest.mark.parametrize("order", [1, -1])
+def test_literal_route_wins_over_parameter(order):
+    routes = [("GET", "/api/patients/<patient_id>"), ("GET", "/api/patients/export")][::order]
+    router = make_router(*routes)
+
+    assert router.match("GET", "/api/patients/export") == ("GET /api/patients/export", {})
+    assert router.match("GET", "/api/patients/P001") == ("GET /api/patients/<patient_id>",
+                                                          {"patient_id": "P001"})
+
+
+@pytest.mark.parametrize("order", [1, -1])
+def test_literal_segment_wins_within_the_tree(order):
+    routes = [("GET", "/static/<folder>/<filename>"), ("GET", "/static/css/<filename>")][::order]
+    router = make_router(*routes)
+
+    assert router.match("GET", "/static/css/site.css") == ("GET /static/css/<filename>", {"filename": "site.css"})
+    assert router.match("GET", "/static/js/main.js") == ("GET /static/<folder>/<filename>",
+                                                         {"folder": "js", "filename": "main.js"})
+
+
+def test_falls_back_to_parameter_when_literal_branch_dead_ends():
+    router = make_router(("GET", "/files/latest/meta"), ("GET", "/files/<name>/download"))
+
+    assert router.match("GET", "/files/latest/download") == ("GET /files/<name>/download", {"name": "latest"})
+    assert router.match("GET", "/files/latest/meta") == ("GET /files/latest/meta", {})
+
+
+def test_parameters_do_not_match_empty_segments():
+    router = make_router(("GET", "/patient/<patient_id>"))
+
+    assert router.match("GET", "/patient/") == (None, None)
+    assert router.match("GET", "/patient//") == (None, None)
+    assert router.match("GET", "/patient/P001/extra") == (None, None)
+
+
+def test_conflicting_registrations_are_rejected():
+    router = make_router(("GET", "/patient/<patient_id>"))
+
+    with pytest.raises(ValueError):
+        router.add("GET", "/patient/<id>", "other")
+    with pytest.raises(ValueError):
+        router.add("GET", "/patient/<patient_id>", "duplicate")
+    router.add("POST", "/patient/<id>", "different method")
+    assert router.match("POST", "/patient/P001") == ("different method", {"id": "P001"})
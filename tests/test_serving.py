@@ -0,0 +1,160 @@
+"""Both serving engines over real sockets: keep-alive, pipelining, bad requests and the tarpit hand-off"""
+import socket
+import threading
+import time
+
+import pytest
+
+from utils.rate_limit import RateLimitPolicy
+from utils.serving import SERVER_MODES, make_server
+from utils.tarpit import Tarpit
+
+
+@pytest.fixture
+def start(server_module, monkeypatch):
+    """Start the decoy handler on an ephemeral port with the given engine and options"""
+    monkeypatch.setattr(server_module, "RATE_LIMITS", RateLimitPolicy(mode="off"))
+    servers = []
+
+    def run(mode, **options):
+        options.setdefault("timeout", 5.0)
+        options.setdefault("keepalive_timeout", 5.0)
+        server = make_server(mode, ("127.0.0.1", 0), server_module.HealthcareHandler, **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, server.server_address[1]
+
+    yield run
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def connect(port):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+    return sock, sock.makefile("rb")
+
+
+def close(sock, stream):
+    # The socket stays open while its file object does
+    stream.close()
+    sock.close()
+
+
+def read_response(stream):
+    """``(status, headers, body)`` of the next response on ``stream``, or None at EOF"""
+    status_line = stream.readline()
+    if not status_line:
+        return None
+    headers = {}
+    while True:
+        line = stream.readline().rstrip(b"\r\n")
+        if not line:
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = stream.read(int(headers.get("content-length", 0)))
+    return int(status_line.split()[1]), headers, body
+
+
+def get(path):
+    return f"GET {path} HTTP/1.1\r\nHost: test\r\n\r\n".encode()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize("mode", SERVER_MODES)
+def test_pipelined_requests_share_one_connection(start, mode):
+    _, port = start(mode)
+    sock, stream = connect(port)
+    sock.sendall(get("/") + get("/login"))
+
+    first, second = read_response(stream), read_response(stream)
+    assert first[0] == 200 and b"<html" in first[2].lower()
+    assert second[0] == 200 and b"login" in second[2].lower()
+    assert first[1].get("connection") != "close" and second[1].get("connection") != "close"
+
+    # Still open for a third
+    sock.sendall(get("/"))
+    assert read_response(stream)[0] == 200
+    close(sock, stream)
+
+
+@pytest.mark.parametrize("mode", SERVER_MODES)
+@pytest.mark.parametrize("length", ["abc", "-5"])
+def test_bad_content_length_closes_the_connection(start, mode, length):
+    _, port = start(mode)
+    sock, stream = connect(port)
+    sock.sendall(f"POST /login HTTP/1.1\r\nHost: test\r\nContent-Length: {length}\r\n\r\n".encode() + get("/"))
+
+    response = read_response(stream)
+    if response is not None:
+        assert response[0] == 400
+        assert response[1]["connection"] == "close"
+    # The pipelined GET is never answered
+    assert read_response(stream) is None
+    close(sock, stream)
+
+
+@pytest.mark.parametrize("mode", SERVER_MODES)
+def test_connection_closes_after_max_requests(start, mode):
+    _, port = start(mode, max_requests=2)
+    sock, stream = connect(port)
+    sock.sendall(get("/") + get("/") + get("/"))
+
+    assert read_response(stream)[1].get("connection") != "close"
+    assert read_response(stream)[1]["connection"] == "close"
+    assert read_response(stream) is None
+    close(sock, stream)
+
+
+def test_threaded_keep_alive_stops_when_connections_queue(start):
+    server, port = start("threaded", workers=1)
+    first, first_stream = connect(port)
+    second, second_stream = connect(port)
+    # The second connection is accepted but waits for the only worker
+    wait_for(lambda: server.active_connections == 2)
+
+    first.sendall(get("/"))
+    status, headers, _ = read_response(first_stream)
+    assert status == 200 and headers["connection"] == "close"
+    assert read_response(first_stream) is None
+
+    # Alone again, the waiting connection is kept alive
+    second.sendall(get("/"))
+    status, headers, _ = read_response(second_stream)
+    assert status == 200 and headers.get("connection") != "close"
+    close(first, first_stream)
+    close(second, second_stream)
+    wait_for(lambda: server.active_connections == 0)
+
+
+@pytest.mark.parametrize("mode", SERVER_MODES)
+def test_rate_limited_connection_is_handed_to_the_tarpit(start, server_module, monkeypatch, mode):
+    server, port = start(mode)
+    pit = Tarpit(interval=0.05, duration=0.3)
+    monkeypatch.setattr(server_module, "RATE_LIMITS", RateLimitPolicy(mode="tarpit", ip_rate=0.0, ip_burst=0.0))
+    monkeypatch.setattr(server_module, "TARPIT", pit)
+
+    sock, stream = connect(port)
+    started = time.monotonic()
+    sock.sendall(get("/"))
+    received = b""
+    while True:
+        data = sock.recv(1024)
+        if not data:
+            break
+        received += data
+    elapsed = time.monotonic() - started
+    close(sock, stream)
+
+    # Dripped, not answered: part of the fake response, then a hang-up at the duration
+    assert 0.3 <= elapsed < 3.0
+    assert received and server_module.TARPIT_RESPONSE.startswith(received)
+    assert pit.stats()["held"] == 1
+    wait_for(lambda: server.active_connections == 0 and not server._detached)
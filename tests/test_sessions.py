@@ -0,0 +1,174 @@
+"""SessionTracker LRU and TTL bounds, profiles and change-only reporting"""
+from types import SimpleNamespace
+
+import pytest
+
+from utils import sessions
+from utils.sessions import SessionTracker
+
+
+class Clock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sessions, "time", SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture
+def tracker(clock):
+    emitted = []
+    # The reporter thread starts on the first event; reports are triggered by hand
+    tracker = SessionTracker(emitted.append, capacity=3, ttl=60, report_interval=3600, trail_length=4)
+    tracker.emitted = emitted
+    yield tracker
+    tracker.stop()
+
+
+def by_ip(profiles):
+    return {profile["ip"]: profile for profile in profiles}
+
+
+def test_profile_aggregates_requests_logins_and_tokens(tracker, clock):
+    tracker.record_request("10.0.0.1", "GET", "/")
+    clock.now += 2
+    tracker.record_request("10.0.0.1", "GET", "/login")
+    clock.now += 0.5
+    tracker.record_login("10.0.0.1", "admin", "admin", False)
+    tracker.record_login("10.0.0.1", "admin", "admin", False)
+    tracker.record_token("10.0.0.1", "tok", "page_visit:/login")
+
+    profile = tracker.get("10.0.0.1")
+    assert profile["requests"] == 2
+    assert profile["duration"] == 2.5
+    assert profile["min_interval"] == 2.0 and profile["mean_interval"] == 2.5
+    assert profile["paths"] == {"/": 1, "/login": 1}
+    assert profile["login_attempts"] == 2 and profile["login_successes"] == 0
+    assert profile["credentials"] == [{"username": "admin", "password": "admin", "attempts": 2}]
+    assert profile["tokens"] == [{"token_id": "tok", "context": "page_visit:/login"}]
+    # The trail keeps the last four steps
+    assert [step["step"] for step in profile["trail"]] == [
+        "GET /login", "login admin failed", "login admin failed", "honeytoken page_visit:/login"]
+    assert profile["trail"][0]["offset"] == 2.0
+    assert tracker.get("10.0.0.9") is None
+
+
+def test_paths_beyond_the_limit_are_counted_not_kept(tracker, monkeypatch):
+    monkeypatch.setattr(sessions, "MAX_PATHS", 2)
+    for path in ("/a", "/b", "/c", "/d", "/a"):
+        tracker.record_request("10.0.0.1", "GET", path)
+    profile = tracker.get("10.0.0.1")
+    assert profile["paths"] == {"/a": 2, "/b": 1}
+    assert profile["other_paths"] == 2
+
+
+def test_only_changed_sessions_are_reported(tracker):
+    tracker.record_request("10.0.0.1", "GET", "/")
+    tracker.record_request("10.0.0.2", "GET", "/")
+    assert tracker.report() == 2
+    assert set(by_ip(tracker.emitted)) == {"10.0.0.1", "10.0.0.2"}
+
+    assert tracker.report() == 0
+    tracker.record_request("10.0.0.2", "GET", "/admin")
+    assert tracker.report() == 1
+    latest = tracker.emitted[-1]
+    assert latest["ip"] == "10.0.0.2" and latest["requests"] == 2 and not latest["final"]
+    assert tracker.stats()["reported"] == 3
+
+
+def test_least_recently_used_session_is_evicted_with_a_final_profile(tracker):
+    for ip in ("a", "b", "c"):
+        tracker.record_request(ip, "GET", "/")
+    tracker.record_request("a", "GET", "/again")
+    tracker.record_request("d", "GET", "/")
+
+    assert len(tracker) == 3
+    assert tracker.get("b") is None and tracker.get("a") is not None
+    assert tracker.stats()["evicted"] == 1
+    assert tracker.stats()["pending"] == 1
+
+    profiles = by_ip(tracker.collect())
+    assert profiles["b"]["final"]
+    assert not any(profile["final"] for ip, profile in profiles.items() if ip != "b")
+
+
+def test_evicting_an_already_reported_session_emits_nothing_more(tracker):
+    for ip in ("a", "b", "c"):
+        tracker.record_request(ip, "GET", "/")
+    tracker.report()
+    tracker.record_request("d", "GET", "/")
+
+    assert tracker.stats()["evicted"] == 1
+    assert [profile["ip"] for profile in tracker.collect()] == ["d"]
+
+
+def test_idle_sessions_expire_after_the_ttl(tracker, clock):
+    tracker.record_request("old", "GET", "/")
+    clock.now += 30
+    tracker.record_request("recent", "GET", "/")
+    tracker.report()
+
+    clock.now += 31
+    tracker.record_request("old2", "GET", "/")
+    assert tracker.get("old") is None and tracker.get("recent") is not None
+    assert tracker.stats()["expired"] == 1
+    # "old" was reported before it expired and has not changed since
+    assert [profile["ip"] for profile in tracker.collect()] == ["old2"]
+
+    tracker.record_request("recent", "GET", "/again")
+    clock.now += 61
+    # Both expire; only the changed one gets a final profile
+    profiles = tracker.collect()
+    assert [(profile["ip"], profile["final"]) for profile in profiles] == [("recent", True)]
+    assert len(tracker) == 0 and tracker.stats()["expired"] == 3
+
+
+def test_a_failing_emit_does_not_stop_the_report(clock, caplog):
+    emitted = []
+
+    def emit(profile):
+        if profile["ip"] == "bad":
+            raise RuntimeError("sink down")
+        emitted.append(profile["ip"])
+
+    tracker = SessionTracker(emit, report_interval=3600)
+    tracker.record_request("bad", "GET", "/")
+    tracker.record_request("good", "GET", "/")
+    assert tracker.report() == 2
+    assert emitted == ["good"]
+    assert "Failed to emit attacker profile for bad" in caplog.text
+    tracker.stop()
+
+
+def test_final_profiles_beyond_the_pending_limit_are_dropped(tracker, monkeypatch):
+    monkeypatch.setattr(sessions, "MAX_PENDING", 1)
+    for ip in ("a", "b", "c", "d", "e"):
+        tracker.record_request(ip, "GET", "/")
+    assert tracker.stats()["evicted"] == 2
+    assert tracker.stats()["pending"] == 1
+    assert tracker.stats()["dropped_reports"] == 1
+
+
+def test_stop_sends_a_last_report(clock):
+    emitted = []
+    tracker = SessionTracker(emitted.append, report_interval=3600)
+    tracker.record_request("10.0.0.1", "GET", "/")
+    assert emitted == []
+    tracker.stop()
+    assert [profile["ip"] for profile in emitted] == ["10.0.0.1"]
+
+
+def test_sessions_from_env(monkeypatch):
+    monkeypatch.setenv("SESSION_CAPACITY", "10")
+    monkeypatch.setenv("SESSION_TTL", "5")
+    monkeypatch.setenv("SESSION_TRAIL_LENGTH", "2")
+    tracker = sessions.sessions_from_env(print)
+    assert (tracker.capacity, tracker.ttl, tracker.trail_length) == (10, 5.0, 2)
+    assert tracker.report_interval == sessions.DEFAULT_REPORT_INTERVAL
@@ -0,0 +1,144 @@
+"""Signed honeytokens: round trips, forgeries and the shared key file"""
+import base64
+import hashlib
+import os
+import threading
+
+import pytest
+
+from utils import signed_tokens
+from utils.shared_tokens import MAX_ID_BYTES
+from utils.signed_tokens import MAX_CONTEXT_BYTES, TAG_BYTES, TokenSigner, load_key, signer_from_env
+
+KEY = b"k" * 32
+
+
+def decode(token):
+    return bytearray(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+
+
+def encode(raw):
+    return base64.urlsafe_b64encode(bytes(raw)).rstrip(b"=").decode("ascii")
+
+
+@pytest.mark.parametrize("context", ["", "page_visit:/patients", "page_visit:/é" * 3, "x" * 64, "y" * 65])
+def test_round_trip(context):
+    signer = TokenSigner(KEY)
+    token = signer.mint(context, now=1700000000.7)
+    assert signer.verify(token) == (context, 1700000000.0)
+
+
+def test_tokens_are_unique_and_hide_their_context():
+    signer = TokenSigner(KEY)
+    tokens = {signer.mint("page_visit:/admin", now=1) for _ in range(100)}
+    assert len(tokens) == 100
+    assert all(b"admin" not in decode(token) for token in tokens)
+
+
+def test_long_contexts_are_truncated_across_keystream_blocks():
+    signer = TokenSigner(KEY)
+    context = "".join(chr(ord("a") + i % 26) for i in range(200))
+    token = signer.mint(context, now=1)
+    assert signer.verify(token) == (context[:MAX_CONTEXT_BYTES], 1.0)
+    # Both keystream blocks are applied: the tail past 64 bytes is not plain text
+    assert context[64:MAX_CONTEXT_BYTES].encode() not in decode(token)
+    assert len(token) <= signed_tokens._MAX_TOKEN_LENGTH <= MAX_ID_BYTES
+
+
+def test_truncation_mid_character_is_dropped():
+    signer = TokenSigner(KEY)
+    context = "a" * (MAX_CONTEXT_BYTES - 1) + "é"
+    assert signer.verify(signer.mint(context, now=1)) == ("a" * (MAX_CONTEXT_BYTES - 1), 1.0)
+
+
+def test_tampered_tokens_are_rejected():
+    signer = TokenSigner(KEY)
+    raw = decode(signer.mint("page_visit:/patients", now=1))
+    for position in range(len(raw)):
+        tampered = bytearray(raw)
+        tampered[position] ^= 1
+        assert signer.verify(encode(tampered)) is None
+    assert signer.verify(encode(raw[:-1])) is None
+    assert signer.verify(encode(raw + b"\0")) is None
+
+
+@pytest.mark.parametrize("token", ["", "!!!", "a" * 10, "a" * 500])
+def test_garbage_is_rejected(token):
+    assert TokenSigner(KEY).verify(token) is None
+
+
+def test_other_keys_and_versions_are_rejected():
+    signer = TokenSigner(KEY)
+    token = signer.mint("page_visit:/", now=1)
+    assert TokenSigner(b"other key, 16+ bytes").verify(token) is None
+
+    # A correctly tagged token of an unknown version
+    raw = decode(token)[:-TAG_BYTES]
+    raw[0] = 1
+    tag = hashlib.blake2b(bytes(raw), key=signer._key, digest_size=TAG_BYTES).digest()
+    assert signer.verify(encode(raw + tag)) is None
+
+
+def test_short_keys_are_refused():
+    with pytest.raises(ValueError):
+        TokenSigner(b"short")
+
+
+def test_load_key_creates_and_reuses_the_key(tmp_path):
+    path = str(tmp_path / "honeytoken.key")
+    key = load_key(path)
+    assert len(key) == 32
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert load_key(path) == key
+    assert os.listdir(tmp_path) == ["honeytoken.key"]
+
+
+def test_load_key_race_keeps_the_first_key(tmp_path, monkeypatch):
+    path = str(tmp_path / "honeytoken.key")
+    link = os.link
+
+    def lose_the_race(source, destination):
+        # Another process links its key into place first
+        with open(destination, "wb") as key_file:
+            key_file.write(b"w" * 32)
+        link(source, destination)
+
+    monkeypatch.setattr(signed_tokens.os, "link", lose_the_race)
+    assert load_key(path) == b"w" * 32
+    assert os.listdir(tmp_path) == ["honeytoken.key"]
+
+
+def test_concurrent_load_key_agrees(tmp_path):
+    path = str(tmp_path / "honeytoken.key")
+    barrier = threading.Barrier(8)
+    keys = []
+
+    def worker():
+        barrier.wait()
+        keys.append(load_key(path))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(keys) == 8 and len(set(keys)) == 1
+    assert os.listdir(tmp_path) == ["honeytoken.key"]
+
+
+def test_signer_from_env(monkeypatch, tmp_path):
+    monkeypatch.delenv("HONEYTOKEN_MODE", raising=False)
+    assert signer_from_env() is None
+
+    monkeypatch.setenv("HONEYTOKEN_MODE", "signed")
+    monkeypatch.setenv("HONEYTOKEN_SECRET", "s" * 16)
+    token = signer_from_env().mint("ctx", now=1)
+    assert TokenSigner(b"s" * 16).verify(token) == ("ctx", 1.0)
+
+    monkeypatch.delenv("HONEYTOKEN_SECRET")
+    monkeypatch.setenv("HONEYTOKEN_SECRET_PATH", str(tmp_path / "key"))
+    assert signer_from_env().verify(signer_from_env().mint("ctx", now=1)) == ("ctx", 1.0)
+
+    monkeypatch.setenv("HONEYTOKEN_MODE", "bogus")
+    with pytest.raises(ValueError):
+        signer_from_env()
@@ -0,0 +1,155 @@
+"""HyperLogLog, Bloom filter and Count-Min estimates, and the alerts they let through"""
+import time
+
+import pytest
+
+from utils.sketches import MAX_HEAVY_HITTERS, AttackSketches, BloomFilter, CountMinSketch, HyperLogLog, \
+    RotatingBloomFilter
+
+
+@pytest.mark.parametrize("distinct", [10, 1000, 50000])
+def test_hyperloglog_estimate_within_error(distinct):
+    hll = HyperLogLog(precision=12)
+    for i in range(distinct):
+        hll.add(f"10.{i >> 16}.{(i >> 8) & 255}.{i & 255}")
+    # Standard error is 1.04 / sqrt(4096), about 1.6%; allow four of them
+    assert abs(hll.count() - distinct) <= max(2, 0.065 * distinct)
+
+
+def test_hyperloglog_ignores_repeats():
+    hll = HyperLogLog(precision=8)
+    for _ in range(1000):
+        hll.add("203.0.113.7")
+    assert hll.count() == 1
+    assert hll.add("203.0.113.7") is False
+
+
+def test_hyperloglog_merge_matches_union():
+    left, right, union = HyperLogLog(10), HyperLogLog(10), HyperLogLog(10)
+    for i in range(3000):
+        (left if i % 2 else right).add(str(i))
+        union.add(str(i))
+    left.merge(right)
+    assert left.count() == union.count()
+
+
+def test_hyperloglog_rejects_bad_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(precision=3)
+    with pytest.raises(ValueError):
+        HyperLogLog(8).merge(HyperLogLog(10))
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=10000, error_rate=0.01)
+    for i in range(10000):
+        bloom.add(f"item-{i}")
+    assert all(f"item-{i}" in bloom for i in range(10000))
+    assert bloom.add("item-0") is True
+
+
+def test_bloom_filter_false_positive_rate_near_target():
+    bloom = BloomFilter(capacity=10000, error_rate=0.01)
+    for i in range(10000):
+        bloom.add(f"item-{i}")
+    false_positives = sum(f"other-{i}" in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
+
+
+def test_rotating_bloom_filter_forgets_after_two_generations():
+    bloom = RotatingBloomFilter(capacity=1000, window=10.0)
+    start = time.monotonic()
+    assert bloom.add("token|10.0.0.1", now=start) is False
+    assert bloom.add("token|10.0.0.1", now=start + 1) is True
+    # One rotation: still remembered through the previous generation
+    assert bloom.add("other", now=start + 11) is False
+    assert "token|10.0.0.1" in bloom
+    # Two rotations: gone
+    bloom.add("another", now=start + 22)
+    assert "token|10.0.0.1" not in bloom
+    assert bloom.rotations == 2
+
+
+def test_rotating_bloom_filter_rotates_when_full():
+    bloom = RotatingBloomFilter(capacity=100, window=3600.0)
+    for i in range(250):
+        bloom.add(f"item-{i}")
+    assert bloom.rotations == 2
+    assert "item-249" in bloom
+
+
+def test_count_min_never_underestimates():
+    sketch = CountMinSketch(width=64, depth=4)
+    counts = {f"user{i}:pw": i % 7 + 1 for i in range(500)}
+    for item, count in counts.items():
+        for _ in range(count):
+            sketch.add(item)
+    assert all(sketch.estimate(item) >= count for item, count in counts.items())
+
+
+def test_count_min_exact_without_collisions():
+    sketch = CountMinSketch()
+    for _ in range(42):
+        sketch.add("admin\0admin")
+    assert sketch.estimate("admin\0admin") == 42
+    assert sketch.estimate("never seen") == 0
+
+
+def test_repeat_token_access_from_same_ip_is_suppressed():
+    sketches = AttackSketches(bloom_capacity=1000)
+    assert sketches.record_token_access("tok", "10.0.0.1") == (True, 1)
+    assert sketches.record_token_access("tok", "10.0.0.1") == (False, 1)
+    assert sketches.record_token_access("tok", "10.0.0.2")[0] is True
+    assert sketches.stats()["suppressed"] == 1
+
+
+def test_sweep_is_reported_when_it_doubles():
+    sketches = AttackSketches(bloom_capacity=100000, sweep_threshold=4)
+    published = [sketches.record_token_access("tok", f"10.0.{i >> 8}.{i & 255}")
+                 for i in range(1, 1001)]
+    reported = [distinct for publish, distinct in published if publish]
+    # Every IP up to the threshold, then roughly once per doubling
+    assert reported[:4] == [1, 2, 3, 4]
+    assert 5 <= len(reported) - 4 <= 12
+
+
+def test_dedupe_off_publishes_everything():
+    sketches = AttackSketches(dedupe=False, bloom_capacity=1000)
+    assert all(sketches.record_token_access("tok", "10.0.0.1")[0] for _ in range(5))
+
+
+def test_heavy_hitter_alerts_at_threshold_and_powers_of_ten():
+    sketches = AttackSketches(bloom_capacity=1000, heavy_hitter_threshold=10)
+    alerts = [sketches.record_credential("admin", "admin") for _ in range(1000)]
+    assert [attempts for attempts in alerts if attempts is not None] == [10, 100, 1000]
+    assert sketches.heavy_hitters() == [("admin", "admin", 1000)]
+
+
+def test_heavy_hitter_alerts_when_the_estimate_skips_a_level():
+    sketches = AttackSketches(bloom_capacity=1000, heavy_hitter_threshold=10)
+    # Collisions in the count-min sketch can jump the estimate past a level
+    estimates = iter([9, 12, 13, 99, 150, 160, 1001, 1002])
+    sketches._credentials.add = lambda item: next(estimates)
+    alerts = [sketches.record_credential("admin", "admin") for _ in range(8)]
+    assert alerts == [None, 12, None, None, 150, None, 1001, None]
+    assert sketches.stats()["heavy_hitter_alerts"] == 3
+
+
+def test_heavy_hitters_are_bounded():
+    sketches = AttackSketches(bloom_capacity=1000, heavy_hitter_threshold=1)
+    for i in range(MAX_HEAVY_HITTERS + 1):
+        sketches.record_credential("user", f"password{i}")
+    sketches.record_credential("user", "password0")
+    ranked = sketches.heavy_hitters(limit=1000)
+    assert len(ranked) == MAX_HEAVY_HITTERS
+    assert ranked[0] == ("user", "password0", 2)
+
+
+def test_tracked_keys_are_bounded():
+    sketches = AttackSketches(bloom_capacity=1000, max_keys=10)
+    for i in range(100):
+        sketches.record_request("10.0.0.1", f"/route/{i}")
+        sketches.record_token_access(f"tok{i}", "10.0.0.1")
+    stats = sketches.stats()
+    assert stats["tracked_routes"] == 10
+    assert stats["tracked_tokens"] == 10
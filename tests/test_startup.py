@@ -0,0 +1,110 @@
+"""StartupTimer phases and deferred tasks, and the --measure-startup report"""
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from utils.startup import StartupTimer, startup_from_env
+
+SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "simple_server.py")
+
+
+def test_marks_record_phases_in_order():
+    timer = StartupTimer()
+    timer.mark("imports")
+    timer.mark("stores")
+
+    assert [phase for phase, _ in timer.phases] == ["imports", "stores"]
+    assert all(seconds >= 0 for _, seconds in timer.phases)
+    assert list(timer.stats()["phases"]) == ["imports", "stores"]
+    assert "imports" in timer.report() and "startup total" in timer.report()
+
+
+def test_deferred_tasks_run_once_in_order():
+    timer = StartupTimer(mode="eager")
+    ran = []
+    timer.defer("first", lambda: ran.append("first"))
+    timer.defer("second", lambda: ran.append("second"))
+    assert ran == [] and not timer.ready.is_set()
+
+    timer.run_deferred()
+    timer.run_deferred()
+    assert ran == ["first", "second"]
+    assert timer.wait(0)
+    stats = timer.stats()
+    assert stats["ready"] and stats["failed"] == 0
+    assert list(stats["deferred"]) == ["first", "second"]
+    assert stats["ready_seconds"] is not None
+    assert "deferred (eager)" in timer.report()
+
+
+def test_background_tasks_run_off_the_calling_thread():
+    timer = StartupTimer(mode="background")
+    release = threading.Event()
+    threads = []
+
+    def task():
+        threads.append(threading.current_thread())
+        release.wait(5)
+
+    timer.defer("slow", task)
+    timer.run_deferred()
+    assert not timer.wait(0.05)
+    release.set()
+    assert timer.wait(5)
+    assert threads[0] is not threading.main_thread()
+
+
+def test_background_can_be_overridden_before_forking():
+    timer = StartupTimer(mode="background")
+    threads = []
+    timer.defer("task", lambda: threads.append(threading.current_thread()))
+    timer.run_deferred(background=False)
+    assert timer.ready.is_set()
+    assert threads == [threading.current_thread()]
+
+
+def test_failed_task_does_not_stop_the_rest(caplog):
+    timer = StartupTimer(mode="eager")
+    ran = []
+    timer.defer("broken", lambda: 1 / 0)
+    timer.defer("after", lambda: ran.append(True))
+    timer.run_deferred()
+
+    assert ran == [True]
+    assert timer.stats()["failed"] == 1
+    assert timer.ready.is_set()
+    assert "Deferred startup task broken failed" in caplog.text
+
+
+def test_nothing_deferred_is_ready_at_once():
+    timer = StartupTimer(mode="background")
+    timer.run_deferred()
+    assert timer.ready.is_set()
+
+
+def test_startup_mode_from_env(monkeypatch):
+    monkeypatch.setenv("STARTUP_MODE", "eager")
+    assert startup_from_env().mode == "eager"
+    monkeypatch.setenv("STARTUP_MODE", "lazy")
+    with pytest.raises(ValueError):
+        startup_from_env()
+
+
+def test_measure_startup_prints_the_breakdown(tmp_path):
+    env = dict(os.environ, REDIS_HOST="127.0.0.1", REDIS_PORT="1", LOG_PATH=str(tmp_path / "server.log"),
+               ALERT_OVERFLOW_PATH=str(tmp_path / "overflow.jsonl"), HONEYTOKEN_SPILL_PATH="",
+               STARTUP_MODE="background")
+    env.pop("EVENT_STORE_PATH", None)
+    result = subprocess.run([sys.executable, SERVER, "--measure-startup"], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    lines = result.stdout.splitlines()
+    phases = [line.split()[0] for line in lines[1:]]
+    assert phases[:2] == ["imports", "logging"]
+    assert "bind" in phases and "startup" in phases
+    assert any(line.startswith("  dataset") for line in lines)
+    assert lines[-1].startswith("first request") and "(HTTP 200," in lines[-1]
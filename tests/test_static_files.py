@@ -0,0 +1,80 @@
+"""Preloaded static assets: content types, versioned URLs, caching headers and variants"""
+import gzip
+import zlib
+
+import pytest
+
+from utils.static_files import DEFAULT_CACHE_CONTROL, IMMUTABLE_CACHE_CONTROL, StaticFiles
+
+CSS = b"body { color: #333; }\n" * 40
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "portal.css").write_bytes(CSS)
+    (tmp_path / "js").mkdir()
+    (tmp_path / "js" / "main.js").write_bytes(b"console.log('x');\n")
+    (tmp_path / "data.bin").write_bytes(b"\x00\x01")
+    return tmp_path
+
+
+def test_assets_are_preloaded_with_content_types(static_dir):
+    static = StaticFiles(root=str(static_dir))
+
+    assert len(static) == 3
+    assert static.total_bytes == len(CSS) + 18 + 2
+    assert static.get("css/portal.css").entry.content_type == "text/css; charset=utf-8"
+    assert static.get("data.bin").entry.content_type == "application/octet-stream"
+    assert static.get("missing.css") is None
+    assert static.get("../css/portal.css") is None
+
+
+def test_url_carries_content_hash(static_dir):
+    static = StaticFiles(root=str(static_dir))
+    asset = static.get("css/portal.css")
+
+    assert static.url("css/portal.css") == f"/static/css/portal.css?v={asset.version}"
+    assert static.url("missing.css") == "/static/missing.css"
+
+    (static_dir / "css" / "portal.css").write_bytes(CSS + b"a { }\n")
+    assert StaticFiles(root=str(static_dir)).get("css/portal.css").version != asset.version
+
+
+def test_only_current_version_is_immutable(static_dir):
+    static = StaticFiles(root=str(static_dir))
+    asset = static.get("css/portal.css")
+
+    assert static.cache_control(asset, asset.version) == IMMUTABLE_CACHE_CONTROL
+    assert static.cache_control(asset, "0123456789") == DEFAULT_CACHE_CONTROL
+    assert static.cache_control(asset, None) == DEFAULT_CACHE_CONTROL
+
+
+def test_compressed_variants_and_conditional_requests(static_dir):
+    entry = StaticFiles(root=str(static_dir)).get("css/portal.css").entry
+
+    body, encoding, gzip_etag = entry.select("gzip, deflate")
+    assert encoding == "gzip" and gzip.decompress(body) == CSS
+    body, encoding, deflate_etag = entry.select("deflate")
+    assert encoding == "deflate" and zlib.decompress(body) == CSS
+    body, encoding, etag = entry.select("br")
+    assert encoding is None and body == CSS
+    assert len({etag, gzip_etag, deflate_etag}) == 3
+
+    assert entry.is_not_modified(gzip_etag, None)
+    assert entry.is_not_modified(f'W/{etag}, "other"', None)
+    assert not entry.is_not_modified('"other"', None)
+    assert entry.is_not_modified(None, entry.last_modified_header)
+    assert not entry.is_not_modified(None, "Thu, 01 Jan 1970 00:00:00 GMT")
+
+
+def test_small_files_are_not_compressed(static_dir):
+    entry = StaticFiles(root=str(static_dir)).get("js/main.js").entry
+    assert entry.select("gzip")[1] is None
+
+
+def test_files_over_the_byte_limit_are_skipped(static_dir):
+    static = StaticFiles(root=str(static_dir), max_bytes=len(CSS) - 1)
+    assert static.get("css/portal.css") is None
+    assert static.get("js/main.js") is not None
+    assert static.total_bytes == 18 + 2
@@ -0,0 +1,97 @@
+"""Tarpit drip timing, hang-up and connection limits, threaded and asyncio"""
+import asyncio
+import socket
+import time
+
+from utils.tarpit import Tarpit
+
+
+def read_until_closed(sock, timeout=5.0):
+    """``(arrival time, bytes)`` of each recv until the peer hangs up"""
+    sock.settimeout(timeout)
+    chunks = []
+    while True:
+        data = sock.recv(1024)
+        if not data:
+            return chunks
+        chunks.append((time.monotonic(), data))
+
+
+def test_drips_one_chunk_per_interval():
+    tarpit = Tarpit(interval=0.05, duration=10.0, chunk_size=2)
+    held, client = socket.socketpair()
+    started = time.monotonic()
+    assert tarpit.hold(held, b"HTTP/1.1 200 OK\r\n")
+    chunks = read_until_closed(client)
+    client.close()
+
+    assert b"".join(data for _, data in chunks) == b"HTTP/1.1 200 OK\r\n"
+    assert all(len(data) <= 2 for _, data in chunks)
+    # Nine chunks, each an interval after the last; then closed once sent
+    assert chunks[0][0] - started >= 0.045
+    gaps = [later[0] - earlier[0] for earlier, later in zip(chunks, chunks[1:])]
+    assert min(gaps) >= 0.04
+    assert time.monotonic() - started < 5.0
+    assert tarpit.stats() == {"holding": 0, "held": 1, "rejected": 0}
+
+
+def test_hangs_up_after_the_duration():
+    tarpit = Tarpit(interval=0.05, duration=0.3)
+    held, client = socket.socketpair()
+    started = time.monotonic()
+    tarpit.hold(held, b"x" * 1000)
+    received = b"".join(data for _, data in read_until_closed(client))
+    elapsed = time.monotonic() - started
+    client.close()
+
+    assert 0.3 <= elapsed < 2.0
+    assert 3 <= len(received) <= 7
+    assert len(tarpit) == 0
+
+
+def test_full_tarpit_refuses_and_leaves_the_socket_alone():
+    tarpit = Tarpit(interval=0.05, duration=1.0, max_connections=1)
+    first, first_client = socket.socketpair()
+    second, second_client = socket.socketpair()
+    assert tarpit.hold(first, b"abc")
+    assert not tarpit.hold(second, b"abc")
+    assert not tarpit.reserve()
+    assert tarpit.stats()["rejected"] == 2
+
+    # Still ours to answer and close
+    second.sendall(b"busy")
+    assert second_client.recv(4) == b"busy"
+    for sock in (second, second_client, first_client):
+        sock.close()
+
+
+def test_drops_a_client_that_went_away():
+    tarpit = Tarpit(interval=0.02, duration=5.0)
+    held, client = socket.socketpair()
+    tarpit.hold(held, b"x" * 100)
+    client.close()
+    deadline = time.monotonic() + 5.0
+    while len(tarpit) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert len(tarpit) == 0
+
+
+def test_asyncio_drip_stops_at_the_duration():
+    tarpit = Tarpit(interval=0.05, duration=0.3)
+    held, client = socket.socketpair()
+
+    async def run():
+        _, writer = await asyncio.open_connection(sock=held)
+        assert tarpit.reserve()
+        assert len(tarpit) == 1
+        await tarpit.drip(writer, b"y" * 1000)
+
+    started = time.monotonic()
+    asyncio.run(run())
+    elapsed = time.monotonic() - started
+    received = b"".join(data for _, data in read_until_closed(client))
+    client.close()
+
+    assert 0.3 <= elapsed < 2.0
+    assert 3 <= len(received) <= 7 and set(received) == {ord("y")}
+    assert tarpit.stats() == {"holding": 0, "held": 1, "rejected": 0}
@@ -0,0 +1,182 @@
+"""HoneytokenStore expiry, eviction, disk spill and indexed queries"""
+import json
+
+import pytest
+
+from utils.shared_tokens import SharedTokenStore
+from utils.token_store import HoneytokenStore, store_from_env
+
+
+def test_unaccessed_tokens_expire_after_ttl():
+    store = HoneytokenStore(ttl=60, spill_path=None)
+    store.create("old", "page_visit:/", now=1000)
+    store.create("new", "page_visit:/", now=1050)
+
+    store.create("newest", "page_visit:/", now=1061)
+    assert "old" not in store
+    assert "new" in store
+    assert store.record_access("old", "10.0.0.1", now=1062) is None
+    assert store.stats()["expired"] == 1
+    assert [token_id for token_id, _ in store.query(context="page_visit:/")[0]] == ["newest", "new"]
+
+
+def test_accessed_tokens_never_expire():
+    store = HoneytokenStore(ttl=60, spill_path=None)
+    store.create("hit", "page_visit:/backup", now=1000)
+    assert store.record_access("hit", "10.0.0.1", now=1010).access_count == 1
+
+    store.create("later", "page_visit:/", now=5000)
+    assert store.get("hit").access_count == 1
+    assert store.stats() == {"fresh": 1, "accessed": 1, "spilled": 0, "expired": 0, "evicted": 0}
+
+
+def test_oldest_unaccessed_tokens_are_evicted_over_capacity():
+    store = HoneytokenStore(capacity=3, spill_path=None)
+    store.create("accessed", "ctx", now=1)
+    store.record_access("accessed", "10.0.0.1", now=2)
+    for i in range(5):
+        store.create(f"t{i}", "ctx", now=10 + i)
+
+    assert [token_id for token_id in ("t0", "t1", "t2", "t3", "t4") if token_id in store] == ["t2", "t3", "t4"]
+    assert "accessed" in store
+    assert store.stats()["evicted"] == 2
+    assert len(store) == 4
+
+
+def test_accessed_tokens_spill_to_disk_and_reload(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    store = HoneytokenStore(accessed_capacity=2, spill_path=str(spill))
+    for i in range(4):
+        store.create(f"t{i}", "ctx", now=100 + i)
+        store.record_access(f"t{i}", f"10.0.0.{i}", now=200 + i)
+
+    assert store.stats()["spilled"] == 2
+    assert spill.exists()
+    # Spilled tokens can still be read and queried
+    assert store.get("t0").access_count == 1
+    assert [token_id for token_id, _ in store.query(ip="10.0.0.0")[0]] == ["t0"]
+
+    # and an access brings them back with their history
+    snapshot = store.record_access("t0", "10.0.0.9", now=300)
+    assert snapshot.access_count == 2
+    assert store.get("t0").access_ips == {"10.0.0.0", "10.0.0.9"}
+
+
+def test_spilled_tokens_are_found_after_restart(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    store = HoneytokenStore(accessed_capacity=1, spill_path=str(spill))
+    for i in range(3):
+        store.create(f"t{i}", "page_visit:/backup", now=100 + i)
+        store.record_access(f"t{i}", f"10.0.0.{i}", now=200 + i)
+
+    restarted = HoneytokenStore(accessed_capacity=1, spill_path=str(spill))
+    assert restarted.stats()["spilled"] == 2
+    assert "t1" in restarted and "t2" not in restarted
+    assert [t for t, _ in restarted.query(context="page_visit:/backup")[0]] == ["t1", "t0"]
+    assert [t for t, _ in restarted.query(ip="10.0.0.1")[0]] == ["t1"]
+    assert [t for t, _ in restarted.query(accessed_before=200)[0]] == ["t0"]
+
+    snapshot = restarted.record_access("t0", "10.0.0.0", now=300)
+    assert (snapshot.access_count, snapshot.new_ip) == (2, False)
+
+
+def test_spill_file_is_compacted_when_mostly_dead(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    store = HoneytokenStore(accessed_capacity=4, spill_path=str(spill))
+    for i in range(8):
+        store.create(f"t{i}", "ctx", now=100 + i)
+        store.record_access(f"t{i}", "10.0.0.1", now=200 + i)
+    assert len(spill.read_text().splitlines()) == 4
+
+    # Each reload leaves a dead line behind and spills another token, until
+    # the dead lines outnumber the live ones
+    for i in range(4):
+        store.record_access(f"t{i}", "10.0.0.2", now=300 + i)
+    assert len(spill.read_text().splitlines()) == 8
+    store.record_access("t4", "10.0.0.2", now=310)
+
+    lines = spill.read_text().splitlines()
+    assert len(lines) == store.stats()["spilled"] == 4
+    assert [json.loads(line)["token_id"] for line in lines] == ["t5", "t6", "t7", "t0"]
+    assert store.get("t0").access_count == 2
+    assert store.record_access("t6", "10.0.0.2", now=400).access_count == 2
+
+
+def test_spill_scan_skips_reloaded_and_torn_lines(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    record = {"context": "ctx", "created_at": 1, "accessed": True, "access_ips": ["10.0.0.1"], "last_accessed": 2}
+    lines = [dict(record, token_id="a", access_count=1), dict(record, token_id="b", access_count=1),
+             dict(record, token_id="a", access_count=3)]
+    spill.write_text("".join(json.dumps(line) + "\n" for line in lines) + "not json\n" + '{"token_id": "c"')
+
+    store = HoneytokenStore(spill_path=str(spill))
+    assert store.stats()["spilled"] == 2
+    assert store.get("a").access_count == 3
+    assert "c" not in store
+    # Two dead lines of four is not yet a majority, but the torn tail is gone
+    assert spill.read_text().endswith("not json\n")
+
+    store.record_access("b", "10.0.0.1", now=10)
+    assert [json.loads(line)["token_id"] for line in spill.read_text().splitlines()] == ["a"]
+    assert store.get("a").access_count == 3
+
+
+def test_minted_tokens_are_added_on_first_access():
+    store = HoneytokenStore(spill_path=None)
+    assert store.record_access("signed", "10.0.0.1", now=20) is None
+    snapshot = store.record_access("signed", "10.0.0.1", now=20, minted=("page_visit:/admin", 10))
+    assert (snapshot.context, snapshot.access_count, snapshot.new_ip) == ("page_visit:/admin", 1, True)
+    assert store.get("signed").created_at == 10
+
+
+def test_query_filters_and_limit():
+    store = HoneytokenStore(spill_path=None)
+    for i in range(10):
+        store.create(f"t{i}", "a" if i % 2 else "b", now=1000 + i * 60)
+    store.record_access("t3", "10.0.0.1", now=2000)
+    store.record_access("t5", "10.0.0.1", now=2100)
+
+    assert [t for t, _ in store.query(ip="10.0.0.1")[0]] == ["t5", "t3"]
+    assert [t for t, _ in store.query(context="a", created_after=1000 + 5 * 60)[0]] == ["t9", "t7", "t5"]
+    assert [t for t, _ in store.query(accessed_after=2050)[0]] == ["t5"]
+    matches, truncated = store.query(limit=3)
+    assert [t for t, _ in matches] == ["t9", "t8", "t7"] and truncated
+
+
+def test_shared_store_counts_evicted_accessed_tokens(caplog):
+    store = SharedTokenStore(capacity=8, ttl=10 ** 12)
+    for i in range(8):
+        store.create(f"t{i}", "ctx", now=100)
+        store.record_access(f"t{i}", "10.0.0.1", now=200 - i)
+
+    store.create("new", "ctx", now=300)
+    # The least recently accessed token made room, and that was recorded
+    assert "t7" not in store and "t6" in store and "new" in store
+    stats = store.stats()
+    assert (stats["fresh"], stats["accessed"], stats["evicted"], stats["evicted_accessed"]) == (1, 7, 1, 1)
+    assert "evicting t7 (1 accesses)" in caplog.text
+
+    store.create("newer", "ctx", now=301)
+    assert "new" not in store
+    assert store.stats()["evicted_accessed"] == 1
+
+
+@pytest.mark.parametrize("backend, processes, expected", [
+    ("auto", 1, HoneytokenStore),
+    ("memory", 4, HoneytokenStore),
+    ("shared", 1, SharedTokenStore),
+])
+def test_store_from_env_selects_backend(monkeypatch, backend, processes, expected):
+    monkeypatch.setenv("HONEYTOKEN_BACKEND", backend)
+    monkeypatch.setenv("HONEYTOKEN_CAPACITY", "100")
+    monkeypatch.setenv("HONEYTOKEN_TTL", "30")
+    monkeypatch.setenv("HONEYTOKEN_SPILL_PATH", "")
+    store = store_from_env(processes)
+    assert isinstance(store, expected)
+    assert store.ttl == 30
+
+
+def test_store_from_env_rejects_unknown_backend(monkeypatch):
+    monkeypatch.setenv("HONEYTOKEN_BACKEND", "bogus")
+    with pytest.raises(ValueError):
+        store_from_env()
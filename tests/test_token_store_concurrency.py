@@ -0,0 +1,90 @@
+"""Access counts stay exact when many threads record accesses at once"""
+import os
+import sys
+import threading
+
+import pytest
+
+from utils.shared_tokens import SharedTokenStore
+from utils.token_store import HoneytokenStore
+
+THREADS = 16
+ACCESSES = 500
+TOKENS = ["token-a", "token-b", "token-c"]
+IPS = [f"10.0.0.{i}" for i in range(1, 21)]
+
+
+@pytest.fixture(autouse=True)
+def frequent_switches():
+    # Switch threads far more often than usual to shake out races
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def hammer(store):
+    barrier = threading.Barrier(THREADS)
+
+    def worker(worker_id):
+        barrier.wait()
+        for i in range(ACCESSES):
+            store.record_access(TOKENS[i % len(TOKENS)], IPS[(worker_id + i) % len(IPS)])
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def expected_count(token_id):
+    return THREADS * len(range(TOKENS.index(token_id), ACCESSES, len(TOKENS)))
+
+
+@pytest.mark.parametrize("lock_stripes", [1, 64])
+def test_memory_store_counts_every_access(lock_stripes):
+    store = HoneytokenStore(spill_path=None, lock_stripes=lock_stripes)
+    for token_id in TOKENS:
+        store.create(token_id, "stress")
+
+    hammer(store)
+
+    for token_id in TOKENS:
+        record = store.get(token_id)
+        assert record.access_count == expected_count(token_id)
+        assert record.access_ips == set(IPS)
+    assert store.stats()["accessed"] == len(TOKENS)
+
+
+def test_shared_store_counts_every_access():
+    store = SharedTokenStore(capacity=64)
+    for token_id in TOKENS:
+        store.create(token_id, "stress")
+
+    hammer(store)
+
+    for token_id in TOKENS:
+        assert store.get(token_id).access_count == expected_count(token_id)
+    assert store.stats()["accessed"] == len(TOKENS)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_shared_store_counts_accesses_from_forked_processes():
+    store = SharedTokenStore(capacity=64)
+    store.create("token-a", "stress")
+
+    children = []
+    for _ in range(4):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                for _ in range(ACCESSES):
+                    store.record_access("token-a", "10.0.0.1")
+            finally:
+                os._exit(0)
+        children.append(pid)
+    for pid in children:
+        os.waitpid(pid, 0)
+
+    assert store.get("token-a").access_count == 4 * ACCESSES